@@ -0,0 +1,187 @@
+import selectors
+import time
+from BufferPool import BufferPool
+from Colors import Colors
+from GameProtocol import GameProtocol
+
+
+class Admission:
+    """
+    The stage every connection goes through before its player joins a lobby: reading the name, under a deadline,
+    and turning players away when the server is full.
+
+    On the threaded server it is a single thread that multiplexes the listening socket and every connection
+    whose name has not arrived yet with a selector, so a connection that is slow to send its name, or never
+    sends one, only holds a slot of the pending table until handshake_timeout, not a thread. When max_pending
+    connections are pending, the listening socket is taken out of the selector: new connections wait in the
+    kernel's accept queue, and their SYNs are dropped once it is full, until handshakes complete or expire.
+    While the table is full the deadline shrinks to busy_timeout, so a flood of connections that never send
+    a name is shed quickly and the players queued behind it still fill the lobbies. The asyncio server reads
+    names in its own tasks and uses the same limits, see AsyncServerMain.handle_client.
+
+    A player is rejected with a reason, as a REJECT frame or as text depending on how it said hello, when the
+    open lobby already holds max_lobby players, when every game slot of the server is taken, or when its
+    handshake timed out.
+
+    Attributes:
+        server (ServerMain): Server the admitted players are handed to with admit_player.
+        handshake_timeout (float): Seconds a connection has to send its name.
+        busy_timeout (float): Seconds a connection has to send its name while every pending slot is taken.
+        max_pending (int): Connections whose name may be awaited at the same time.
+        max_lobby (int or None): Players the open lobby holds before new ones are rejected, None for no limit.
+        pending (dict): Maps each pending connection to (address, time.monotonic and time.monotonic_ns it was
+            accepted at), in the order they were accepted, which is also the order of their deadlines.
+        paused (bool): Whether accepting is paused because max_pending connections are pending.
+    """
+
+    LOBBY_FULL = "the lobby is full, try again later"
+    SERVER_BUSY = "too many players are joining, try again later"
+    TIMED_OUT = "no name received in time"
+    GAMES_FULL = "every game on the server is taken, try again later"
+
+    def __init__(self, server, handshake_timeout=5.0, max_pending=256, max_lobby=None, busy_timeout=0.5):
+        self.server = server
+        self.handshake_timeout = handshake_timeout
+        self.busy_timeout = busy_timeout
+        self.max_pending = max_pending
+        self.max_lobby = max_lobby
+        self.pending = {}
+        self.paused = False
+        self.selector = None
+
+    def full(self):
+        """Returns whether every pending slot is taken."""
+        return len(self.pending) >= self.max_pending
+
+    def current_timeout(self):
+        """Returns the seconds pending connections have to send their name, shorter while the table is full."""
+        return self.busy_timeout if self.full() else self.handshake_timeout
+
+    def rejection(self):
+        """Returns why a player that completed its handshake cannot join now, or None if it can."""
+        if self.max_lobby is not None and self.server.scheduler.lobby_size() >= self.max_lobby:
+            return self.LOBBY_FULL
+        if self.server.game_slots_full():
+            return self.GAMES_FULL
+        return None
+
+    @staticmethod
+    def reject_message(protocol, reason):
+        """Builds the message that turns a player away, in the protocol it said hello with."""
+        if protocol:
+            return GameProtocol.reject_frame(reason)
+        return f"{Colors.RED}The server turned you away: {reason}{Colors.END}".encode('utf-8')
+
+    def reject(self, client_socket, addr, protocol, reason):
+        """Sends the reject message to a player, if its socket takes it right away, and closes the connection."""
+        try:
+            client_socket.setblocking(False)
+            client_socket.send(self.reject_message(protocol, reason))
+        except OSError:
+            pass
+        client_socket.close()
+        print(f"{Colors.YELLOW}Rejected {addr}: {reason}")
+
+    def run(self, tcp_socket):
+        """Accepts connections and reads their names until the server stops or the listening socket is closed."""
+        tcp_socket.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(tcp_socket, selectors.EVENT_READ)
+        try:
+            while self.server.server_running:
+                events = self.selector.select(self.next_timeout())
+                for key, _ in events:
+                    if key.fileobj is tcp_socket:
+                        if not self.accept(tcp_socket):
+                            return  # The listening socket was closed by shutdown_server
+                    else:
+                        self.read_hello(key.fileobj)
+                self.expire(time.monotonic())
+                self.apply_backpressure(tcp_socket)
+        finally:
+            for client_socket in list(self.pending):
+                self.drop(client_socket)
+            self.selector.close()
+
+    def next_timeout(self):
+        """Seconds until the oldest pending handshake expires, at most 1 to check now and then whether to stop."""
+        if not self.pending:
+            return 1.0
+        _, accepted, _ = next(iter(self.pending.values()))
+        return min(1.0, max(0.0, accepted + self.current_timeout() - time.monotonic()))
+
+    def accept(self, tcp_socket):
+        """Accepts the connections waiting in the queue, while pending slots are left. Returns False on error."""
+        while not self.full():
+            try:
+                client_socket, addr = tcp_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return True
+            except OSError:
+                return False
+            self.server.metrics.connections_accepted.inc()
+            self.server.metrics.handshakes_in_progress.inc()
+            client_socket.setblocking(False)
+            self.pending[client_socket] = (addr, time.monotonic(), time.monotonic_ns())
+            self.selector.register(client_socket, selectors.EVENT_READ)
+        return True
+
+    def apply_backpressure(self, tcp_socket):
+        """Stops accepting while every pending slot is taken, and resumes once one is free."""
+        full = self.full()
+        if full and not self.paused:
+            self.selector.unregister(tcp_socket)
+            self.paused = True
+        elif not full and self.paused:
+            self.selector.register(tcp_socket, selectors.EVENT_READ)
+            self.paused = False
+
+    def read_hello(self, client_socket):
+        """Reads the name a pending connection sent and hands the player to the server."""
+        addr, _, started = self.pending[client_socket]
+        try:
+            with self.server.receive_pool.buffer() as buffer:
+                protocol, player_name = GameProtocol.parse_hello(BufferPool.receive_into(client_socket, buffer))
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            print(f"{Colors.RED}Failed to handle client {addr}: {e}")
+            self.drop(client_socket)
+            return
+
+        self.forget(client_socket)
+        if not player_name:
+            self.server.metrics.handshake_failures.inc()
+            client_socket.close()
+            return
+        client_socket.setblocking(True)  # The game reads and writes with select and blocking calls
+        reason = self.rejection()
+        if reason is not None:
+            self.server.metrics.players_rejected.inc()
+            self.reject(client_socket, addr, protocol, reason)
+            return
+        self.server.admit_player(client_socket, addr, protocol, player_name, started)
+
+    def expire(self, now):
+        """Rejects the pending connections whose name did not arrive before their deadline."""
+        timeout = self.current_timeout()
+        while self.pending:
+            client_socket, (addr, accepted, _) = next(iter(self.pending.items()))
+            if accepted + timeout > now:
+                return
+            self.forget(client_socket)
+            self.server.metrics.handshake_failures.inc()
+            self.server.metrics.handshake_timeouts.inc()
+            self.reject(client_socket, addr, 0, self.TIMED_OUT)
+
+    def forget(self, client_socket):
+        """Takes a connection out of the pending table, its handshake is over."""
+        del self.pending[client_socket]
+        self.selector.unregister(client_socket)
+        self.server.metrics.handshakes_in_progress.dec()
+
+    def drop(self, client_socket):
+        """Closes a pending connection that failed."""
+        self.forget(client_socket)
+        self.server.metrics.handshake_failures.inc()
+        client_socket.close()
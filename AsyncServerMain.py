@@ -0,0 +1,480 @@
+import asyncio
+import random
+import socket
+import time
+from BroadcastFanout import BroadcastFanout
+from Colors import Colors
+from Discovery import Discovery
+from GameProtocol import GameProtocol
+from PlayerTable import RoundAnswers
+from ServerMain import ServerMain
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class DiscoveryResponder(asyncio.DatagramProtocol):
+    """Answers the discovery requests of clients on the event loop, see ServerMain.answer_discovery_requests."""
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        reply = self.server.discovery_reply(data)
+        if reply is not None:
+            self.transport.sendto(reply, addr)
+
+
+class AsyncServerMain(ServerMain):
+    """
+    Runs the trivia game on asyncio streams instead of a thread per activity.
+
+    The lobby rooms, the questions, the way answers are judged and the statistics are inherited from
+    ServerMain, only the networking is replaced: every client is a pair of StreamReader/StreamWriter objects
+    served by a single event loop, and every game is a task, so there is no worker cap and the cost of an idle
+    connection is just its buffers.
+
+    Attributes:
+        round_timeout (float): Seconds the players have to answer a question.
+        backlog (int): Listen backlog passed to the TCP server.
+        backlogged_since (dict): Time at which each slow player's writes stopped draining.
+        inboxes (dict): Maps each player's address to the queue of what it sent besides heartbeats, read by
+            collect_answers. None in a queue means the player is gone.
+        readers (dict): Maps each player's address to the task reading its connection for the whole session.
+    """
+
+    INBOX_SIZE = 8  # Messages kept per player between two reads, a client only sends one answer per round
+
+    def __init__(self, port=13117, lobby_timeout=10.0, max_players=None, questions_path=None, round_timeout=10.0,
+                 backlog=4096):
+        super().__init__(port, lobby_timeout, max_players, questions_path)
+        self.round_timeout = round_timeout
+        self.backlog = backlog
+        self.backlogged_since = {}
+        self.inboxes = {}
+        self.readers = {}
+        self.tcp_server = None
+        self.loop = None
+
+    def raise_file_limit(self):
+        """Raises the soft limit of open files to the hard limit so the loop can hold many sockets."""
+        if resource is None:
+            return
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            try:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            except (ValueError, OSError) as e:
+                print(f"{Colors.YELLOW}Could not raise the open files limit: {e}")
+
+    async def start_udp_broadcast(self):
+        """
+        Broadcasts the offer message every 2 seconds with the current TCP port, along with the leaderboard gossip,
+        and answers discovery requests.
+        """
+        transport, _ = await self.loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, family=socket.AF_INET, allow_broadcast=True)
+        discovery = None
+        discovery_socket = self.open_discovery_socket()
+        if discovery_socket is not None:
+            discovery, _ = await self.loop.create_datagram_endpoint(
+                lambda: DiscoveryResponder(self), sock=discovery_socket)
+        try:
+            while self.server_running:
+                message = Discovery.offer(self.server_name, self.tcp_port)
+                transport.sendto(message, ('<broadcast>', self.udp_broadcast_port))
+                transport.sendto(self.federation.gossip(), ('<broadcast>', self.udp_broadcast_port))
+                await asyncio.sleep(2)
+        finally:
+            transport.close()
+            if discovery is not None:
+                discovery.close()
+
+    async def accept_tcp_connections(self):
+        """Binds the TCP server to a random free port, retrying like the threaded server does."""
+        attempts = 0
+        while attempts < 50:
+            try:
+                self.tcp_server = await asyncio.start_server(
+                    self.handle_client, '', self.tcp_port, backlog=self.backlog, reuse_port=self.reuse_port or None)
+                print(f"{Colors.GREEN}Server started, listening on IP address {socket.gethostbyname(socket.gethostname())}")
+                return True
+            except OSError:
+                if self.reuse_port:
+                    break  # The port is shared with the other workers, it cannot be changed
+                print(f"{Colors.YELLOW}Port {self.tcp_port} is in use or cannot be bound. Trying another port...")
+                self.tcp_port = random.randint(1024, 65535)
+                attempts += 1
+
+        print(f"{Colors.RED}Failed to bind to a port after several attempts. Exiting.")
+        return False
+
+    async def handle_client(self, reader, writer):
+        """
+        Reads the player name within the handshake timeout and places the player in the lobby that is currently
+        open. The loop cannot stop accepting, so when max_pending handshakes are pending the oldest ones are shed,
+        and if none is old enough the new connection is turned away, like a player arriving at a full lobby.
+        """
+        addr = writer.get_extra_info('peername')
+        self.metrics.connections_accepted.inc()
+        admission = self.admission
+        if admission.full():
+            self.shed_handshakes()
+        if admission.full():
+            self.metrics.players_rejected.inc()
+            self.reject(writer, addr, 0, admission.SERVER_BUSY)
+            return
+        admission.pending[writer] = (addr, time.monotonic(), time.monotonic_ns())
+        self.metrics.handshakes_in_progress.inc()
+        started = time.monotonic_ns()
+        try:
+            data = await asyncio.wait_for(reader.read(1024), admission.handshake_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.handshake_failures.inc()
+            self.metrics.handshake_timeouts.inc()
+            self.reject(writer, addr, 0, admission.TIMED_OUT)
+            return
+        except (ConnectionError, OSError) as e:
+            self.metrics.handshake_failures.inc()
+            print(f"{Colors.RED}Failed to handle client {addr}: {e}")
+            writer.close()
+            return
+        finally:
+            if admission.pending.pop(writer, None) is not None:
+                self.metrics.handshakes_in_progress.dec()
+        if writer.is_closing():
+            return  # Shed to make room for newer connections
+
+        protocol, player_name = GameProtocol.parse_hello(data)
+        if not player_name:
+            self.metrics.handshake_failures.inc()
+            writer.close()
+            return
+        reason = admission.rejection()
+        if reason is not None:
+            self.metrics.players_rejected.inc()
+            self.reject(writer, addr, protocol, reason)
+            return
+
+        connection = writer.get_extra_info('socket')
+        if connection is not None:
+            self.liveness.configure(connection)
+        self.inboxes[addr] = asyncio.Queue(self.INBOX_SIZE)
+        room, player_name = self.scheduler.assign(player_name, (reader, writer), addr, protocol)
+        self.readers[addr] = self.loop.create_task(self.read_player(room, addr, reader))
+        ended = time.monotonic_ns()
+        self.metrics.handshake_seconds.observe((ended - started) / 1e9)
+        self.tracer.record("handshake", started, ended, 0)
+        self.journal.join(room.room_id, player_name, protocol, (ended - started) / 1e9)
+
+    def shed_handshakes(self):
+        """Turns away the pending handshakes older than busy_timeout, oldest first, to make room under a flood."""
+        admission = self.admission
+        now = time.monotonic()
+        for writer, (addr, accepted, _) in list(admission.pending.items()):
+            if accepted + admission.busy_timeout > now:
+                break
+            del admission.pending[writer]
+            self.metrics.handshakes_in_progress.dec()
+            self.metrics.handshake_failures.inc()
+            self.metrics.handshake_timeouts.inc()
+            self.reject(writer, addr, 0, admission.TIMED_OUT)
+
+    def reject(self, writer, addr, protocol, reason):
+        """Sends the reject message to a player and closes its connection once it is flushed."""
+        writer.write(self.admission.reject_message(protocol, reason))
+        writer.close()
+        print(f"{Colors.YELLOW}Rejected {addr}: {reason}")
+
+    def game_slots_full(self):
+        """Every game is a task of the event loop, there is no pool to fill."""
+        return False
+
+    def start_game(self, room):
+        """Plays the game of a room whose lobby just closed as a task of the event loop."""
+        self.record_lobby(room)
+        self.scheduler.queue_game()
+        self.loop.create_task(self.manage_game_rounds(room))
+
+    async def manage_game_rounds(self, room):
+        """Plays the rounds of a game until there is a single winner, with the same rules as ServerMain."""
+        self.scheduler.dequeue_game()
+        active_players = room.active_players()
+
+        round_number = 1
+        roster = None
+        deck = self.trivia_manager.new_deck(**self.question_filter)
+        game_started = self.trace_game_start(room)
+
+        try:
+            while len(active_players) >= 1:
+                round_started = time.monotonic_ns()
+                question_id, question, correct_answer = deck.draw()
+                self.journal.question(room.room_id, round_number, question_id)
+                message = self.build_round_message(room, round_number, active_players, question_id, question)
+                frame = self.build_round_frame(room, round_number, roster, question_id, question)
+                roster = room.players.snapshot()
+
+                self.check_players(room)
+                with self.phase(self.metrics.broadcast_seconds, "broadcast", room, round_number):
+                    await self.broadcast_question(room, active_players, message, frame)
+
+                collect_started = time.monotonic_ns()
+                with self.phase(self.metrics.collect_seconds, "collect", room, round_number):
+                    answers = await self.collect_answers(room, active_players)
+                self.trace_answers(room, round_number, collect_started, answers)
+                with self.phase(self.metrics.evaluate_seconds, "evaluate", room, round_number):
+                    winners = await self.evaluate_answers(room, answers, correct_answer)
+                self.metrics.rounds.inc()
+                self.tracer.record(f"round {round_number}", round_started, time.monotonic_ns(), room.room_id)
+
+                if self.game_continues(active_players, winners):
+                    round_number += 1
+                else:
+                    break
+
+            self.scheduler.show_results(room)
+            for addr in room.clients:
+                self.stop_reading(addr)  # The game is decided, players may hang up as soon as they hear about it
+            with self.phase(self.metrics.announce_seconds, "announce", room):
+                if active_players:
+                    winner_name, _ = next(iter(active_players.values()))
+                    await self.broadcast(room, room.clients, self.build_winner_message(active_players),
+                                         GameProtocol.game_over_frame(winner_name))
+                else:
+                    await self.broadcast(room, room.clients, self.build_no_winners_message(),
+                                         GameProtocol.game_over_frame())
+        except Exception as e:
+            print(f"{Colors.RED}Game aborted in room {room.room_id}: {e}")
+
+        self.tracer.record("game", game_started, time.monotonic_ns(), room.room_id)
+
+        await self.game_over(room)
+
+    async def broadcast(self, room, players, message, frame):
+        """
+        Writes the encoded message to every player, as text or as a binary frame, and waits for all the writes to
+        drain together for at most the fan-out flush timeout. Slow players are handled with the outbound policy.
+        """
+        now = time.monotonic()
+        drains = {}
+        for addr, (player_name, (_, writer)) in list(players.items()):
+            if writer.is_closing():
+                continue
+            if self.over_budget(room, addr, writer, now):
+                if room.outbound.policy == BroadcastFanout.EVICT:
+                    self.evict_player(room, addr)
+                else:
+                    room.outbound.dropped_messages += 1
+                continue
+            writer.write(frame if room.protocol(addr) else message)
+            drains[addr] = self.loop.create_task(writer.drain())
+
+        if drains:
+            await asyncio.wait(drains.values(), timeout=room.outbound.flush_timeout)
+
+        for addr, task in drains.items():
+            if not task.done():
+                task.cancel()
+                self.backlogged_since.setdefault(addr, now)
+            elif task.exception() is not None:
+                print(f"{Colors.RED}Error sending to player {players[addr][0]} at {addr}: {task.exception()}")
+                self.evict_player(room, addr)
+            else:
+                self.backlogged_since.pop(addr, None)
+
+    def over_budget(self, room, addr, writer, now):
+        """Checks a player's unsent bytes and how long its writes have been stuck against the outbound budget."""
+        if writer.transport.get_write_buffer_size() > room.outbound.max_queue_bytes:
+            return True
+        since = self.backlogged_since.get(addr)
+        return since is not None and now - since > room.outbound.max_queue_latency
+
+    def remove_from_game(self, room, addr):
+        """Takes a player out of its room and stops reading its connection, returns its (name, connection) or None."""
+        player = room.remove_player(addr)
+        self.backlogged_since.pop(addr, None)
+        self.stop_reading(addr)
+        return player
+
+    def close_connection(self, connection):
+        """Closes the connection of a player."""
+        _, writer = connection
+        writer.close()
+
+    def stop_reading(self, addr):
+        """Stops the reader task of a player and tells whoever waits for its answer that it is gone."""
+        reader_task = self.readers.pop(addr, None)
+        if reader_task is not None and reader_task is not asyncio.current_task():
+            reader_task.cancel()
+        inbox = self.inboxes.pop(addr, None)
+        if inbox is not None:
+            self.deliver(inbox, None)
+
+    @staticmethod
+    def deliver(inbox, data):
+        """Puts data in an inbox, dropping the oldest message of a full one, an answer nobody waited for."""
+        if inbox.full():
+            inbox.get_nowait()
+        inbox.put_nowait(data)
+
+    async def read_player(self, room, addr, reader):
+        """
+        Reads a player's connection from the handshake to game over. Heartbeats mark it alive, everything else goes
+        to its inbox, and a connection that closes or fails gets the player disconnected at once.
+        """
+        try:
+            while True:
+                data = await reader.read(1024)
+                if not data:
+                    reason = "it closed the connection"
+                    break
+                try:
+                    messages = self.split_messages(room, addr, data, time.monotonic())
+                except ValueError as e:
+                    reason = f"it sent a malformed frame ({e})"
+                    break
+                inbox = self.inboxes.get(addr)
+                if inbox is not None:
+                    for message in messages:
+                        self.deliver(inbox, message)
+        except (ConnectionError, OSError) as e:
+            reason = f"its connection failed ({e})"
+        self.reap_player(room, addr, reason)
+
+    def check_players(self, room):
+        """
+        Runs before every round: drops the answers that arrived after the last one closed, so they are not used
+        for the next question. Players disconnected since then already left the game with their room.
+        """
+        for addr in room.clients:
+            inbox = self.inboxes.get(addr)
+            while inbox is not None and not inbox.empty():
+                inbox.get_nowait()
+
+    async def reap_dead_players(self):
+        """Disconnects every player, in a lobby or in a game, that stopped sending heartbeats."""
+        while self.server_running:
+            await asyncio.sleep(self.reap_interval)
+            silent_since = self.liveness.silent_since(time.monotonic())
+            for room in self.scheduler.active_rooms():
+                for addr in room.players.silent(silent_since):
+                    self.reap_player(room, addr, "it stopped sending heartbeats")
+
+    async def broadcast_question(self, room, active_players, message, frame):
+        """Sends the trivia question to all active players."""
+        await self.broadcast(room, active_players, message, frame)
+
+    async def read_answer(self, inbox, started):
+        """
+        Waits for a single answer from a player's inbox, returns it with the seconds it took since started.
+        Raises ConnectionResetError if the player is disconnected meanwhile.
+        """
+        data = await inbox.get()
+        if data is None:
+            raise ConnectionResetError("the player was disconnected")
+        return self.parse_answer(data), time.monotonic() - started
+
+    async def collect_answers(self, room, active_players):
+        """
+        Waits on every active player at once, until all have answered or the round timeout expires, and returns
+        the RoundAnswers of those who did. Players that are disconnected meanwhile stop being waited for and are
+        left out of the answers.
+        """
+        started = time.monotonic()
+        tasks = {}
+        for addr in active_players:
+            inbox = self.inboxes.get(addr)
+            if inbox is not None:  # None when disconnected since the question was sent
+                tasks[room.players.index[addr]] = self.loop.create_task(self.read_answer(inbox, started))
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=self.round_timeout)
+
+        answers = RoundAnswers()
+        for index, task in tasks.items():
+            if not task.done():
+                task.cancel()
+            elif task.exception() is None:
+                answers.add(index, *task.result())
+        return answers
+
+    async def evaluate_answers(self, room, answers, correct_answer):
+        """Evaluates the collected answers, sends the round results to every player of the game, returns the winners."""
+        winners, players, outcomes = self.judge_answers(room, answers, correct_answer)
+        results = room.players.results(players, outcomes)
+        await self.broadcast(room, room.clients, self.build_results_message(results),
+                             GameProtocol.result_frame(results))
+        return winners
+
+    async def game_over(self, room):
+        """Records the finished game and closes the connections of its room."""
+        self.record_game(room)
+        self.metrics.games_finished.inc()
+
+        print(f"{Colors.BLUE}Game over in room {room.room_id}, closing its connections...")
+
+        for addr, (_, (_, writer)) in room.clients.items():
+            self.backlogged_since.pop(addr, None)
+            self.stop_reading(addr)
+            writer.close()
+        room.clients.clear()
+        self.scheduler.finish(room)
+
+    async def serve(self, beacon=True):
+        """Runs the beacon and the TCP server on the current event loop."""
+        self.loop = asyncio.get_running_loop()
+        self.scheduler.schedule = self.loop.call_later
+        self.raise_file_limit()
+        if not await self.accept_tcp_connections():
+            return
+        reaper = self.loop.create_task(self.reap_dead_players())
+        try:
+            async with self.tcp_server:
+                if beacon:
+                    await self.start_udp_broadcast()
+                else:
+                    await self.tcp_server.serve_forever()
+        finally:
+            reaper.cancel()
+
+    def start(self):
+        """Starts the server."""
+        asyncio.run(self.serve())
+
+    def start_worker(self):
+        """Serves games without a beacon, used by the workers of a ServerSupervisor."""
+        asyncio.run(self.serve(beacon=False))
+
+    def shutdown_server(self):
+        """Closes the listening socket and every client connection."""
+        self.server_running = False
+
+        for room in self.scheduler.active_rooms():
+            for _, (player_name, (_, writer)) in room.clients.items():
+                print(f"Closing connection for {player_name}")
+                writer.close()
+            room.clients.clear()
+
+        if self.tcp_server:
+            print(f"{Colors.BLUE}Closing the server socket...{Colors.END}")
+            self.tcp_server.close()
+        if self.stats_store is not None:
+            self.stats_store.close()
+        self.journal.close()
+        self.metrics.close()
+        self.stop_tracing()
+        print(f"{Colors.BLUE}Server has been shutdown cleanly.{Colors.END}")
+
+
+if __name__ == "__main__":
+    server = AsyncServerMain()
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        server.shutdown_server()
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from Colors import Colors
+from GameProtocol import GameProtocol, FrameReader
+from Percentiles import percentiles
+from TriviaQuestionManager import TriviaQuestionManager
+
+
+class Benchmark:
+    """
+    End-to-end benchmark of the server over loopback.
+
+    For every lobby size the server is started as a subprocess with a fixed seed, a short lobby and lobbies
+    that close as soon as they are full. Then games are played one after the other by scripted clients. Every
+    client answers right away, and player i gets round r right according to random.Random(seed, i, r), so
+    every run plays the same games. The server's stdout is discarded.
+
+    Metrics of each lobby size, in seconds unless stated otherwise:
+        time_to_first_question: from connecting to receiving the first question, per player.
+        fanout_latency: per round, between the first and the last player receiving the question.
+        answer_collection_latency: per round, from the last answer sent to the first result received.
+        games_per_minute: games completed per minute of wall time.
+        server_cpu_seconds: user plus system CPU time the server used (Linux only).
+        server_peak_rss_kb: peak resident memory of the server (Linux only).
+
+    Attributes:
+        sizes (list of int): Players per game of each scenario.
+        games (int): Games played per scenario.
+        seed (int): Seed of the server and of the clients.
+        backend (str): "threads" or "asyncio".
+        tcp_port (int): Loopback port the server is started on.
+        lobby_timeout (float): Lobby timeout passed to the server.
+    """
+
+    LOWER_IS_BETTER = ("time_to_first_question", "fanout_latency", "answer_collection_latency",
+                       "server_cpu_seconds", "server_peak_rss_kb")
+    HIGHER_IS_BETTER = ("games_per_minute",)
+
+    def __init__(self, sizes=(10, 100, 1000), games=3, seed=1, backend="threads", tcp_port=47117,
+                 lobby_timeout=0.5):
+        self.sizes = list(sizes)
+        self.games = games
+        self.seed = seed
+        self.backend = backend
+        self.tcp_port = tcp_port
+        self.lobby_timeout = lobby_timeout
+        self.trivia_manager = TriviaQuestionManager()
+
+    def server_command(self, players):
+        """Returns the command line of the server for lobbies of the given size."""
+        server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ServerMain.py")
+        return [sys.executable, "-u", server_path, "--backend", self.backend, "--seed", str(self.seed),
+                "--lobby-timeout", str(self.lobby_timeout), "--max-players", str(players),
+                "--quorum", "0",  # Every game gets exactly players players, however fast they join
+                "--tcp-port", str(self.tcp_port), "--stats-db", ""]
+
+    def start_server(self, players):
+        """Starts the server for lobbies of the given size and waits until it listens."""
+        server = subprocess.Popen(self.server_command(players), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        for line in server.stdout:
+            if b"Trying another port" in line:
+                server.terminate()
+                raise RuntimeError(f"Port {self.tcp_port} is in use, pick another one with --tcp-port")
+            if b"Server started" in line:
+                break
+        else:
+            raise RuntimeError("The server exited before it started listening")
+        # Keep draining its output so the server never blocks on a full pipe
+        threading.Thread(target=server.stdout.read, daemon=True).start()
+        return server
+
+    @staticmethod
+    def server_usage(pid):
+        """Returns (cpu seconds, peak rss in kB) of a running process from /proc, (None, None) elsewhere."""
+        try:
+            with open(f"/proc/{pid}/stat") as stat_file:
+                fields = stat_file.read().rsplit(")", 1)[1].split()
+            cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+            with open(f"/proc/{pid}/status") as status_file:
+                peak = next((int(line.split()[1]) for line in status_file if line.startswith("VmHWM:")), None)
+            return cpu, peak
+        except (OSError, ValueError, IndexError):
+            return None, None
+
+    async def play(self, player_id, game, rounds):
+        """Plays one scripted client through a game, filling rounds with what it saw of every round."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.tcp_port)
+        frames = FrameReader()
+        first_question = None
+        current = None
+        try:
+            writer.write(GameProtocol.hello(f"bench{game}-{player_id}"))
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return first_question
+                for message_type, payload in frames.feed(data):
+                    now = loop.time()
+                    if message_type == GameProtocol.QUESTION:
+                        round_number, question_id, _ = GameProtocol.parse_question(payload)
+                        if first_question is None:
+                            first_question = now - started
+                        current = rounds.setdefault(round_number, {"questions": [], "answers": [], "results": []})
+                        current["questions"].append(now)
+                        _, is_true = self.trivia_manager.get_question(question_id)
+                        right = random.Random(f"{self.seed}:{player_id}:{round_number}").random() < 0.5
+                        writer.write(GameProtocol.answer_frame(is_true if right else not is_true))
+                        current["answers"].append(loop.time())
+                    elif message_type == GameProtocol.RESULT and current is not None:
+                        current["results"].append(now)
+                    elif message_type == GameProtocol.GAME_OVER:
+                        return first_question
+        finally:
+            writer.close()
+
+    async def play_games(self, players):
+        """Plays the games of one scenario and returns the raw samples."""
+        first_questions = []
+        fanout = []
+        collection = []
+        started = time.monotonic()
+        for game in range(self.games):
+            rounds = {}
+            results = await asyncio.gather(*(self.play(player_id, game, rounds) for player_id in range(players)))
+            first_questions.extend(result for result in results if result is not None)
+            for current in rounds.values():
+                fanout.append(max(current["questions"]) - min(current["questions"]))
+                if current["answers"] and current["results"]:
+                    collection.append(min(current["results"]) - max(current["answers"]))
+        elapsed = time.monotonic() - started
+        return first_questions, fanout, collection, self.games * 60 / elapsed
+
+    def run_scenario(self, players):
+        """Runs the games of one lobby size against a fresh server and returns its metrics."""
+        server = self.start_server(players)
+        try:
+            cpu_before, _ = self.server_usage(server.pid)
+            first_questions, fanout, collection, games_per_minute = asyncio.run(self.play_games(players))
+            cpu_after, peak_rss = self.server_usage(server.pid)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+        return {
+            "time_to_first_question": percentiles(first_questions),
+            "fanout_latency": percentiles(fanout),
+            "answer_collection_latency": percentiles(collection),
+            "games_per_minute": games_per_minute,
+            "server_cpu_seconds": None if cpu_after is None else cpu_after - cpu_before,
+            "server_peak_rss_kb": peak_rss,
+        }
+
+    def run(self):
+        """Runs every scenario and returns the results, ready to be saved as a baseline."""
+        results = {
+            "meta": {"backend": self.backend, "seed": self.seed, "games": self.games,
+                     "lobby_timeout": self.lobby_timeout, "python": platform.python_version(),
+                     "machine": platform.machine(), "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "scenarios": {},
+        }
+        for players in self.sizes:
+            print(f"{Colors.BLUE}Benchmarking {self.games} games of {players} players...{Colors.END}")
+            results["scenarios"][str(players)] = self.run_scenario(players)
+        return results
+
+    @staticmethod
+    def flatten(metrics):
+        """Turns the metrics of a scenario into {name: value}, percentiles become name.p50 and so on."""
+        flat = {}
+        for name, value in metrics.items():
+            if isinstance(value, dict):
+                for point, point_value in value.items():
+                    flat[f"{name}.{point}"] = point_value
+            elif value is not None:
+                flat[name] = value
+        return flat
+
+    @staticmethod
+    def compare(baseline, results, threshold=0.2, noise=0.001):
+        """
+        Compares results against a baseline. Returns the list of regressions as (scenario, metric, baseline value,
+        new value), a metric regresses when it is worse than the baseline by more than threshold (a fraction)
+        and by more than noise in absolute terms, so sub-millisecond jitter is not flagged.
+        """
+        regressions = []
+        for scenario, metrics in results["scenarios"].items():
+            base = Benchmark.flatten(baseline["scenarios"].get(scenario, {}))
+            for name, value in Benchmark.flatten(metrics).items():
+                if name not in base:
+                    continue
+                metric = name.split(".")[0]
+                if metric in Benchmark.HIGHER_IS_BETTER:
+                    worse = value < base[name] * (1 - threshold)
+                else:
+                    worse = value > base[name] * (1 + threshold) and value - base[name] > noise
+                if worse:
+                    regressions.append((scenario, name, base[name], value))
+        return regressions
+
+    @staticmethod
+    def print_results(results):
+        """Prints the metrics of every scenario."""
+        for scenario, metrics in results["scenarios"].items():
+            print(f"{Colors.END}{scenario} players:")
+            for name, value in Benchmark.flatten(metrics).items():
+                print(f"  {name}: {value:.4f}" if isinstance(value, float) else f"  {name}: {value}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Loopback benchmark of the trivia server")
+    parser.add_argument("--sizes", default="10,100,1000", help="comma separated players per game")
+    parser.add_argument("--games", type=int, default=3, help="games played per size")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the server and the clients")
+    parser.add_argument("--backend", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--tcp-port", type=int, default=47117, help="loopback port the server listens on")
+    parser.add_argument("--save", default=None, help="write the results to this JSON baseline")
+    parser.add_argument("--compare", default=None, help="compare the results with this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fraction a metric may get worse than the baseline before it is flagged")
+    args = parser.parse_args()
+
+    benchmark = Benchmark([int(size) for size in args.sizes.split(",")], args.games, args.seed, args.backend,
+                          args.tcp_port)
+    results = benchmark.run()
+    Benchmark.print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"{Colors.GREEN}Saved the results to {args.save}{Colors.END}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = Benchmark.compare(json.load(baseline_file), results, args.threshold)
+        for scenario, name, before, after in regressions:
+            print(f"{Colors.RED}Regression with {scenario} players: {name} went from {before:.4f} to {after:.4f}{Colors.END}")
+        if regressions:
+            sys.exit(1)
+        print(f"{Colors.GREEN}No regression against {args.compare}{Colors.END}")
@@ -1,99 +1,35 @@
 import random
-import select
-import time
 from ClientMain import ClientMain
-from Colors import Colors
 
 
 class BotClient(ClientMain):
     """
     BotClient extends ClientMain to interact with a game server automatically.
     """
-    def _init_(self):
+    def __init__(self, answer_delay=5.0):
         """Initialize the bot client by calling the superclass's initializer."""
-        super()._init_()
+        super().__init__()
+        self.reads_input = False
+        self.answer_delay = answer_delay  # Seconds the bot thinks before answering
 
-    # Overriding the game_mode method
-    def game_mode(self):
+    # Overriding the on_question method
+    def on_question(self, now):
         """
-          Handles the game mode by listening for server messages and responding to game prompts.
+        Answers a 'True or false' prompt automatically with a random answer after a short delay.
 
-          Continuously listens for messages from the server over a TCP socket. On receiving a 'True or false' prompt,
-          it automatically sends a random answer after a short delay. If a 'Game over!' message is received, it breaks
-          the loop and ends the game session.
+        ClientMain.game_mode takes care of reading and rendering the server messages, text or binary,
+        of sending the answer once it is due and of ending the session on 'Game over!'.
         """
-        try:
-            game_over_received = False
-            while not game_over_received:
-                # Block until there are sockets ready for reading
+        # Simulate a delay in response to make bot's behavior more realistic
+        self.question_at = now
+        self.answer_due = now + self.answer_delay
+        self.due_answer = random.choice(['Y', '1', 'T', 'N', '0', 'F'])
 
+    def choose_name(self):
+        """Picks a random name marked as a bot's."""
+        return "Bot:" + random.choice(self.player_names)
 
-                readable, _, _ = select.select([self.tcp_socket], [], [], None)
-                if self.tcp_socket in readable:
-                    # self.send_heartbeat()
-                    try:
-                        message = self.tcp_socket.recv(1024).decode().strip()
-                        if message != '':
 
-                            print(f"\n{message}") # Print the message from the server
-                            if "Game over!" in message:
-                                game_over_received = True # End the loop if game over message is received
-
-                            print(f"\n{message}")
-                            if "Game over!" in message:
-                                game_over_received = True
-
-                                break
-                            if "True or false" in message:
-                                # Start a timer for 10 seconds to wait for an answer
-                                start_time = time.time()
-                                while (time.time() - start_time) < 10:
-
-                                    # Simulate a delay in response to make bot's behavior more realistic
-
-                                    time.sleep(5)
-                                    answer = random.choice(['Y', '1', 'T', 'N', '0', 'F'])
-                                    # self.send_heartbeat()
-                                    self.tcp_socket.sendall(answer.encode())
-                                    break
-                        else:
-                            # if message from server is empty - close connection
-                            self.tcp_socket.close()
-                            self.listen_for_udp_broadcast()
-
-                    except Exception as e:
-                        print(f"{Colors.RED}KeyBoardInterapt {Colors.END}")
-
-
-        except Exception as e:
-            print(f"{Colors.RED}[Bot {self.name}] An error occurred: {e}{Colors.END}")
-
-        finally:
-            print(f"{Colors.END}Server disconnected, listening for offer requests...\n")
-            self.tcp_socket.close()
-            self.listen_for_udp_broadcast()
-
-    def run(self):
-        """
-        Main loop to continuously try connecting and playing the game.
-
-        It sets a random name for the bot, listens for server broadcasts, connects to the game server,
-        and enters the game mode. If an error occurs, it attempts to reconnect after closing any existing socket.
-        """
-        while True:
-            try:
-                self.name = "Bot:" + random.choice(self.player_names)
-                self.listen_for_udp_broadcast()
-                self.connect_to_server()
-                self.game_mode()
-
-            except Exception as e:
-                print(f"{Colors.RED}Error encountered: {e}. Attempting to reconnect...{Colors.END}")
-
-                if self.tcp_socket:
-                    self.tcp_socket.close()  # Ensure the socket is closed before retrying
-
-
-if _name_ == "_main_":
+if __name__ == "__main__":
     bot = BotClient()
     bot.run()
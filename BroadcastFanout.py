@@ -0,0 +1,185 @@
+import selectors
+import time
+from collections import deque
+
+
+class ClientWriteQueue:
+    """
+    Outgoing messages of a single client, written with non-blocking sends.
+
+    Attributes:
+        client_socket (socket.socket): The socket of the client, switched to non-blocking mode.
+        messages (deque): Pairs of (memoryview of the unsent bytes, time the message was queued).
+        queued_bytes (int): Number of bytes waiting to be sent.
+    """
+
+    def __init__(self, client_socket):
+        self.client_socket = client_socket
+        self.client_socket.setblocking(False)
+        self.messages = deque()
+        self.queued_bytes = 0
+
+    def push(self, payload):
+        """Queues a message behind the ones that were not sent yet."""
+        self.messages.append((memoryview(payload), time.monotonic()))
+        self.queued_bytes += len(payload)
+
+    def flush(self):
+        """Sends as much as the socket accepts without blocking. Returns True once the queue is empty."""
+        while self.messages:
+            view, queued_at = self.messages[0]
+            try:
+                sent = self.client_socket.send(view)
+            except (BlockingIOError, InterruptedError):
+                return False
+            self.queued_bytes -= sent
+            if sent < len(view):
+                self.messages[0] = (view[sent:], queued_at)
+                return False
+            self.messages.popleft()
+        return True
+
+    def oldest_age(self, now):
+        """Seconds the oldest unsent message has been waiting."""
+        if not self.messages:
+            return 0.0
+        return now - self.messages[0][1]
+
+    def drop_unsent(self):
+        """
+        Drops every message that was not started and returns how many were dropped.
+        A partially sent message is kept so the client never receives half of it.
+        """
+        started = None
+        if self.messages:
+            view, queued_at = self.messages[0]
+            if len(view) < len(view.obj):
+                started = (view, queued_at)
+        dropped = len(self.messages) - (1 if started else 0)
+        self.messages.clear()
+        self.queued_bytes = 0
+        if started:
+            self.messages.append(started)
+            self.queued_bytes = len(started[0])
+        return dropped
+
+
+class BroadcastFanout:
+    """
+    Sends the same payload to many clients without letting one slow client hold back the others.
+
+    Every message is queued on each client and written with non-blocking sends, so all the players get the
+    first bytes at the same time. What could not be written is flushed for at most flush_timeout seconds.
+    A client whose queue goes over max_queue_bytes, or whose oldest message waits longer than
+    max_queue_latency, is a slow consumer: with the "drop" policy its queued messages are discarded,
+    with the "evict" policy it is reported back to the caller to be disconnected.
+    """
+
+    DROP = "drop"
+    EVICT = "evict"
+
+    def __init__(self, max_queue_bytes=256 * 1024, max_queue_latency=5.0, flush_timeout=1.0, policy=EVICT):
+        if policy not in (self.DROP, self.EVICT):
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.max_queue_bytes = max_queue_bytes
+        self.max_queue_latency = max_queue_latency
+        self.flush_timeout = flush_timeout
+        self.policy = policy
+        self.queues = {}  # Maps client address to its ClientWriteQueue
+        self.dropped_messages = 0
+
+    def queue_for(self, addr, client_socket):
+        """Returns the write queue of a client, creating it on first use."""
+        queue = self.queues.get(addr)
+        if queue is None or queue.client_socket is not client_socket:
+            queue = ClientWriteQueue(client_socket)
+            self.queues[addr] = queue
+        return queue
+
+    def send(self, players, payload):
+        """
+        Queues payload for every player (a dict of address -> (name, socket)) and flushes the queues.
+        Returns the addresses of the players that failed or must be evicted.
+        """
+        failed = self.enqueue(players, payload)
+        failed.extend(self.flush([addr for addr in players if addr not in failed]))
+        return failed
+
+    def enqueue(self, players, payload):
+        """Queues payload for every player without sending it, returns the addresses that failed."""
+        failed = []
+        for addr, (_, client_socket) in list(players.items()):
+            try:
+                self.queue_for(addr, client_socket).push(payload)
+            except OSError:
+                failed.append(addr)
+        return failed
+
+    def flush(self, addrs=None, timeout=None):
+        """Writes the pending queues until they drain or the timeout expires, returns the failed addresses."""
+        if timeout is None:
+            timeout = self.flush_timeout
+        if addrs is None:
+            addrs = list(self.queues)
+        deadline = time.monotonic() + timeout
+        failed = []
+        pending = {}
+
+        # One non-blocking pass over everybody first, so no client waits for another
+        for addr in addrs:
+            queue = self.queues.get(addr)
+            if queue is None:
+                continue
+            try:
+                if not queue.flush():
+                    pending[addr] = queue
+            except OSError:
+                failed.append(addr)
+
+        if pending:
+            with selectors.DefaultSelector() as selector:
+                for addr, queue in pending.items():
+                    selector.register(queue.client_socket, selectors.EVENT_WRITE, addr)
+                while selector.get_map():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    for key, _ in selector.select(remaining):
+                        addr = key.data
+                        try:
+                            if pending[addr].flush():
+                                selector.unregister(key.fileobj)
+                        except OSError:
+                            selector.unregister(key.fileobj)
+                            failed.append(addr)
+
+        failed.extend(self.enforce_budget(addr for addr in pending if addr not in failed))
+        for addr in failed:
+            self.forget(addr)
+        return failed
+
+    def enforce_budget(self, addrs):
+        """Applies the slow consumer policy, returns the addresses to evict."""
+        now = time.monotonic()
+        evicted = []
+        for addr in addrs:
+            queue = self.queues[addr]
+            if queue.queued_bytes <= self.max_queue_bytes and queue.oldest_age(now) <= self.max_queue_latency:
+                continue
+            if self.policy == self.EVICT:
+                evicted.append(addr)
+            else:
+                self.dropped_messages += queue.drop_unsent()
+        return evicted
+
+    def pending_bytes(self):
+        """Total number of bytes waiting in all the queues."""
+        return sum(queue.queued_bytes for queue in self.queues.values())
+
+    def forget(self, addr):
+        """Removes the queue of a client that left the game."""
+        self.queues.pop(addr, None)
+
+    def clear(self):
+        """Removes every queue, used when all the connections of a game are closed."""
+        self.queues.clear()
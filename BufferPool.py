@@ -0,0 +1,62 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class BufferPool:
+    """
+    Preallocated receive buffers for recv_into, so reading a name or an answer does not allocate.
+
+    Buffers are handed out with acquire (or the buffer context manager) and returned with release. A request
+    served from the pool is a hit, one that has to allocate a new buffer because all of them are in use is a
+    miss. At most capacity buffers are kept, extra ones are left to the garbage collector when released.
+
+    Attributes:
+        buffer_size (int): Size in bytes of every buffer.
+        capacity (int): Maximum number of idle buffers kept in the pool.
+        hits (int): Buffers served from the pool.
+        misses (int): Buffers that had to be allocated.
+    """
+
+    def __init__(self, buffer_size=1024, preallocate=64, capacity=1024):
+        self.buffer_size = buffer_size
+        self.capacity = capacity
+        self.free = deque(bytearray(buffer_size) for _ in range(preallocate))
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a buffer from the pool, allocating one if the pool is empty."""
+        with self.lock:
+            if self.free:
+                self.hits += 1
+                return self.free.pop()
+            self.misses += 1
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer):
+        """Gives a buffer back to the pool."""
+        with self.lock:
+            if len(self.free) < self.capacity:
+                self.free.append(buffer)
+
+    @contextmanager
+    def buffer(self):
+        """Lends a buffer for the duration of a with block."""
+        buffer = self.acquire()
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def counters(self):
+        """Returns the hit and miss counters and the number of idle buffers."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "idle": len(self.free)}
+
+    @staticmethod
+    def receive_into(sock, buffer):
+        """Reads from sock into buffer and returns a memoryview of the bytes received, empty when the peer closed."""
+        nbytes = sock.recv_into(buffer)
+        return memoryview(buffer)[:nbytes]
@@ -1,13 +1,19 @@
 import socket
-import select
+import selectors
 import struct
+import sys
+import threading
 import random
 import time
 import subprocess
 import os
 import platform
-from inputimeout import inputimeout, TimeoutOccurred
 from Colors import Colors
+from BufferPool import BufferPool
+from Discovery import Discovery, ServerCache
+from GameProtocol import GameProtocol, FrameReader
+from Liveness import Liveness
+from Percentiles import percentiles
 
 
 class ClientMain:
@@ -22,10 +28,34 @@ class ClientMain:
         name (str): The selected name for this client session.
         server_ip (str): The IP address of the server obtained from the UDP broadcast.
         server_port (int): The TCP port number of the server for game communication.
+        server_version (int): GameProtocol version the server advertised in its discovery reply, 0 for a server
+            only known from its broadcast offer, which may predate GameProtocol and is sent a text name.
         tcp_socket (socket.socket): The TCP socket used for sending and receiving data during the game.
+        frames (FrameReader): Reassembles the frames of a server that speaks GameProtocol, None for a text server.
+        roster (list of str): Players still in the game, as announced by the ROSTER frames.
+        receive_buffer (bytearray): Preallocated buffer every server message is read into.
+        answer_timeout (float): Seconds the player has to type an answer.
+        reads_input (bool): Whether the answers are typed on stdin, False for players that answer from code.
+        question_at (float or None): time.monotonic the question being answered arrived at, None between questions.
+        answer_due (float or None): time.monotonic at which due_answer is sent if nothing was typed by then.
+        due_answer (str): Answer sent at answer_due.
+        answer_times (list of float): Seconds from receiving each question to sending its answer, this game.
+        connect_rtt (float or None): Seconds the TCP handshake with the server took, a round trip.
+        liveness (Liveness): TCP keepalive settings of the game connection.
+        state (str): Where the session is in its lifecycle: LISTENING for an offer, CONNECTING to the server
+            that sent it, then PLAYING until the game ends, and back to LISTENING.
+        server_cache (ServerCache): Servers heard from recently, the next game starts on the fastest one
+            without waiting for an offer.
+        reconnecting (bool): Whether the server being connected to was taken from the cache.
+        connect_timeout (float): Seconds a connection attempt may take.
+        rejected (bool): Whether the last server turned the player away, the next one is looked for after a pause.
     """
 
-    def _init_(self):
+    LISTENING = "listening"
+    CONNECTING = "connecting"
+    PLAYING = "playing"
+
+    def __init__(self):
         """
         Initializes a new client session. Sets up the list of potential player names and resets
         connection details.
@@ -76,7 +106,26 @@ class ClientMain:
         self.name = None
         self.server_ip = None
         self.server_port = None
+        self.server_version = 0
         self.tcp_socket = None
+        self.frames = None
+        self.roster = []
+        self.receive_buffer = bytearray(4096)
+        self.answer_timeout = 10.0
+        self.reads_input = True
+        self.input_source = None  # What the selector watches for typed lines, see open_input
+        self.typed = b""  # Typed bytes not ending with a newline yet
+        self.question_at = None
+        self.answer_due = None
+        self.due_answer = 'no answer'
+        self.answer_times = []
+        self.connect_rtt = None
+        self.liveness = Liveness()
+        self.state = self.LISTENING
+        self.server_cache = ServerCache()
+        self.reconnecting = False
+        self.connect_timeout = 2.0
+        self.rejected = False
 
     def listen_for_udp_broadcast(self):
         """
@@ -84,115 +133,389 @@ class ClientMain:
         from the broadcasted messages, which indicate where the server is listening for incoming TCP
         connections.
         """
-        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-        # Attempt to set SO_REUSEPORT for compatibility with multiple clients on the same host
-        try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
             udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        except AttributeError:
-            print(
-                f"{Colors.RED}SO_REUSEADDR is not supported on this platform. Continuing with SO_REUSEADDR only.{Colors.END}")
 
-        udp_socket.bind(('', 13117))  # Assuming 13117 is the broadcast port
-        print(f"{Colors.PASTEL_GREEN}Client started, listening for offer requests...")
+            # Attempt to set SO_REUSEPORT for compatibility with multiple clients on the same host
+            try:
+                udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            except AttributeError:
+                print(
+                    f"{Colors.RED}SO_REUSEADDR is not supported on this platform. Continuing with SO_REUSEADDR only.{Colors.END}")
 
-        while True:
-            data, addr = udp_socket.recvfrom(1024)
-            magic_cookie, message_type = struct.unpack('!Ib', data[:5])
-            # Directly extract the server port from the correct position
-            server_port = struct.unpack('!H', data[-2:])[0]  # Extract the last 2 bytes for the server port
-            if magic_cookie == 0xabcddcba and message_type == 0x2:
-                self.server_ip = addr[0]
-                self.server_port = server_port
-                print(f"Received offer from server Mystic at address {self.server_ip}, attempting to connect...")
-
-                udp_socket.close()
-                break
+            udp_socket.bind(('', 13117))  # Assuming 13117 is the broadcast port
+            print(f"{Colors.PASTEL_GREEN}Client started, listening for offer requests...")
+
+            while True:
+                data, addr = udp_socket.recvfrom(1024)
+                offer = Discovery.parse_offer(data)
+                if offer is not None:
+                    server_name, self.server_port, _, self.server_version = offer
+                    self.server_ip = addr[0]
+                    self.server_cache.add(self.server_ip, self.server_port, server_name)
+                    print(f"Received offer from server Mystic at address {self.server_ip}, attempting to connect...")
+                    break
+
+    def find_server(self):
+        """
+        Finds a server to play on. Asks every server on the network for an offer and picks the one that answered
+        fastest, and only if none answers waits for the offer servers broadcast every 2 seconds.
+        """
+        offers = Discovery.discover()
+        for rtt, server_name, ip, tcp_port, version in offers:
+            self.server_cache.add(ip, tcp_port, server_name, rtt, version)
+        if not offers:
+            self.listen_for_udp_broadcast()
+            return
+        rtt, server_name, self.server_ip, self.server_port, self.server_version = offers[0]
+        print(f"Received offer from server {server_name} at address {self.server_ip} "
+              f"({rtt * 1000:.1f} ms), attempting to connect...")
 
     def connect_to_server(self):
         """
         Establishes a TCP connection to the server using the IP and port number obtained from the
-        UDP broadcast. Sends the client's player name to the server upon connection.
+        UDP broadcast. Sends the client's player name to the server upon connection, inside a
+        GameProtocol HELLO to a server that advertised it, which then answers with binary frames, and as
+        plain text to any other server.
         """
         self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.liveness.configure(self.tcp_socket)  # Notices a server that vanished without closing the connection
+        self.tcp_socket.settimeout(self.connect_timeout)
+        connecting = time.monotonic()
         self.tcp_socket.connect((self.server_ip, self.server_port))
+        self.connect_rtt = time.monotonic() - connecting
+        self.tcp_socket.settimeout(None)
+        self.frames = None
+        self.roster = []
+        self.rejected = False
         try:
-            self.tcp_socket.sendall((self.name + '\n').encode())
+            if self.server_version:
+                self.tcp_socket.sendall(GameProtocol.hello(self.name, min(self.server_version, GameProtocol.VERSION)))
+                self.frames = FrameReader()
+            else:
+                self.tcp_socket.sendall((self.name + '\n').encode())
         except Exception as e:
             print(f"{Colors.RED}Error communicating with server: {e}{Colors.END}")
 
+    def send_heartbeat(self):
+        """Sends one HEARTBEAT frame, only in a binary session: a text server would read it as an answer."""
+        if self.frames is not None:
+            self.send(GameProtocol.heartbeat_frame())
+
+    def send(self, data):
+        """Sends data on the game connection."""
+        self.tcp_socket.sendall(data)
+
     def game_mode(self):
         """
         Handles the game mode interactions. Receives game questions and sends answers within the
         stipulated time. This function processes all incoming messages during the game and ensures
         timely responses to maintain the game flow.
+
+        The whole game runs on this thread: a selector waits on the game connection and on what the player
+        types, so server messages are read and rendered while an answer is being typed, and its timeout sends
+        the heartbeats of a binary session every GameProtocol.HEARTBEAT_INTERVAL seconds and the answer once
+        it is due.
+
+        A server the session was opened with a HELLO answers with binary frames, which are reassembled
+        and rendered here. A server that was sent a text name answers with colored text, which is handled
+        as before.
         """
+        self.answer_times = []
+        self.close_question()
+        selector = selectors.DefaultSelector()
         try:
+            selector.register(self.tcp_socket, selectors.EVENT_READ)
+            input_source = self.open_input()
+            if input_source is not None:
+                selector.register(input_source, selectors.EVENT_READ)
+            next_heartbeat = time.monotonic() + GameProtocol.HEARTBEAT_INTERVAL
             game_over_received = False
             while not game_over_received:
-                readable, _, _ = select.select([self.tcp_socket], [], [], None)
-                if self.tcp_socket in readable:
-                    # self.send_heartbeat()
-                    message = self.tcp_socket.recv(1024).decode().strip()
-
-                    if message != '':
-                        print(f"\n{message}")
-                        if "you did not respond in time!" in message:
-                            continue
-                        if "Game over!" in message:
-                            game_over_received = True  # Set flag to indicate game over message received
-                            break
-                        if "True or false" in message:
-                            # Provide a prompt for the user to input their answer within 10 seconds
-                            answer = 'no answer'
-                            try:
-                                answer = inputimeout("Your answer (Y/1/T - for True || N/0/F - for False): ",
-                                                     timeout=10).strip().upper()
-                                if answer in ['Y', '1', 'T', 'N', '0', 'F']:
-                                    pass
-                                else:
-                                    print(
-                                        f"{Colors.YELLOW}Invalid input. Please insert Y/1/T - for True || N/0/F - for False")
-
-                            except Exception as e:
-                                answer = 'no answer'
-                            finally:
-                                # self.send_heartbeat()
-                                self.tcp_socket.sendall(answer.encode())
-                    else:
-                        self.tcp_socket.close()
-                        self.listen_for_udp_broadcast()
+                wakeup = next_heartbeat if self.answer_due is None else min(next_heartbeat, self.answer_due)
+                for key, _ in selector.select(max(0.0, wakeup - time.monotonic())):
+                    if key.fileobj is not self.tcp_socket:
+                        if not self.read_input():
+                            selector.unregister(input_source)  # stdin was closed, only timeouts answer now
+                        continue
+                    data = BufferPool.receive_into(self.tcp_socket, self.receive_buffer)
+                    if not data:
+                        return  # Server closed the connection
+                    game_over_received = self.handle_data(data)
+                    if game_over_received:
+                        break
+
+                now = time.monotonic()
+                if self.answer_due is not None and now >= self.answer_due:
+                    if self.reads_input:
+                        print(f"\n{Colors.YELLOW}Time is up!{Colors.END}")
+                    self.answer(self.due_answer, now)
+                if now >= next_heartbeat:
+                    self.send_heartbeat()
+                    next_heartbeat = now + GameProtocol.HEARTBEAT_INTERVAL
+            self.print_game_stats()
 
         except Exception as e:
             print(f"{Colors.RED}An error occurred: {e}{Colors.END}")
 
         finally:
+            selector.close()
             print(f"{Colors.BOLD}Server disconnected, listening for offer requests...\n")
+            self.disconnect()
+
+    def handle_data(self, data):
+        """Handles a chunk received from the server, binary or text. Returns True once the game is over."""
+        if self.frames is not None:
+            return self.handle_frames(data)
+
+        message = str(data, 'utf-8', 'ignore').strip()
+        if message != '':
+            print(f"\n{message}")
+            if "you did not respond in time!" in message:
+                return False
+            if "Game over!" in message:
+                return True
+            if "True or false" in message:
+                self.on_question(time.monotonic())
+        return False
+
+    def open_input(self):
+        """
+        Returns what the selector watches for the lines the player types, None for a player that answers from
+        code. That is stdin itself, except on Windows, where select only takes sockets: there a thread copies
+        the typed lines to one end of a socket pair, and the selector watches the other.
+        """
+        if not self.reads_input:
+            return None
+        if self.input_source is None:
+            if platform.system() == "Windows":
+                self.input_source, writer = socket.socketpair()
+                threading.Thread(target=self.copy_input, args=(writer,), daemon=True).start()
+            else:
+                self.input_source = sys.stdin
+        return self.input_source
+
+    @staticmethod
+    def copy_input(writer):
+        """Input thread on Windows: copies the typed lines to a socket until stdin is closed."""
+        with writer:
+            for line in sys.stdin:
+                writer.sendall(line.encode('utf-8'))
+
+    def read_input(self):
+        """Reads what the player typed and answers with every complete line. Returns False once input is closed."""
+        if isinstance(self.input_source, socket.socket):
+            data = self.input_source.recv(1024)
+        else:
+            data = os.read(self.input_source.fileno(), 1024)
+        if not data:
+            return False
+        *lines, self.typed = (self.typed + data).split(b"\n")
+        for line in lines:
+            self.on_input(line.decode('utf-8', 'ignore').strip().upper())
+        return True
+
+    def on_input(self, answer):
+        """Answers the open question with a typed line, asking again if it is not a valid answer."""
+        if self.question_at is None:
+            return  # Typed between two questions
+        if answer in ['Y', '1', 'T', 'N', '0', 'F']:
+            self.answer(answer, time.monotonic())
+            return
+        print(f"{Colors.YELLOW}Invalid input. Please insert Y/1/T - for True || N/0/F - for False")
+        self.prompt()
+
+    def on_question(self, now):
+        """Opens a question received at now: the player has answer_timeout seconds to type its answer."""
+        self.question_at = now
+        self.answer_due = now + self.answer_timeout
+        self.due_answer = 'no answer'
+        self.prompt()
+
+    def prompt(self):
+        """Asks the player for an answer, without waiting for it."""
+        print("Your answer (Y/1/T - for True || N/0/F - for False): ", end="", flush=True)
+
+    def answer(self, answer, now):
+        """Sends the answer to the open question and notes how long it took."""
+        if self.question_at is None:
+            return
+        if answer != 'no answer':
+            self.answer_times.append(now - self.question_at)
+        self.close_question()
+        self.send_answer(answer)
+
+    def close_question(self):
+        """Stops waiting for an answer, the question was answered or its round is over."""
+        self.question_at = None
+        self.answer_due = None
+
+    @staticmethod
+    def kernel_rtt(tcp_socket):
+        """Returns the smoothed round trip the kernel measured on a connection in seconds, None off Linux."""
+        if not hasattr(socket, "TCP_INFO"):
+            return None
+        try:
+            info = tcp_socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 104)
+            (rtt,) = struct.unpack_from("I", info, 68)  # tcpi_rtt, in microseconds
+        except (OSError, struct.error):
+            return None
+        return rtt / 1e6
+
+    def print_game_stats(self):
+        """Prints the round trip to the server and the time the player took to answer, at game over."""
+        round_trips = []
+        if self.connect_rtt is not None:
+            round_trips.append(f"{self.connect_rtt * 1000:.1f} ms to connect")
+        kernel_rtt = self.kernel_rtt(self.tcp_socket)
+        if kernel_rtt:
+            round_trips.append(f"{kernel_rtt * 1000:.1f} ms smoothed by the kernel")
+        if round_trips:
+            print(f"{Colors.END}Round trip to the server: {', '.join(round_trips)}")
+        answer_times = percentiles(self.answer_times)
+        if answer_times:
+            print(f"Your answer time over {len(self.answer_times)} answers: "
+                  + ", ".join(f"{name} {value:.2f}s" for name, value in answer_times.items()))
+
+    def disconnect(self):
+        """Closes the game connection."""
+        if self.tcp_socket:
             self.tcp_socket.close()
-            self.listen_for_udp_broadcast()
+        self.tcp_socket = None
+        self.frames = None
+
+    def handle_frames(self, data):
+        """Renders the complete frames in data and answers the questions. Returns True once the game is over."""
+        for message_type, payload in self.frames.feed(data):
+            message = self.render_frame(message_type, payload)
+            if message:
+                print(f"\n{message}")
+            if message_type == GameProtocol.GAME_OVER:
+                return True
+            if message_type == GameProtocol.REJECT:
+                # A full server is not the one to reconnect to right away
+                self.rejected = True
+                self.server_cache.forget(self.server_ip, self.server_port)
+                return True
+            if message_type == GameProtocol.QUESTION:
+                self.on_question(time.monotonic())
+            elif message_type == GameProtocol.RESULT:
+                self.close_question()  # Too late to answer, the round is over
+        return False
+
+    def render_frame(self, message_type, payload):
+        """Turns a frame from the server into the text the server would have sent, updating the roster."""
+        if message_type == GameProtocol.ROSTER:
+            joined, left = GameProtocol.parse_roster(payload)
+            self.roster = [name for name in self.roster if name not in left] + joined
+            return None
+
+        if message_type == GameProtocol.QUESTION:
+            round_number, _, question = GameProtocol.parse_question(payload)
+            question = f'{Colors.BOLD}True or false:{question}{Colors.END}'
+            if round_number == 1:
+                message = f"{Colors.PASTEL_PEACH}Welcome to the Mystic server, where we are answering trivia questions about the Bible.\n"
+                for idx, player_name in enumerate(self.roster, start=1):
+                    message += f"Player {idx}: {player_name}\n"
+                return message + "==\n" + question
+            if len(self.roster) > 1:
+                players_list = ', '.join(self.roster[:-1]) + ' and ' + self.roster[-1]
+            else:
+                players_list = ''.join(self.roster)
+            return f"{Colors.PASTEL_PEACH}{Colors.UNDERLINE}Round {round_number}, played by {players_list}:\n{Colors.END}{Colors.PASTEL_PEACH}{question}"
+
+        if message_type == GameProtocol.RESULT:
+            outcomes = GameProtocol.parse_result(payload)
+            correct = [name for name, outcome in outcomes if outcome == GameProtocol.CORRECT]
+            lines = []
+            for player_name, outcome in outcomes:
+                if outcome == GameProtocol.CORRECT:
+                    line = f"{Colors.PASTEL_ORANGE}{player_name} is correct!{Colors.END}"
+                    if len(correct) == 1:
+                        line += f" {Colors.PASTEL_ORANGE}{player_name} Wins!{Colors.END}"
+                elif outcome == GameProtocol.NO_RESPONSE:
+                    line = f"{Colors.END}{Colors.PASTEL_ORANGE}{player_name} did not respond on time!{Colors.END}"
+                else:
+                    line = f"{Colors.PASTEL_ORANGE}{player_name} is incorrect!{Colors.END}"
+                lines.append(line)
+            return "\n".join(lines)
+
+        if message_type == GameProtocol.GAME_OVER:
+            winner_name = GameProtocol.parse_game_over(payload)
+            if winner_name is None:
+                return f"{Colors.BOLD}Game over!\nNo winners"
+            return f"{Colors.PASTEL_BLUE}{Colors.BOLD}Game over!\nCongratulations to the winner: {winner_name}"
+
+        if message_type == GameProtocol.REJECT:
+            return f"{Colors.RED}The server turned you away: {GameProtocol.parse_reject(payload)}{Colors.END}"
+
+        return None
+
+    def send_answer(self, answer):
+        """Sends an answer as an ANSWER frame to a binary server or as text to an older one."""
+        if self.frames is None:
+            self.send(answer.encode())
+        elif answer in ['Y', '1', 'T']:
+            self.send(GameProtocol.answer_frame(True))
+        elif answer in ['N', '0', 'F']:
+            self.send(GameProtocol.answer_frame(False))
+        else:
+            self.send(GameProtocol.answer_frame(None))
+
+    def choose_name(self):
+        """Picks the player name of the next game."""
+        return random.choice(self.player_names)
+
+    def step(self):
+        """Runs the current state of the session and moves to the next one."""
+        if self.state == self.LISTENING:
+            if self.rejected:
+                time.sleep(2)
+            self.name = self.choose_name()
+            cached = self.server_cache.best()
+            self.reconnecting = cached is not None
+            if self.reconnecting:
+                self.server_ip, self.server_port, server_name, self.server_version = cached
+                print(f"Reconnecting to server {server_name} at address {self.server_ip}...")
+            else:
+                self.find_server()
+            self.state = self.CONNECTING
+        elif self.state == self.CONNECTING:
+            try:
+                self.connect_to_server()
+            except OSError:
+                if not self.reconnecting:
+                    raise
+                # The cached server is gone, look for another one right away
+                self.server_cache.forget(self.server_ip, self.server_port)
+                self.disconnect()
+                self.state = self.LISTENING
+                return
+            self.server_cache.touch(self.server_ip, self.server_port)
+            self.state = self.PLAYING
+        elif self.state == self.PLAYING:
+            self.game_mode()
+            self.state = self.LISTENING
 
     def run(self):
         """
         Runs the client session. This method is the entry point for the client logic, orchestrating the
         sequence of operations to connect to the server, participate in the game, and handle reconnections
         if necessary.
+
+        The session is a loop over its states, so playing game after game never deepens the call stack.
         """
         while True:
-            time.sleep(1)
             try:
-                self.name = random.choice(self.player_names)
-                self.listen_for_udp_broadcast()
-                self.connect_to_server()
-                self.game_mode()
+                self.step()
             except Exception as e:
                 print(f"{Colors.RED}Error encountered: {e}. Attempting to reconnect...{Colors.END}")
 
-                if self.tcp_socket:
-                    self.tcp_socket.close()  # Ensure the socket is closed before retrying
+                self.disconnect()  # Ensure the socket is closed before retrying
+                self.state = self.LISTENING
                 time.sleep(2)
 
 
-if _name_ == "_main_":
+if __name__ == "__main__":
     client = ClientMain()
     client.run()
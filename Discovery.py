@@ -0,0 +1,153 @@
+import random
+import socket
+import struct
+import time
+
+
+class Discovery:
+    """
+    UDP messages that let clients find servers.
+
+    Servers broadcast an OFFER (magic cookie, type 0x2, 32 byte server name, TCP port) every 2 seconds on the
+    broadcast port. A client in a hurry broadcasts a REQUEST (magic cookie, type 0x3, random nonce) instead, and
+    every server answers it at once with an OFFER sent back to the requesting socket, followed by the nonce and
+    the highest GameProtocol version the server speaks. The nonce tells the client which request an offer
+    answers, so it can measure the round trip to each server, and the version whether to open the session with
+    a binary HELLO: a server only known from its broadcast OFFER may predate GameProtocol and gets a text name.
+    The broadcast OFFER must stay exactly OFFER.size bytes: clients that predate the REQUEST read the TCP port
+    from the last two bytes of the datagram, so any field appended to it would be taken for the port. They never
+    send a REQUEST and never see the longer replies.
+    """
+
+    MAGIC_COOKIE = 0xabcddcba
+    OFFER_TYPE = 0x2
+    REQUEST_TYPE = 0x3
+
+    OFFER = struct.Struct('!Ib32sH')
+    REQUEST = struct.Struct('!IbI')
+    REPLY = struct.Struct('!IB')  # nonce, GameProtocol version
+
+    @staticmethod
+    def offer(server_name, tcp_port, nonce=None, version=0):
+        """Builds an offer, the answer to a request when its nonce is given, version then being advertised."""
+        name = server_name.encode('utf-8') if isinstance(server_name, str) else server_name
+        message = Discovery.OFFER.pack(Discovery.MAGIC_COOKIE, Discovery.OFFER_TYPE, name, tcp_port)
+        if nonce is not None:
+            message += Discovery.REPLY.pack(nonce, version)
+        return message
+
+    @staticmethod
+    def parse_offer(data):
+        """
+        Returns (server name, tcp port, nonce or None, GameProtocol version) of an offer, or None if data is not
+        one. The version is 0 for a broadcast offer, which does not tell.
+        """
+        if len(data) < Discovery.OFFER.size:
+            return None
+        magic_cookie, message_type, name, tcp_port = Discovery.OFFER.unpack_from(data)
+        if magic_cookie != Discovery.MAGIC_COOKIE or message_type != Discovery.OFFER_TYPE:
+            return None
+        nonce = None
+        version = 0
+        if len(data) >= Discovery.OFFER.size + Discovery.REPLY.size:
+            nonce, version = Discovery.REPLY.unpack_from(data, Discovery.OFFER.size)
+        return name.decode('utf-8', errors='replace').rstrip('\x00 '), tcp_port, nonce, version
+
+    @staticmethod
+    def request(nonce):
+        """Builds the request a client broadcasts to get offers right away."""
+        return Discovery.REQUEST.pack(Discovery.MAGIC_COOKIE, Discovery.REQUEST_TYPE, nonce)
+
+    @staticmethod
+    def parse_request(data):
+        """Returns the nonce of a request, or None if data is not one."""
+        if len(data) < Discovery.REQUEST.size:
+            return None
+        magic_cookie, message_type, nonce = Discovery.REQUEST.unpack_from(data)
+        if magic_cookie != Discovery.MAGIC_COOKIE or message_type != Discovery.REQUEST_TYPE:
+            return None
+        return nonce
+
+    @staticmethod
+    def discover(udp_port=13117, timeout=0.5, host='<broadcast>'):
+        """
+        Broadcasts a request and collects the offers that answer it. Once the first offer arrived, the others
+        are waited for only a few round trips longer. Returns a list of (round trip seconds, server name, ip,
+        tcp port, GameProtocol version), fastest first, empty when no server answered within timeout.
+        """
+        nonce = random.getrandbits(32)
+        offers = {}
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
+            udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sent = time.monotonic()
+            try:
+                udp_socket.sendto(Discovery.request(nonce), (host, udp_port))
+            except OSError:
+                return []  # No broadcast route
+            deadline = sent + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                udp_socket.settimeout(remaining)
+                try:
+                    data, addr = udp_socket.recvfrom(1024)
+                except OSError:
+                    break
+                offer = Discovery.parse_offer(data)
+                if offer is None or offer[2] != nonce:
+                    continue
+                round_trip = time.monotonic() - sent
+                offers.setdefault((addr[0], offer[1]), (round_trip, offer[0], offer[3]))
+                deadline = min(deadline, time.monotonic() + max(0.02, 2 * round_trip))
+        return sorted((round_trip, name, ip, tcp_port, version)
+                      for (ip, tcp_port), (round_trip, name, version) in offers.items())
+
+
+class ServerCache:
+    """
+    Servers a client played on or heard from recently, so it can reconnect to one directly after a game
+    instead of waiting for an offer.
+
+    Attributes:
+        servers (dict): Maps (ip, tcp port) to {"name", "rtt", "version", "seen"}, rtt is None and version 0
+            for a server only known from its beacon, version is the GameProtocol version it advertised and seen
+            the time.monotonic it was last heard from.
+        ttl (float): Seconds a server stays in the cache without being heard from.
+    """
+
+    def __init__(self, ttl=60.0):
+        self.servers = {}
+        self.ttl = ttl
+
+    def add(self, ip, tcp_port, name, rtt=None, version=0):
+        """Remembers a server, keeping its last measured round trip and version if no new ones are given."""
+        entry = self.servers.get((ip, tcp_port))
+        if rtt is None and entry is not None:
+            rtt = entry["rtt"]
+            version = entry["version"]
+        self.servers[(ip, tcp_port)] = {"name": name, "rtt": rtt, "version": version, "seen": time.monotonic()}
+
+    def touch(self, ip, tcp_port):
+        """Marks a cached server as just heard from, after a successful connection to it."""
+        entry = self.servers.get((ip, tcp_port))
+        if entry is not None:
+            entry["seen"] = time.monotonic()
+
+    def forget(self, ip, tcp_port):
+        """Drops a server that could not be reached. Returns True if it was in the cache."""
+        return self.servers.pop((ip, tcp_port), None) is not None
+
+    def best(self):
+        """
+        Returns (ip, tcp port, name, GameProtocol version) of the fresh server with the shortest round trip, or
+        None if there is none.
+        """
+        now = time.monotonic()
+        for key in [key for key, entry in self.servers.items() if now - entry["seen"] > self.ttl]:
+            del self.servers[key]
+        if not self.servers:
+            return None
+        (ip, tcp_port), entry = min(self.servers.items(),
+                                    key=lambda item: (item[1]["rtt"] is None, item[1]["rtt"] or 0.0))
+        return ip, tcp_port, entry["name"], entry["version"]
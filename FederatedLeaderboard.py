@@ -0,0 +1,142 @@
+import heapq
+import random
+import struct
+import threading
+import time
+from Discovery import Discovery
+
+
+class FederatedLeaderboard:
+    """
+    Leaderboard of every server of the LAN, merged from the digests they gossip on the broadcast port, so there
+    is no central service to run.
+
+    Whenever a server broadcasts its offer it also broadcasts a GOSSIP datagram (magic cookie, type 0x4, sender
+    id, digest count) carrying digests: its own, then as many of the ones it heard from other servers as fit in
+    MAX_DATAGRAM bytes, taken in turn from one datagram to the next. A digest is the top_k players of one origin
+    server, tagged with the origin id and a version, the number of games the origin recorded. Every server keeps
+    a version vector, the latest version it holds of each origin, and only takes a digest newer than that, so a
+    relayed copy never rolls an origin back, and a server that misses the broadcasts of another one still hears
+    about it through a third.
+
+    The cluster leaderboard adds up the scores each player has in the digests, the local top_k included, and
+    keeps the top_k best. Only the top_k of every server is known, so the total of a player that is not among
+    the best of every server it played on is underestimated. At most max_origins remote digests are kept, and a
+    digest is dropped when its origin has neither sent a newer version nor gossiped itself for origin_ttl
+    seconds, so the leaderboard covers the servers that are up.
+
+    Attributes:
+        statistics (GameStatistics): Statistics of this server, the source of its own digest.
+        node_id (int): Random 64 bit id of this server, the origin of its digest.
+        top_k (int): Players in a digest and in the cluster leaderboard.
+        max_origins (int): Remote digests kept.
+        origin_ttl (float): Seconds a remote digest is kept without news from its origin.
+        digests (dict): Maps origin id to {"version", "players", "seen"}, players being (player name, score)
+            pairs and seen the time.monotonic of the last news from the origin.
+    """
+
+    GOSSIP_TYPE = 0x4
+    HEADER = struct.Struct('!IbQB')
+    DIGEST = struct.Struct('!QIB')  # origin id, version, players
+    ENTRY = struct.Struct('!IB')  # score, length of the name that follows
+    MAX_DATAGRAM = 1200  # Bytes of a gossip datagram, fits the MTU of any LAN
+    MAX_NAME = 48  # Bytes of a player name in a digest, longer names are cut
+
+    def __init__(self, statistics, top_k=None, max_origins=64, origin_ttl=30.0):
+        self.statistics = statistics
+        self.node_id = random.getrandbits(64)
+        self.top_k = top_k or statistics.top_k
+        self.max_origins = max_origins
+        self.origin_ttl = origin_ttl
+        self.digests = {}
+        self.next_relay = 0  # Index, in the remote digests, of the first one the next datagram relays
+        self.lock = threading.Lock()
+
+    @classmethod
+    def encode_digest(cls, origin, version, players):
+        """Encodes the digest of an origin, players being its best (player name, score) pairs."""
+        chunks = [cls.DIGEST.pack(origin, version, len(players))]
+        for player_name, score in players:
+            name = player_name.encode('utf-8')[:cls.MAX_NAME]
+            chunks.append(cls.ENTRY.pack(score, len(name)) + name)
+        return b"".join(chunks)
+
+    def gossip(self):
+        """Builds the next gossip datagram: the digest of this server, then the digests it relays in turn."""
+        own = self.encode_digest(self.node_id, self.statistics.game_count, self.statistics.leaderboard()[:self.top_k])
+        digests = [own]
+        size = self.HEADER.size + len(own)
+        with self.lock:
+            origins = list(self.digests)
+            for offset in range(len(origins)):
+                origin = origins[(self.next_relay + offset) % len(origins)]
+                entry = self.digests[origin]
+                digest = self.encode_digest(origin, entry["version"], entry["players"])
+                if size + len(digest) > self.MAX_DATAGRAM or len(digests) == 255:
+                    break
+                digests.append(digest)
+                size += len(digest)
+            self.next_relay = (self.next_relay + len(digests) - 1) % max(1, len(origins))
+        return self.HEADER.pack(Discovery.MAGIC_COOKIE, self.GOSSIP_TYPE, self.node_id, len(digests)) + b"".join(digests)
+
+    def receive(self, data, now=None):
+        """Merges the digests of a gossip datagram. Returns False if data is not one."""
+        if len(data) < self.HEADER.size:
+            return False
+        magic_cookie, message_type, sender, count = self.HEADER.unpack_from(data)
+        if magic_cookie != Discovery.MAGIC_COOKIE or message_type != self.GOSSIP_TYPE:
+            return False
+        if sender == self.node_id:
+            return True  # Our own broadcast
+        now = time.monotonic() if now is None else now
+        offset = self.HEADER.size
+        try:
+            for _ in range(count):
+                origin, version, entries = self.DIGEST.unpack_from(data, offset)
+                offset += self.DIGEST.size
+                players = []
+                for _ in range(entries):
+                    score, length = self.ENTRY.unpack_from(data, offset)
+                    offset += self.ENTRY.size
+                    players.append((data[offset:offset + length].decode('utf-8', errors='ignore'), score))
+                    offset += length
+                self.merge(origin, version, players, origin == sender, now)
+        except struct.error:
+            pass  # Cut short, keep the digests read so far
+        return True
+
+    def merge(self, origin, version, players, direct, now):
+        """Takes the digest of an origin if it is newer than the one held, direct when the origin sent it itself."""
+        if origin == self.node_id:
+            return
+        with self.lock:
+            entry = self.digests.get(origin)
+            if entry is None:
+                if len(self.digests) >= self.max_origins:
+                    del self.digests[min(self.digests, key=lambda key: self.digests[key]["seen"])]
+                self.digests[origin] = {"version": version, "players": players, "seen": now}
+            elif version > entry["version"]:
+                entry.update(version=version, players=players, seen=now)
+            elif direct:
+                entry["seen"] = now
+
+    def expire(self, now):
+        """Drops the digests of the origins not heard from for origin_ttl seconds."""
+        with self.lock:
+            for origin in [origin for origin, entry in self.digests.items() if now - entry["seen"] > self.origin_ttl]:
+                del self.digests[origin]
+
+    def servers(self):
+        """Returns the number of servers the cluster leaderboard currently covers, this one included."""
+        self.expire(time.monotonic())
+        return 1 + len(self.digests)
+
+    def leaderboard(self):
+        """Returns the top_k players of the cluster as (player name, score) pairs, best first."""
+        self.expire(time.monotonic())
+        totals = dict(self.statistics.leaderboard())
+        with self.lock:
+            for entry in self.digests.values():
+                for player_name, score in entry["players"]:
+                    totals[player_name] = totals.get(player_name, 0) + score
+        return heapq.nlargest(self.top_k, totals.items(), key=lambda item: item[1])
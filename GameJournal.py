@@ -0,0 +1,195 @@
+import collections
+import itertools
+import json
+import struct
+import threading
+import time
+from Colors import Colors
+
+
+class GameJournal:
+    """
+    Append-only binary journal of every game event, so a game seen in production can be replayed later, see
+    GameReplay.
+
+    Every record is a header (kind, room id, seconds since the journal was opened, payload length) followed by
+    its payload, player names always come last in the payload. The first record of every session is a SERVER
+    record holding the settings of the server as JSON, a file journaled to by several sessions holds them one
+    after the other.
+
+    Recording never does I/O: the game threads and the event loop append (kind, room id, time, rows) to a
+    deque, and a writer thread encodes whatever arrived every flush_interval seconds and writes it with one
+    buffered write. rows holds the fields of one record, or of all the records of a round at once, the answers
+    and eliminations of a round are queued as a single entry the writer expands. A disabled journal, the
+    default, costs a single attribute check per event.
+
+    Attributes:
+        enabled (bool): Whether events are recorded, set by open.
+        path (str or None): File the journal is appended to.
+        flush_interval (float): Seconds between two writes of the writer.
+        records (collections.deque): Events recorded and not written yet, as (kind, room id, time, rows).
+        written (int): Records written so far.
+    """
+
+    MAGIC = b'TRVJ'
+    HEADER = struct.Struct('!BIdH')
+
+    # Record kinds
+    SERVER = 1
+    JOIN = 2
+    LOBBY_CLOSED = 3
+    QUESTION = 4
+    ANSWER = 5
+    ELIMINATE = 6
+    LEAVE = 7
+    GAME_OVER = 8
+
+    # Payload of each kind, before the trailing text
+    PAYLOADS = {
+        JOIN: struct.Struct('!Bf'),  # protocol version, seconds from accept to name
+        LOBBY_CLOSED: struct.Struct('!H'),  # players, then the close reason
+        QUESTION: struct.Struct('!HI'),  # round, question id
+        ANSWER: struct.Struct('!HBf'),  # round, GameProtocol outcome, seconds to answer
+        ELIMINATE: struct.Struct('!H'),  # round
+        LEAVE: struct.Struct('!H'),  # rounds played so far
+        GAME_OVER: struct.Struct('!H'),  # rounds
+    }
+    WITH_TEXT = (JOIN, LOBBY_CLOSED, ANSWER, ELIMINATE, LEAVE)  # Kinds whose payload ends with a name or a reason
+
+    def __init__(self, flush_interval=0.5):
+        self.enabled = False
+        self.path = None
+        self.flush_interval = flush_interval
+        self.records = collections.deque()
+        self.written = 0
+        self.started = time.monotonic()
+        self.stopping = threading.Event()
+        self.writer = None
+
+    def open(self, path, settings=None):
+        """Starts appending the events to path, after a SERVER record with the settings of the server."""
+        self.path = path
+        self.started = time.monotonic()
+        self.records.append((self.SERVER, 0, 0.0, (dict(settings or {}, started=time.time()),)))
+        self.stopping.clear()
+        self.writer = threading.Thread(target=self.write_records, name="journal-writer", daemon=True)
+        self.writer.start()
+        self.enabled = True
+
+    def record(self, kind, room_id, *fields):
+        """Records an event of a room now, fields are the payload values of its kind followed by its text."""
+        if self.enabled:
+            self.records.append((kind, room_id, time.monotonic() - self.started, (fields,)))
+
+    def record_rows(self, kind, room_id, rows):
+        """Records many events of a room now, rows is an iterable of their fields, read on the writer thread."""
+        if self.enabled:
+            self.records.append((kind, room_id, time.monotonic() - self.started, rows))
+
+    def join(self, room_id, player_name, protocol, handshake_seconds):
+        """Records a player that connected and joined the lobby of a room."""
+        self.record(self.JOIN, room_id, protocol, handshake_seconds, player_name)
+
+    def lobby_closed(self, room_id, players, reason):
+        """Records the lobby of a room closing, its game starts."""
+        self.record(self.LOBBY_CLOSED, room_id, players, reason or "")
+
+    def question(self, room_id, round_number, question_id):
+        """Records the question drawn for a round."""
+        self.record(self.QUESTION, room_id, round_number, question_id)
+
+    def answers(self, room_id, round_number, names, players, outcomes, latencies):
+        """
+        Records how the players of a round answered as one batch: players are indexes into the names list of
+        a PlayerTable, outcomes and latencies parallel sequences. The sequences must not change afterwards.
+        """
+        self.record_rows(self.ANSWER, room_id, zip(itertools.repeat(round_number), outcomes, latencies,
+                                                   map(names.__getitem__, players)))
+
+    def eliminations(self, room_id, round_number, names, players):
+        """Records as one batch the players, indexes into the names list of a PlayerTable, out after a round."""
+        if len(players):
+            self.record_rows(self.ELIMINATE, room_id, zip(itertools.repeat(round_number),
+                                                          map(names.__getitem__, players)))
+
+    def leave(self, room_id, rounds, player_name):
+        """Records a player that was disconnected, or hung up, after rounds rounds of its game."""
+        self.record(self.LEAVE, room_id, rounds, player_name)
+
+    def game_over(self, room_id, rounds):
+        """Records the end of the game of a room."""
+        self.record(self.GAME_OVER, room_id, rounds)
+
+    @classmethod
+    def encode(cls, kind, room_id, timestamp, fields):
+        """Encodes a record to bytes."""
+        if kind == cls.SERVER:
+            payload = json.dumps(fields).encode('utf-8')
+        else:
+            layout = cls.PAYLOADS[kind]
+            if kind in cls.WITH_TEXT:
+                payload = layout.pack(*fields[:-1]) + fields[-1].encode('utf-8')
+            else:
+                payload = layout.pack(*fields)
+        return cls.HEADER.pack(kind, room_id, timestamp, len(payload)) + payload
+
+    def write_records(self):
+        """Writer thread: encodes and appends the recorded events every flush interval until close."""
+        try:
+            with open(self.path, "ab") as journal_file:
+                if journal_file.tell() == 0:
+                    journal_file.write(self.MAGIC)
+                while True:
+                    stopping = self.stopping.wait(self.flush_interval)
+                    chunks = []
+                    while self.records:
+                        kind, room_id, timestamp, rows = self.records.popleft()
+                        chunks.extend(self.encode(kind, room_id, timestamp, fields) for fields in rows)
+                    if chunks:
+                        journal_file.write(b"".join(chunks))
+                        journal_file.flush()
+                        self.written += len(chunks)
+                    if stopping:
+                        return
+        except OSError as e:
+            self.enabled = False
+            print(f"{Colors.RED}Stopped journaling the games to {self.path}: {e}")
+
+    def close(self):
+        """Stops recording, writes what is still queued and stops the writer."""
+        self.enabled = False
+        if self.writer is None:
+            return
+        self.stopping.set()
+        self.writer.join(timeout=10)
+        self.writer = None
+
+    @classmethod
+    def read(cls, path):
+        """
+        Yields the records of a journal as (kind, room id, seconds since its session started, fields), the
+        fields of a SERVER record are the settings dict. A record cut short at the end of the file is ignored.
+        Room ids and times restart with every SERVER record.
+        """
+        with open(path, "rb") as journal_file:
+            data = journal_file.read()
+        if not data.startswith(cls.MAGIC):
+            raise ValueError(f"{path} is not a game journal")
+        offset = len(cls.MAGIC)
+        while offset + cls.HEADER.size <= len(data):
+            kind, room_id, timestamp, length = cls.HEADER.unpack_from(data, offset)
+            offset += cls.HEADER.size
+            payload = data[offset:offset + length]
+            if len(payload) < length:
+                return
+            offset += length
+            if kind == cls.SERVER:
+                yield kind, room_id, timestamp, json.loads(payload)
+                continue
+            layout = cls.PAYLOADS.get(kind)
+            if layout is None:
+                continue  # Written by a newer server
+            fields = layout.unpack_from(payload)
+            if kind in cls.WITH_TEXT:
+                fields += (payload[layout.size:].decode('utf-8', errors='replace'),)
+            yield kind, room_id, timestamp, fields
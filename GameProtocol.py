@@ -0,0 +1,234 @@
+import struct
+
+
+class GameProtocol:
+    """
+    Versioned binary format of the TCP game session.
+
+    A client that speaks it opens the session with a HELLO (the 0xabcddcba magic cookie, the highest version it
+    supports and its name) instead of the plain text name. From then on the server sends it frames made of a
+    6 byte header (version, message type, payload length) followed by the payload, and the client renders the
+    text itself. Clients that send a plain name keep getting the colored text messages.
+
+    Text never starts with a byte below 0x09, so a client recognises a binary session by the version byte
+    at the start of the first frame, and the server tells a binary answer from a text one the same way.
+    """
+
+    VERSION = 1
+    MAGIC_COOKIE = 0xabcddcba
+    HEARTBEAT_INTERVAL = 2.0  # Seconds between two HEARTBEAT frames of a client
+
+    HELLO = struct.Struct('!IB')
+    HEADER = struct.Struct('!BBI')
+    LENGTH = struct.Struct('!H')
+    COUNT = struct.Struct('!I')
+    QUESTION_HEADER = struct.Struct('!HI')
+    ROSTER_HEADER = struct.Struct('!II')
+
+    # Message types
+    QUESTION = 1   # Round number, question id and text
+    ROSTER = 2     # Names that joined and names that left the game since the last roster
+    RESULT = 3     # Outcome of each player for the last question
+    GAME_OVER = 4  # Name of the winner, empty when there is none
+    ANSWER = 5     # Client answer, see ANSWER_TRUE and friends
+    HEARTBEAT = 6  # Sent by a client every HEARTBEAT_INTERVAL seconds to show it is still there, no payload
+    REJECT = 7     # Why the server turned the player away, the connection is closed right after
+
+    # Outcomes in a RESULT message
+    CORRECT = 0
+    INCORRECT = 1
+    NO_RESPONSE = 2
+
+    ANSWER_FALSE = 0
+    ANSWER_TRUE = 1
+    ANSWER_NONE = 2
+
+    @staticmethod
+    def hello(player_name, version=VERSION):
+        """Builds the handshake a binary client sends instead of its plain name."""
+        return GameProtocol.HELLO.pack(GameProtocol.MAGIC_COOKIE, version) + player_name.encode('utf-8') + b'\n'
+
+    @staticmethod
+    def parse_hello(data):
+        """
+        Reads the first message of a session from any bytes-like object. Returns (version, player name),
+        version is 0 when the client sent a plain text name.
+        """
+        version = 0
+        start = 0
+        if len(data) >= GameProtocol.HELLO.size:
+            magic_cookie, hello_version = GameProtocol.HELLO.unpack_from(data)
+            if magic_cookie == GameProtocol.MAGIC_COOKIE:
+                version = min(hello_version, GameProtocol.VERSION)
+                start = GameProtocol.HELLO.size
+        start, end = GameProtocol.text_span(data, start)
+        return version, str(data[start:end], 'utf-8', 'ignore')
+
+    @staticmethod
+    def text_span(data, start=0):
+        """Returns the (start, end) indexes of data without its leading and trailing whitespace."""
+        end = len(data)
+        while start < end and data[start] in b' \t\r\n\x00':
+            start += 1
+        while end > start and data[end - 1] in b' \t\r\n\x00':
+            end -= 1
+        return start, end
+
+    @staticmethod
+    def frame(message_type, payload=b''):
+        """Prefixes a payload with the frame header."""
+        return GameProtocol.HEADER.pack(GameProtocol.VERSION, message_type, len(payload)) + payload
+
+    @staticmethod
+    def pack_names(names):
+        """Packs a list of names, str or already encoded bytes, as length-prefixed UTF-8 strings."""
+        parts = []
+        for name in names:
+            encoded = name.encode('utf-8') if isinstance(name, str) else name
+            parts.append(GameProtocol.LENGTH.pack(len(encoded)))
+            parts.append(encoded)
+        return b''.join(parts)
+
+    @staticmethod
+    def unpack_names(payload, offset, count):
+        """Reads count length-prefixed names from payload, returns them with the offset after the last one."""
+        names = []
+        for _ in range(count):
+            (length,) = GameProtocol.LENGTH.unpack_from(payload, offset)
+            offset += GameProtocol.LENGTH.size
+            names.append(bytes(payload[offset:offset + length]).decode('utf-8', errors='replace'))
+            offset += length
+        return names, offset
+
+    @staticmethod
+    def question_frame(round_number, question_id, question):
+        """Builds the frame asking a question, the text can be given already encoded."""
+        if isinstance(question, str):
+            question = question.encode('utf-8')
+        return GameProtocol.frame(GameProtocol.QUESTION, GameProtocol.QUESTION_HEADER.pack(round_number, question_id)
+                                  + question)
+
+    @staticmethod
+    def parse_question(payload):
+        """Returns (round number, question id, question text)."""
+        round_number, question_id = GameProtocol.QUESTION_HEADER.unpack_from(payload)
+        return round_number, question_id, bytes(payload[GameProtocol.QUESTION_HEADER.size:]).decode('utf-8', errors='replace')
+
+    @staticmethod
+    def roster_frame(joined, left):
+        """Builds the frame with the names that joined and left the game since the last roster."""
+        return GameProtocol.frame(GameProtocol.ROSTER, GameProtocol.ROSTER_HEADER.pack(len(joined), len(left))
+                                  + GameProtocol.pack_names(joined) + GameProtocol.pack_names(left))
+
+    @staticmethod
+    def parse_roster(payload):
+        """Returns (names that joined, names that left)."""
+        joined_count, left_count = GameProtocol.ROSTER_HEADER.unpack_from(payload)
+        joined, offset = GameProtocol.unpack_names(payload, GameProtocol.ROSTER_HEADER.size, joined_count)
+        left, _ = GameProtocol.unpack_names(payload, offset, left_count)
+        return joined, left
+
+    @staticmethod
+    def result_frame(outcomes):
+        """
+        Builds the frame with the result of a round, outcomes is a list of (player name, outcome) pairs, the names
+        str or already encoded bytes.
+        """
+        parts = [GameProtocol.COUNT.pack(len(outcomes))]
+        for player_name, outcome in outcomes:
+            parts.append(bytes((outcome,)))
+            parts.append(GameProtocol.pack_names([player_name]))
+        return GameProtocol.frame(GameProtocol.RESULT, b''.join(parts))
+
+    @staticmethod
+    def parse_result(payload):
+        """Returns the list of (player name, outcome) pairs."""
+        (count,) = GameProtocol.COUNT.unpack_from(payload)
+        offset = GameProtocol.COUNT.size
+        outcomes = []
+        for _ in range(count):
+            outcome = payload[offset]
+            names, offset = GameProtocol.unpack_names(payload, offset + 1, 1)
+            outcomes.append((names[0], outcome))
+        return outcomes
+
+    @staticmethod
+    def game_over_frame(winner_name=None):
+        """Builds the frame ending the game."""
+        return GameProtocol.frame(GameProtocol.GAME_OVER, (winner_name or '').encode('utf-8'))
+
+    @staticmethod
+    def parse_game_over(payload):
+        """Returns the name of the winner, or None when nobody won."""
+        return bytes(payload).decode('utf-8', errors='replace') or None
+
+    @staticmethod
+    def reject_frame(reason):
+        """Builds the frame telling a player why it cannot join."""
+        return GameProtocol.frame(GameProtocol.REJECT, reason.encode('utf-8'))
+
+    @staticmethod
+    def parse_reject(payload):
+        """Returns the reason a player was turned away."""
+        return bytes(payload).decode('utf-8', errors='replace')
+
+    @staticmethod
+    def answer_frame(answer):
+        """Builds the answer of a client, answer is True, False or None."""
+        if answer is None:
+            code = GameProtocol.ANSWER_NONE
+        else:
+            code = GameProtocol.ANSWER_TRUE if answer else GameProtocol.ANSWER_FALSE
+        return GameProtocol.frame(GameProtocol.ANSWER, bytes((code,)))
+
+    @staticmethod
+    def heartbeat_frame():
+        """Builds the frame a client sends to show it is still connected."""
+        return GameProtocol.frame(GameProtocol.HEARTBEAT)
+
+    @staticmethod
+    def is_frame(data):
+        """Checks whether data starts with a frame header rather than text."""
+        return len(data) > 0 and data[0] == GameProtocol.VERSION
+
+    @staticmethod
+    def parse_answer_frame(data):
+        """Reads the answer in an ANSWER frame, returns True, False or None."""
+        if len(data) <= GameProtocol.HEADER.size:
+            return None
+        _, message_type, length = GameProtocol.HEADER.unpack_from(data)
+        if message_type != GameProtocol.ANSWER or length < 1:
+            return None
+        code = data[GameProtocol.HEADER.size]
+        if code == GameProtocol.ANSWER_TRUE:
+            return True
+        if code == GameProtocol.ANSWER_FALSE:
+            return False
+        return None
+
+
+class FrameReader:
+    """
+    Reassembles frames from a TCP stream, where one recv can hold several frames or only part of one.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """Adds received bytes and returns every complete frame as a list of (message type, payload)."""
+        self.buffer += data
+        frames = []
+        offset = 0
+        header = GameProtocol.HEADER
+        while len(self.buffer) - offset >= header.size:
+            version, message_type, length = header.unpack_from(self.buffer, offset)
+            if version != GameProtocol.VERSION:
+                raise ValueError(f"Unsupported protocol version {version}")
+            end = offset + header.size + length
+            if end > len(self.buffer):
+                break
+            frames.append((message_type, bytes(self.buffer[offset + header.size:end])))
+            offset = end
+        del self.buffer[:offset]
+        return frames
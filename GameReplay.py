@@ -0,0 +1,263 @@
+import asyncio
+import json
+import platform
+import sys
+import time
+from Benchmark import Benchmark
+from Colors import Colors
+from GameJournal import GameJournal
+from GameProtocol import GameProtocol, FrameReader
+from Percentiles import percentiles
+from TriviaQuestionManager import TriviaQuestionManager
+
+
+class GameReplay(Benchmark):
+    """
+    Replays the games of a GameJournal against a fresh server over loopback, at their original pace or speed
+    times faster, so a game captured in production can be re-run as a benchmark.
+
+    The server is started with the settings the journal recorded, the lobby timeout, the quiet period and the
+    round timeout divided by speed. Every journaled player connects at its original time, divided by speed like
+    every other delay, and sends its name after its original handshake time. In every round it answers after its
+    original answer time: right if it was right, wrong if it was wrong, not at all if it did not respond. A
+    player that was disconnected hangs up where it was, in the lobby or before the next round. Replayed players
+    always use the binary protocol.
+
+    The server draws its own questions, so what is reproduced is who wins each round, not which question was
+    asked: the players check their answers against the questions they get. How many games lasted as many rounds
+    as the original, and how many rounds got the original question, is reported next to the metrics.
+
+    The metrics are those of Benchmark under a single "replay" scenario, so results are saved and compared the
+    same way.
+
+    Attributes:
+        journal_path (str): Journal the games are read from.
+        speed (float): How many times faster than the original the games are replayed.
+        session (int): Index of the server session replayed, of the ones journaled to the file, -1 for the last.
+        rooms (set of int or None): Rooms of the session replayed, None for all of them.
+        questions_path (str or None): Question bank the original server played with.
+    """
+
+    def __init__(self, journal_path, speed=1.0, session=-1, rooms=None, seed=1, backend="threads",
+                 tcp_port=47317, questions_path=None):
+        super().__init__(sizes=(), games=0, seed=seed, backend=backend, tcp_port=tcp_port)
+        self.journal_path = journal_path
+        self.speed = speed
+        self.session = session
+        self.rooms = rooms
+        self.questions_path = questions_path
+        self.trivia_manager = TriviaQuestionManager(questions_path)
+        self.settings = {}
+
+    def load(self):
+        """
+        Reads the session to replay. Returns (games, players): games maps room id to {"rounds", "questions"} and
+        every player is {"name", "room", "joined", "handshake", "answers", "left"}, answers maps round to
+        (GameProtocol outcome, seconds) and left is (rounds played, time) for a player that was disconnected.
+        """
+        sessions = []
+        for kind, room_id, timestamp, fields in GameJournal.read(self.journal_path):
+            if kind == GameJournal.SERVER:
+                sessions.append((fields, []))
+            elif sessions:
+                sessions[-1][1].append((kind, room_id, timestamp, fields))
+        if not sessions:
+            raise ValueError(f"{self.journal_path} holds no session")
+        self.settings, records = sessions[self.session]
+
+        games = {}
+        players = {}
+        for kind, room_id, timestamp, fields in records:
+            if self.rooms is not None and room_id not in self.rooms:
+                continue
+            game = games.setdefault(room_id, {"rounds": None, "questions": {}})
+            if kind == GameJournal.JOIN:
+                _, handshake, player_name = fields
+                players[(room_id, player_name)] = {"name": player_name, "room": room_id, "joined": timestamp,
+                                                   "handshake": handshake, "answers": {}, "left": None}
+            elif kind == GameJournal.QUESTION:
+                round_number, question_id = fields
+                game["questions"][round_number] = question_id
+            elif kind == GameJournal.ANSWER:
+                round_number, outcome, latency, player_name = fields
+                if (room_id, player_name) in players:
+                    players[(room_id, player_name)]["answers"][round_number] = (outcome, latency)
+            elif kind == GameJournal.LEAVE:
+                rounds, player_name = fields
+                if (room_id, player_name) in players:
+                    players[(room_id, player_name)]["left"] = (rounds, timestamp)
+            elif kind == GameJournal.GAME_OVER:
+                game["rounds"] = fields[0]
+        return games, list(players.values())
+
+    def server_command(self, players=None):
+        """Returns the command line of a server with the journaled settings, its timeouts divided by speed."""
+        settings = self.settings
+        command = super().server_command(settings.get("max_players") or 0)
+        command[command.index("--lobby-timeout") + 1] = str(settings.get("lobby_timeout", 10.0) / self.speed)
+        command[command.index("--quorum") + 1] = str(settings.get("quorum") or 0)
+        if not settings.get("max_players"):
+            index = command.index("--max-players")
+            del command[index:index + 2]
+        command += ["--min-players", str(settings.get("min_players", 1)),
+                    "--quiet-period", str(settings.get("quiet_period", 1.0) / self.speed),
+                    "--round-timeout", str(settings.get("round_timeout", 10.0) / self.speed),
+                    "--sudden-death-rounds", str(settings.get("sudden_death_rounds", 3))]
+        if settings.get("max_rounds"):
+            command += ["--max-rounds", str(settings["max_rounds"])]
+        for name, value in (settings.get("question_filter") or {}).items():
+            if value is not None:
+                command += [f"--{name}", str(value)]
+        if self.questions_path:
+            command += ["--questions", self.questions_path]
+        return command
+
+    @staticmethod
+    def send_answer(writer, answer, sent, loop):
+        """Sends an answer unless the player hung up meanwhile, noting when it was sent."""
+        if not writer.is_closing():
+            writer.write(GameProtocol.answer_frame(answer))
+            sent.append(loop.time())
+
+    async def replay_player(self, player, origin, started, rounds):
+        """Plays a journaled player through its game again, filling rounds with what it saw of every round."""
+        loop = asyncio.get_running_loop()
+        connect_at = started + (player["joined"] - player["handshake"] - origin) / self.speed
+        await asyncio.sleep(max(0.0, connect_at - loop.time()))
+        connected = loop.time()
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.tcp_port)
+        frames = FrameReader()
+        first_question = None
+        current = None
+        left_after, left_at = player["left"] or (None, None)
+        if left_after == 0:
+            loop.call_at(started + (left_at - origin) / self.speed, writer.close)  # Left before the game started
+        try:
+            await asyncio.sleep(player["handshake"] / self.speed)
+            writer.write(GameProtocol.hello(player["name"]))
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return first_question
+                for message_type, payload in frames.feed(data):
+                    now = loop.time()
+                    if message_type == GameProtocol.QUESTION:
+                        round_number, question_id, _ = GameProtocol.parse_question(payload)
+                        if left_after is not None and round_number > left_after:
+                            return first_question
+                        if first_question is None:
+                            first_question = now - connected
+                        current = rounds.setdefault(round_number, {"questions": [], "answers": [], "results": [],
+                                                                   "question_id": question_id})
+                        current["questions"].append(now)
+                        outcome, latency = player["answers"].get(round_number, (GameProtocol.NO_RESPONSE, 0.0))
+                        if outcome != GameProtocol.NO_RESPONSE:
+                            _, is_true = self.trivia_manager.get_question(question_id)
+                            answer = is_true if outcome == GameProtocol.CORRECT else not is_true
+                            loop.call_later(latency / self.speed, self.send_answer, writer, answer,
+                                            current["answers"], loop)
+                    elif message_type == GameProtocol.RESULT and current is not None:
+                        current["results"].append(now)
+                    elif message_type == GameProtocol.GAME_OVER:
+                        return first_question
+        except (ConnectionError, OSError):
+            return first_question
+        finally:
+            writer.close()
+
+    async def replay(self, games, players):
+        """Replays every player at once on its original schedule and returns the raw samples."""
+        origin = min(player["joined"] - player["handshake"] for player in players)
+        replayed = {room_id: {} for room_id in games}
+        started = asyncio.get_running_loop().time()
+        results = await asyncio.gather(*(self.replay_player(player, origin, started, replayed[player["room"]])
+                                         for player in players))
+        elapsed = asyncio.get_running_loop().time() - started
+        return [result for result in results if result is not None], replayed, elapsed
+
+    def run(self):
+        """Replays the journaled games against a fresh server and returns the results, ready to be saved."""
+        games, players = self.load()
+        if not players:
+            raise ValueError(f"{self.journal_path} holds no player to replay")
+        print(f"{Colors.BLUE}Replaying {len(games)} games of {len(players)} players at {self.speed:g}x...{Colors.END}")
+        server = self.start_server(None)
+        try:
+            cpu_before, _ = self.server_usage(server.pid)
+            first_questions, replayed, elapsed = asyncio.run(self.replay(games, players))
+            cpu_after, peak_rss = self.server_usage(server.pid)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+        fanout = []
+        collection = []
+        rounds_matched = 0
+        questions_matched = 0
+        questions_replayed = 0
+        for room_id, rounds in replayed.items():
+            for round_number, current in rounds.items():
+                fanout.append(max(current["questions"]) - min(current["questions"]))
+                if current["answers"] and current["results"]:
+                    collection.append(min(current["results"]) - max(current["answers"]))
+                questions_replayed += 1
+                questions_matched += games[room_id]["questions"].get(round_number) == current["question_id"]
+            rounds_matched += max(rounds, default=0) == games[room_id]["rounds"]
+        return {
+            "meta": {"backend": self.backend, "seed": self.seed, "journal": self.journal_path, "speed": self.speed,
+                     "games": len(games), "players": len(players), "rounds_matched": rounds_matched,
+                     "questions_matched": questions_matched, "questions_replayed": questions_replayed,
+                     "python": platform.python_version(), "machine": platform.machine(),
+                     "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "scenarios": {"replay": {
+                "time_to_first_question": percentiles(first_questions),
+                "fanout_latency": percentiles(fanout),
+                "answer_collection_latency": percentiles(collection),
+                "games_per_minute": len(games) * 60 / elapsed,
+                "server_cpu_seconds": None if cpu_after is None else cpu_after - cpu_before,
+                "server_peak_rss_kb": peak_rss,
+            }},
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replays the games of a journal against a loopback server")
+    parser.add_argument("journal", help="journal written by the server with --journal")
+    parser.add_argument("--speed", type=float, default=1.0, help="how many times faster than recorded to replay")
+    parser.add_argument("--session", type=int, default=-1,
+                        help="server session of the journal to replay, counted from 0, -1 for the last one")
+    parser.add_argument("--rooms", default=None, help="comma separated rooms to replay, all of them by default")
+    parser.add_argument("--questions", default=None, help="question bank the journaled server played with")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the replay server")
+    parser.add_argument("--backend", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--tcp-port", type=int, default=47317, help="loopback port the server listens on")
+    parser.add_argument("--save", default=None, help="write the results to this JSON baseline")
+    parser.add_argument("--compare", default=None, help="compare the results with this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fraction a metric may get worse than the baseline before it is flagged")
+    args = parser.parse_args()
+
+    rooms = {int(room) for room in args.rooms.split(",")} if args.rooms else None
+    replay = GameReplay(args.journal, args.speed, args.session, rooms, args.seed, args.backend, args.tcp_port,
+                        args.questions)
+    results = replay.run()
+    meta = results["meta"]
+    print(f"{Colors.END}{meta['rounds_matched']} of {meta['games']} games lasted as many rounds as recorded, "
+          f"{meta['questions_matched']} of {meta['questions_replayed']} rounds asked the recorded question")
+    Benchmark.print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"{Colors.GREEN}Saved the results to {args.save}{Colors.END}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = Benchmark.compare(json.load(baseline_file), results, args.threshold)
+        for scenario, name, before, after in regressions:
+            print(f"{Colors.RED}Regression in the {scenario}: {name} went from {before:.4f} to {after:.4f}{Colors.END}")
+        if regressions:
+            sys.exit(1)
+        print(f"{Colors.GREEN}No regression against {args.compare}{Colors.END}")
@@ -0,0 +1,325 @@
+import heapq
+import itertools
+import threading
+import time
+from collections.abc import Mapping
+from Colors import Colors
+from LobbyPolicy import LobbyPolicy
+from PlayerTable import PlayerTable
+
+
+class GameRoom:
+    """
+    The lobby and the state of a single game. Every game played on the server has its own room,
+    so several games can run side by side.
+
+    Attributes:
+        room_id (int): Sequential id of the room on this server.
+        clients (dict): Maps client address to (player name, connection) for the players of this game.
+        player_names (set of str): Names in use in this room, names only have to be unique inside a room.
+        players (PlayerTable): Columns with the state of every player: the protocol it speaks, its FrameReader,
+            its encoded name, whether it is still in the game and what it answered, used to judge the rounds.
+        rounds (int): Rounds judged so far in this game.
+        outbound (BroadcastFanout): Write queues of the players of this room.
+        state (str): LOBBY while players can join, PLAYING once the rounds started, RESULTS once the game is
+            decided and the outcome is being sent, and FINISHED when its connections are closed.
+        joins (int): Players that joined the lobby, including those that left it since.
+        first_join (float): time.monotonic the first player joined at, None while the lobby is empty.
+        last_join (float): time.monotonic the last player joined at.
+        close_check (float): time.monotonic of the earliest lobby check scheduled, None if there is none.
+        closed_at (float): time.monotonic the lobby closed at, None while it is open.
+        close_reason (str): Why the lobby closed, one of the LobbyPolicy reasons.
+    """
+
+    LOBBY = "lobby"
+    PLAYING = "playing"
+    RESULTS = "results"
+    FINISHED = "finished"
+
+    # The states a room may move to from each state, a game that fails may skip RESULTS
+    TRANSITIONS = {
+        LOBBY: (PLAYING,),
+        PLAYING: (RESULTS, FINISHED),
+        RESULTS: (FINISHED,),
+        FINISHED: (),
+    }
+
+    def __init__(self, room_id, outbound=None):
+        self.room_id = room_id
+        self.clients = {}
+        self.player_names = set()
+        self.players = PlayerTable()
+        self.roster_line = None  # Encoded "A, B and C" list of the players of the last round
+        self.roster_size = 0
+        self.add_number = list(range(1, 501))
+        self.rounds = 0
+        self.outbound = outbound
+        self.state = self.LOBBY
+        self.joins = 0
+        self.first_join = None
+        self.last_join = None
+        self.close_check = None
+        self.closed_at = None
+        self.close_reason = None
+
+    def move_to(self, state):
+        """Moves the room to the next state of its lifecycle, raises ValueError for a move it does not allow."""
+        if state not in self.TRANSITIONS[self.state]:
+            raise ValueError(f"Room {self.room_id} cannot go from {self.state} to {state}")
+        self.state = state
+
+    def record_join(self, now):
+        """Notes that a player joined the lobby at now."""
+        if self.first_join is None:
+            self.first_join = now
+        self.last_join = now
+        self.joins += 1
+
+    def lobby_wait(self):
+        """Returns the seconds between the first join and the lobby closing, None while it is open."""
+        if self.closed_at is None or self.first_join is None:
+            return None
+        return self.closed_at - self.first_join
+
+    def check_name_unique(self, name):
+        """Checks if the received name is unique in this room."""
+        return name not in self.player_names
+
+    def add_player(self, player_name, connection, addr, protocol=0):
+        """Adds a player to the room, suffixing a number if the name is already taken, and returns the final name."""
+        if not self.check_name_unique(player_name):
+            player_name = player_name + str(self.add_number[0])
+            self.add_number = self.add_number[1:]
+        self.clients[addr] = (player_name, connection)
+        self.player_names.add(player_name)
+        self.players.add(addr, player_name, protocol)
+        return player_name
+
+    def remove_player(self, addr):
+        """Removes a player from the room and returns its (name, connection), or None if it was not here."""
+        player = self.clients.pop(addr, None)
+        self.players.remove(addr)
+        if player is not None:
+            self.player_names.discard(player[0])
+        return player
+
+    def protocol(self, addr):
+        """Returns the GameProtocol version a player speaks, 0 for plain text or a player that left."""
+        index = self.players.index.get(addr)
+        return 0 if index is None else int(self.players.protocols[index])
+
+    def frame_reader(self, addr):
+        """Returns the FrameReader of a binary player, None for a text player or a player that left."""
+        index = self.players.index.get(addr)
+        return None if index is None else self.players.frames[index]
+
+    def active_players(self):
+        """Returns the players still in the game, a live ActivePlayers view rather than a copy."""
+        return ActivePlayers(self)
+
+    def encoded_roster(self, active_players):
+        """
+        Returns the encoded "A, B and C" list of the active players. Players only ever leave a game, so the
+        line of the previous round is reused as long as nobody left and is rebuilt from the encoded names otherwise.
+        """
+        if self.roster_line is None or self.roster_size != len(active_players):
+            names = [self.players.encoded_names[index] for index in self.players.active_indexes()]
+            if len(names) > 1:
+                self.roster_line = b', '.join(names[:-1]) + b' and ' + names[-1]
+            else:
+                self.roster_line = b''.join(names)
+            self.roster_size = len(active_players)
+        return self.roster_line
+
+    def split_by_protocol(self, players):
+        """Splits players into those that get text messages and those that get binary frames."""
+        text_players = {}
+        binary_players = {}
+        for addr, player in players.items():
+            if self.protocol(addr):
+                binary_players[addr] = player
+            else:
+                text_players[addr] = player
+        return text_players, binary_players
+
+
+class ActivePlayers(Mapping):
+    """
+    The players of a room still in its game, read from the active column of its PlayerTable, as a mapping of
+    client address to (player name, connection) like the clients of the room. A player the table takes out of
+    the game, eliminated or disconnected, leaves the view at once, so no copy of the players is kept per game.
+    """
+
+    def __init__(self, room):
+        self.room = room
+
+    def __getitem__(self, addr):
+        if not self.room.players.is_active(addr):
+            raise KeyError(addr)
+        return self.room.clients[addr]
+
+    def __iter__(self):
+        addrs = self.room.players.addrs
+        return iter([addrs[index] for index in self.room.players.active_indexes()])
+
+    def __len__(self):
+        return len(self.room.players)
+
+    def __contains__(self, addr):
+        return self.room.players.is_active(addr)
+
+    def items(self):
+        """Returns the (address, (player name, connection)) pairs of the players still in the game."""
+        clients = self.room.clients
+        return [(addr, clients[addr]) for addr in self if addr in clients]
+
+
+class TimerThread:
+    """
+    Runs delayed callbacks, such as the lobby timers, on a single thread started on first use, instead of
+    a threading.Timer thread per call. Callbacks run one at a time, so they should return quickly.
+    """
+
+    def __init__(self):
+        self.timers = []  # Heap of (deadline, sequence number, callback)
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def schedule(self, delay, callback):
+        """Runs callback in delay seconds."""
+        with self.condition:
+            heapq.heappush(self.timers, (time.monotonic() + delay, next(self.sequence), callback))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="timers", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        """Timer thread: waits for the earliest deadline and runs its callback."""
+        while True:
+            with self.condition:
+                while not self.timers or self.timers[0][0] > time.monotonic():
+                    self.condition.wait(self.timers[0][0] - time.monotonic() if self.timers else None)
+                _, _, callback = heapq.heappop(self.timers)
+            try:
+                callback()
+            except Exception as e:
+                print(f"{Colors.RED}Timer callback failed: {e}")
+
+
+class RoomScheduler:
+    """
+    Keeps one lobby open at all times and assigns every arriving player to it.
+
+    When the lobby of a room closes is up to its LobbyPolicy, which is asked again at every join and when the
+    time it gave comes: after lobby_timeout seconds by default, as soon as it holds max_players players, or
+    once arrivals go quiet after a quorum of players joined. A closed room is handed to on_lobby_closed to be
+    played and the next player opens a fresh lobby, so accepting never stops while games are running.
+
+    Attributes:
+        create_room (callable): Called with a room id, returns a new GameRoom.
+        on_lobby_closed (callable): Called with a GameRoom when its game should start.
+        policy (LobbyPolicy): Decides when a lobby closes.
+        schedule (callable): Called with (delay, callback) to run the lobby checks, a shared TimerThread by default.
+        rooms (dict): Maps room id to every room that is not finished.
+        games_waiting (int): Games whose lobby closed that were handed to be played and did not start yet.
+    """
+
+    def __init__(self, create_room, on_lobby_closed, lobby_timeout=10.0, max_players=None, schedule=None,
+                 policy=None):
+        self.create_room = create_room
+        self.on_lobby_closed = on_lobby_closed
+        self.policy = policy or LobbyPolicy(max_wait=lobby_timeout, max_players=max_players)
+        self.schedule = schedule or TimerThread().schedule
+        self.rooms = {}
+        self.lobby = None
+        self.next_room_id = 1
+        self.games_waiting = 0
+        self.lock = threading.Lock()
+
+    def assign(self, player_name, connection, addr, protocol=0):
+        """Puts a player in the open lobby, opening one if needed. Returns the room and the player's final name."""
+        with self.lock:
+            if self.lobby is None:
+                self.lobby = self.create_room(self.next_room_id)
+                self.rooms[self.lobby.room_id] = self.lobby
+                self.next_room_id += 1
+            room = self.lobby
+            player_name = room.add_player(player_name, connection, addr, protocol)
+            room.record_join(time.monotonic())
+        self.review_lobby(room)
+        return room, player_name
+
+    def review_lobby(self, room):
+        """Asks the policy when the lobby of a room closes, and closes it or schedules the next look at it."""
+        with self.lock:
+            if room.state != GameRoom.LOBBY:
+                return
+            close_at, reason = self.policy.close_at(len(room.clients), room.joins, room.first_join, room.last_join)
+            if close_at is None:
+                return
+            now = time.monotonic()
+            if close_at > now:
+                # A check is only added when the close time moved before the pending one, which looks again later
+                if room.close_check is None or close_at < room.close_check:
+                    room.close_check = close_at
+                    self.schedule(close_at - now, lambda: self.lobby_check_due(room))
+                return
+        self.close_lobby(room, reason)
+
+    def lobby_check_due(self, room):
+        """Timer callback: looks at a lobby again at the time the policy gave."""
+        with self.lock:
+            room.close_check = None
+        self.review_lobby(room)
+
+    def close_lobby(self, room, reason=None):
+        """Stops admitting players to a room and starts its game, does nothing if it was already closed."""
+        with self.lock:
+            if room.state != GameRoom.LOBBY:
+                return
+            room.move_to(GameRoom.PLAYING)
+            room.closed_at = time.monotonic()
+            room.close_reason = reason
+            if self.lobby is room:
+                self.lobby = None
+        self.on_lobby_closed(room)
+
+    def show_results(self, room):
+        """Marks the game of a room as decided, its outcome is about to be sent."""
+        with self.lock:
+            room.move_to(GameRoom.RESULTS)
+
+    def finish(self, room):
+        """Forgets a room once its game is over."""
+        with self.lock:
+            room.move_to(GameRoom.FINISHED)
+            self.rooms.pop(room.room_id, None)
+            if self.lobby is room:
+                self.lobby = None
+
+    def queue_game(self):
+        """Counts a game handed to be played that did not start yet."""
+        with self.lock:
+            self.games_waiting += 1
+
+    def dequeue_game(self):
+        """Counts a waiting game that started."""
+        with self.lock:
+            self.games_waiting -= 1
+
+    def games_in_progress(self):
+        """Returns the number of rooms whose lobby closed and whose game is not over yet."""
+        with self.lock:
+            return sum(1 for room in self.rooms.values() if room.state != GameRoom.LOBBY)
+
+    def lobby_size(self):
+        """Returns the number of players in the open lobby."""
+        with self.lock:
+            return len(self.lobby.clients) if self.lobby is not None else 0
+
+    def active_rooms(self):
+        """Returns a snapshot of the rooms that are not finished."""
+        with self.lock:
+            return list(self.rooms.values())
@@ -0,0 +1,155 @@
+import bisect
+import heapq
+import threading
+
+
+class GameStatistics:
+    """
+    Running aggregates of every game played, updated once per game so memory does not grow with the number
+    of games.
+
+    Only counters are kept: the number of games, histograms of the rounds and of the duration of the games,
+    the total score of each player and a min-heap with the top_k best of them, plus the ranking of the latest
+    game. The durations are counted in DURATION_BUCKETS and are not part of what StatsStore keeps, so they
+    cover the games played since the server started. Scores only ever
+    go up, so a player can only enter the heap by beating its current minimum, and the leaderboard is read
+    in O(k). At most max_players totals are kept; past that the lowest tenth is dropped, so the totals of
+    players who rarely score are approximate on a server that has seen more players than that.
+
+    Attributes:
+        top_k (int): Size of the leaderboard and of the ranking kept for the latest game.
+        max_players (int): Player totals kept before the lowest scores are dropped.
+        game_count (int): Games recorded.
+        total_rounds (int): Rounds played over all games.
+        rounds_histogram (dict): Maps a number of rounds to the number of games that lasted that long.
+        duration_histogram (list of int): Games whose duration fell in each of DURATION_BUCKETS.
+        player_scores (dict): Maps player name to its correct answers over all games.
+        latest_ranking (list): (player name, score) pairs of the best players of the latest game.
+    """
+
+    # Upper bounds, in seconds, of the game duration buckets
+    DURATION_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0, float('inf'))
+
+    def __init__(self, top_k=10, max_players=100000):
+        self.top_k = top_k
+        self.max_players = max_players
+        self.game_count = 0
+        self.total_rounds = 0
+        self.rounds_histogram = {}
+        self.duration_histogram = [0] * len(self.DURATION_BUCKETS)
+        self.player_scores = {}
+        self.latest_ranking = []
+        self.leaders = []  # Min-heap of [score, player name], at most top_k entries
+        self.leader_entries = {}  # Maps player name to its entry in leaders
+        self.lock = threading.Lock()
+
+    def load(self, player_scores, rounds_histogram):
+        """
+        Starts from aggregates saved by a previous run: player_scores is a list of (player name, score) pairs,
+        rounds_histogram maps a number of rounds to the number of games that lasted that long.
+        """
+        with self.lock:
+            self.rounds_histogram = dict(rounds_histogram)
+            self.game_count = sum(self.rounds_histogram.values())
+            self.total_rounds = sum(rounds * games for rounds, games in self.rounds_histogram.items())
+            best = heapq.nlargest(self.max_players, player_scores, key=lambda item: item[1])
+            self.player_scores = dict(best)
+            self.leaders = [[score, player_name] for player_name, score in best[:self.top_k]]
+            heapq.heapify(self.leaders)
+            self.leader_entries = {entry[1]: entry for entry in self.leaders}
+
+    def record_game(self, rounds, scores, duration=None):
+        """
+        Adds a finished game, given its number of rounds, a dict of the points each player scored and, when
+        known, how many seconds it lasted.
+        """
+        with self.lock:
+            self.game_count += 1
+            self.total_rounds += rounds
+            self.rounds_histogram[rounds] = self.rounds_histogram.get(rounds, 0) + 1
+            if duration is not None:
+                self.duration_histogram[bisect.bisect_left(self.DURATION_BUCKETS, duration)] += 1
+            for player_name, score in scores.items():
+                if score > 0:
+                    self.add_score(player_name, score)
+            self.latest_ranking = heapq.nlargest(self.top_k, ((player_name, score) for player_name, score
+                                                              in scores.items() if score > 0),
+                                                 key=lambda item: item[1])
+
+    def add_score(self, player_name, points):
+        """Adds points to the total of a player and keeps the leaderboard heap up to date."""
+        if player_name not in self.player_scores and len(self.player_scores) >= self.max_players:
+            self.trim()
+        score = self.player_scores.get(player_name, 0) + points
+        self.player_scores[player_name] = score
+
+        entry = self.leader_entries.get(player_name)
+        if entry is not None:
+            entry[0] = score
+            heapq.heapify(self.leaders)  # The entry only grew, at most k entries move
+        elif len(self.leaders) < self.top_k:
+            entry = [score, player_name]
+            self.leader_entries[player_name] = entry
+            heapq.heappush(self.leaders, entry)
+        elif score > self.leaders[0][0]:
+            entry = [score, player_name]
+            self.leader_entries[player_name] = entry
+            dropped = heapq.heapreplace(self.leaders, entry)
+            del self.leader_entries[dropped[1]]
+
+    def trim(self):
+        """Drops the lowest tenth of the player totals, never touching the leaderboard."""
+        keep = self.max_players - max(1, self.max_players // 10)
+        kept = heapq.nlargest(keep, self.player_scores.items(), key=lambda item: item[1])
+        self.player_scores = dict(kept)
+        for player_name in self.leader_entries:
+            self.player_scores.setdefault(player_name, self.leader_entries[player_name][0])
+
+    def leaderboard(self):
+        """Returns the top_k players of all time as (player name, score) pairs, best first."""
+        with self.lock:
+            return [(player_name, score) for score, player_name in sorted(self.leaders, reverse=True)]
+
+    def best_player(self):
+        """Returns (player name, score) of the best player ever, or None before anybody scored."""
+        with self.lock:
+            if not self.leaders:
+                return None
+            score, player_name = max(self.leaders)
+            return player_name, score
+
+    def average_rounds(self):
+        """Returns the average number of rounds per game, 0 before the first game."""
+        with self.lock:
+            if self.game_count == 0:
+                return 0
+            return self.total_rounds / self.game_count
+
+    def rounds_percentiles(self, points=(50, 90, 99)):
+        """Returns {"p50": rounds, ...} and the longest game, read from the rounds histogram, empty before any game."""
+        with self.lock:
+            return self.histogram_percentiles(sorted(self.rounds_histogram.items()), points)
+
+    def duration_percentiles(self, points=(50, 90, 99)):
+        """Returns the upper bound, in seconds, of the duration bucket of each percentile, empty before any game."""
+        with self.lock:
+            buckets = [(bound, games) for bound, games in zip(self.DURATION_BUCKETS, self.duration_histogram) if games]
+            return self.histogram_percentiles(buckets, points)
+
+    @staticmethod
+    def histogram_percentiles(buckets, points):
+        """Returns the percentiles and the maximum of a sorted list of (value, count) pairs."""
+        total = sum(count for _, count in buckets)
+        if not total:
+            return {}
+        result = {}
+        for point in points:
+            rank = point / 100 * total
+            seen = 0
+            for value, count in buckets:
+                seen += count
+                if seen >= rank:
+                    result[f"p{point}"] = value
+                    break
+        result["max"] = buckets[-1][0]
+        return result
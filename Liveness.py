@@ -0,0 +1,54 @@
+import socket
+from GameProtocol import GameProtocol
+
+
+class Liveness:
+    """
+    Dead-peer detection settings, shared by the server and the clients.
+
+    A client that speaks GameProtocol sends a HEARTBEAT frame every GameProtocol.HEARTBEAT_INTERVAL seconds. Once
+    a player sent one, staying silent for heartbeat_timeout seconds gets it disconnected. Players that never send
+    heartbeats, such as text clients, are covered by the kernel instead: every game socket gets TCP keepalive,
+    which probes a connection idle for keepalive_idle seconds and fails it after keepalive_count unanswered probes
+    keepalive_interval seconds apart, and TCP_USER_TIMEOUT, which fails it when sent data stays unacknowledged for
+    user_timeout seconds. A failed connection makes the next read return an error, which the server acts on.
+
+    Attributes:
+        heartbeat_timeout (float): Seconds without a heartbeat after which a player is considered gone.
+        keepalive_idle (int): Idle seconds before the first keepalive probe.
+        keepalive_interval (int): Seconds between two keepalive probes.
+        keepalive_count (int): Unanswered probes after which the connection fails.
+        user_timeout (float): Seconds sent data may stay unacknowledged, 0 keeps the system default.
+    """
+
+    def __init__(self, heartbeat_timeout=4 * GameProtocol.HEARTBEAT_INTERVAL, keepalive_idle=10,
+                 keepalive_interval=3, keepalive_count=3, user_timeout=20.0):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+        self.user_timeout = user_timeout
+
+    def configure(self, sock):
+        """Turns on TCP keepalive and the user timeout on a connected socket, skipping what the platform lacks."""
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        except OSError:
+            return
+        # macOS calls the idle time TCP_KEEPALIVE, and only Linux has TCP_USER_TIMEOUT
+        idle_option = getattr(socket, "TCP_KEEPIDLE", getattr(socket, "TCP_KEEPALIVE", None))
+        options = ((idle_option, self.keepalive_idle),
+                   (getattr(socket, "TCP_KEEPINTVL", None), self.keepalive_interval),
+                   (getattr(socket, "TCP_KEEPCNT", None), self.keepalive_count),
+                   (getattr(socket, "TCP_USER_TIMEOUT", None), int(self.user_timeout * 1000)))
+        for option, value in options:
+            if option is None or not value:
+                continue
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, option, value)
+            except OSError:
+                pass
+
+    def silent_since(self, now):
+        """Returns the heartbeat time before which a player counts as gone."""
+        return now - self.heartbeat_timeout
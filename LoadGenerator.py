@@ -0,0 +1,239 @@
+import asyncio
+import random
+import socket
+from Colors import Colors
+from Discovery import Discovery
+from GameProtocol import GameProtocol, FrameReader
+from Percentiles import percentiles
+from TriviaQuestionManager import TriviaQuestionManager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class LoadGenerator:
+    """
+    Plays thousands of simulated players against a server from a single asyncio event loop.
+
+    Every virtual player behaves like a BotClient speaking GameProtocol: it joins, waits for each question,
+    answers after a random delay and stays until game over. Players join at ramp_rate per second. Each answer
+    is right with probability accuracy (the answer is looked up in the same question set the server uses), and
+    after receiving a question a player hangs up with probability disconnect_probability.
+
+    Answer latencies are drawn from a distribution given as "fixed:S", "uniform:LOW,HIGH", "normal:MEAN,STDDEV"
+    or "exponential:MEAN", in seconds.
+
+    Attributes:
+        players (int): Number of virtual players.
+        ramp_rate (float): Players that join per second.
+        accuracy (float): Probability that an answer is correct.
+        disconnect_probability (float): Probability that a player leaves after receiving a question.
+        rng (random.Random): Seeded source of every random choice, so a run can be repeated.
+        join_latencies (list of float): Seconds each player took to connect.
+        first_question_latencies (list of float): Seconds from connecting to the first question, lobby included.
+        deliveries (dict): Maps (room, round) to the times the question reached each of its players.
+        game_durations (list of float): Seconds from the first question to game over, per player.
+    """
+
+    def __init__(self, players=1000, ramp_rate=500.0, answer_latency="uniform:0.2,2", accuracy=0.5,
+                 disconnect_probability=0.0, seed=None, questions_path=None, name_prefix="load"):
+        self.players = players
+        self.ramp_rate = ramp_rate
+        self.answer_latency = self.parse_distribution(answer_latency)
+        self.accuracy = accuracy
+        self.disconnect_probability = disconnect_probability
+        self.rng = random.Random(seed)
+        self.trivia_manager = TriviaQuestionManager(questions_path)
+        self.name_prefix = name_prefix
+        self.join_latencies = []
+        self.first_question_latencies = []
+        self.deliveries = {}
+        self.game_durations = []
+        self.failed_joins = 0
+        self.disconnects = 0
+        self.errors = 0
+        self.rejected = 0
+        self.games_finished = 0
+
+    @staticmethod
+    def parse_distribution(spec):
+        """Turns a distribution spec such as "uniform:0.2,2" into a function drawing a value from an rng."""
+        kind, _, arguments = spec.partition(":")
+        values = [float(value) for value in arguments.split(",") if value]
+        if kind == "fixed" and len(values) == 1:
+            return lambda rng: values[0]
+        if kind == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1])
+        if kind == "normal" and len(values) == 2:
+            return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+        if kind == "exponential" and len(values) == 1:
+            return lambda rng: rng.expovariate(1 / values[0])
+        raise ValueError(f"Unknown latency distribution {spec!r}")
+
+    @staticmethod
+    def discover_server(udp_port=13117, timeout=10.0):
+        """Asks for offers, or waits for a server beacon on the broadcast port, and returns its (ip, tcp port)."""
+        offers = Discovery.discover(udp_port)
+        if offers:
+            _, _, ip, tcp_port, _ = offers[0]
+            return ip, tcp_port
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
+            udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, "SO_REUSEPORT"):
+                udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            udp_socket.bind(('', udp_port))
+            udp_socket.settimeout(timeout)
+            while True:
+                data, addr = udp_socket.recvfrom(1024)
+                offer = Discovery.parse_offer(data)
+                if offer is not None:
+                    return addr[0], offer[1]
+
+    @staticmethod
+    def raise_file_limit():
+        """Raises the soft limit of open files to the hard limit, every virtual player holds a socket."""
+        if resource is None:
+            return
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            try:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            except (ValueError, OSError) as e:
+                print(f"{Colors.YELLOW}Could not raise the open files limit: {e}")
+
+    async def play(self, player_id, host, port):
+        """Runs one virtual player from joining to game over."""
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(player_id / self.ramp_rate)
+        player_name = f"{self.name_prefix}{player_id:05d}"
+
+        started = loop.time()
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            self.failed_joins += 1
+            return
+        self.join_latencies.append(loop.time() - started)
+
+        frames = FrameReader()
+        room = None
+        first_question = None
+        try:
+            writer.write(GameProtocol.hello(player_name))
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    return
+                for message_type, payload in frames.feed(data):
+                    now = loop.time()
+                    if message_type == GameProtocol.ROSTER and room is None:
+                        joined, _ = GameProtocol.parse_roster(payload)
+                        room = joined[0] if joined else player_name  # Names are unique, the first one names the room
+                    elif message_type == GameProtocol.QUESTION:
+                        round_number, question_id, _ = GameProtocol.parse_question(payload)
+                        if first_question is None:
+                            first_question = now
+                            self.first_question_latencies.append(now - started)
+                        self.deliveries.setdefault((room, round_number), []).append(now)
+                        if self.rng.random() < self.disconnect_probability:
+                            self.disconnects += 1
+                            return
+                        await self.answer(writer, question_id)
+                    elif message_type == GameProtocol.REJECT:
+                        self.rejected += 1
+                        return
+                    elif message_type == GameProtocol.GAME_OVER:
+                        if first_question is not None:
+                            self.game_durations.append(now - first_question)
+                        self.games_finished += 1
+                        return
+        except (ConnectionError, OSError, ValueError):
+            self.errors += 1
+        finally:
+            writer.close()
+
+    async def answer(self, writer, question_id):
+        """Answers a question after a random delay, right with probability accuracy."""
+        await asyncio.sleep(self.answer_latency(self.rng))
+        _, is_true = self.trivia_manager.get_question(question_id)
+        answer = is_true if self.rng.random() < self.accuracy else not is_true
+        writer.write(GameProtocol.answer_frame(answer))
+        await writer.drain()
+
+    async def run(self, host, port):
+        """Starts every virtual player and waits until all of them are done."""
+        self.raise_file_limit()
+        print(f"{Colors.GREEN}Starting {self.players} players against {host}:{port} at {self.ramp_rate:g} per second")
+        await asyncio.gather(*(self.play(player_id, host, port) for player_id in range(self.players)))
+
+    def delivery_latencies(self):
+        """Returns how late each player got each question compared to the first player of its room."""
+        latencies = []
+        for times in self.deliveries.values():
+            first = min(times)
+            latencies.extend(received - first for received in times)
+        return latencies
+
+    def summary(self):
+        """Returns the counters and the latency percentiles of the run."""
+        return {
+            "players": self.players,
+            "failed_joins": self.failed_joins,
+            "disconnects": self.disconnects,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "games_finished": self.games_finished,
+            "join_latency": percentiles(self.join_latencies),
+            "first_question_latency": percentiles(self.first_question_latencies),
+            "question_delivery_latency": percentiles(self.delivery_latencies()),
+            "game_duration": percentiles(self.game_durations),
+        }
+
+    def print_summary(self):
+        """Prints the summary of the run."""
+        summary = self.summary()
+        print(f"{Colors.END}Load test summary:")
+        print(f"Players: {summary['players']}, failed joins: {summary['failed_joins']}, "
+              f"disconnected on purpose: {summary['disconnects']}, errors: {summary['errors']}, "
+              f"rejected: {summary['rejected']}, "
+              f"reached game over: {summary['games_finished']}")
+        for key, label in (("join_latency", "Join latency"), ("first_question_latency", "Time to first question"),
+                           ("question_delivery_latency", "Question delivery latency"),
+                           ("game_duration", "Game duration")):
+            values = summary[key]
+            if values:
+                print(f"{label}: " + ", ".join(f"{name} {value * 1000:.1f}ms" for name, value in values.items()))
+            else:
+                print(f"{label}: no samples")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulates many trivia players from one process")
+    parser.add_argument("--players", type=int, default=1000, help="number of virtual players")
+    parser.add_argument("--ramp-rate", type=float, default=500.0, help="players that join per second")
+    parser.add_argument("--answer-latency", default="uniform:0.2,2",
+                        help="answer delay distribution: fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV or exponential:MEAN")
+    parser.add_argument("--accuracy", type=float, default=0.5, help="probability that an answer is correct")
+    parser.add_argument("--disconnect-probability", type=float, default=0.0,
+                        help="probability that a player leaves after receiving a question")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random choices")
+    parser.add_argument("--questions", default=None, help="question bank the server was started with")
+    parser.add_argument("--host", default=None, help="server address, found from its UDP offer when not given")
+    parser.add_argument("--port", type=int, default=None, help="server TCP port, found from its UDP offer when not given")
+    args = parser.parse_args()
+
+    generator = LoadGenerator(args.players, args.ramp_rate, args.answer_latency, args.accuracy,
+                              args.disconnect_probability, args.seed, args.questions)
+    host, port = args.host, args.port
+    if host is None or port is None:
+        print(f"{Colors.PASTEL_GREEN}Listening for offer requests...")
+        host, port = LoadGenerator.discover_server()
+    try:
+        asyncio.run(generator.run(host, port))
+    except KeyboardInterrupt:
+        pass
+    generator.print_summary()
@@ -0,0 +1,64 @@
+class LobbyPolicy:
+    """
+    Decides when a lobby closes and its game starts, from the players in it and the times they joined.
+
+    A lobby closes as soon as it holds max_players players. Once it holds quorum players it closes when
+    arrivals go quiet: when nobody joined for QUIET_GAPS times the average gap between the joins so far,
+    clamped between MIN_QUIET and quiet_period seconds, so a burst of players starts its game right after the
+    burst and a trickle waits at most quiet_period for the next player. Otherwise it closes max_wait seconds
+    after its first player joined. A lobby never closes with fewer than min_players players, it stays open
+    until enough players joined, and closes at once if max_wait is already over by then.
+
+    With the defaults the lobby closes after max_wait seconds, or early once max_players joined.
+
+    Attributes:
+        max_wait (float): Seconds a lobby stays open after its first player joined, when the quorum is not met.
+        min_players (int): Players a game needs to start.
+        max_players (int or None): Players that close a lobby at once, None for no limit.
+        quorum (int or None): Players from which the lobby closes once arrivals go quiet, None to always wait
+            max_wait.
+        quiet_period (float): Longest silence, in seconds, after which a lobby that reached its quorum closes.
+    """
+
+    QUIET_GAPS = 3  # Average gaps between joins without a new player after which arrivals count as quiet
+    MIN_QUIET = 0.05  # Shortest silence that closes a lobby, players that connect together are not split up
+
+    # Why a lobby closed, see close_reason
+    FULL = "full"
+    QUIET = "quiet"
+    TIMEOUT = "timeout"
+
+    def __init__(self, max_wait=10.0, min_players=1, max_players=None, quorum=None, quiet_period=1.0):
+        self.max_wait = max_wait
+        self.min_players = min_players
+        self.max_players = max_players
+        self.quorum = quorum
+        self.quiet_period = quiet_period
+
+    def full(self, players):
+        """Returns whether a lobby with this many players closes at once."""
+        return self.max_players is not None and players >= self.max_players
+
+    def quiet_after(self, joins, first_join, last_join):
+        """Returns the silence, in seconds, after which arrivals count as quiet given the joins so far."""
+        if joins < 2:
+            return self.quiet_period
+        average_gap = (last_join - first_join) / (joins - 1)
+        return min(self.quiet_period, max(self.MIN_QUIET, self.QUIET_GAPS * average_gap))
+
+    def close_at(self, players, joins, first_join, last_join):
+        """
+        Returns (time.monotonic at which the lobby closes, reason) for a lobby holding players players after
+        joins joins, the first and the last at first_join and last_join. Returns (None, None) while the lobby
+        waits for min_players, only the next join can change that.
+        """
+        if self.full(players):
+            return last_join, self.FULL
+        if players < self.min_players:
+            return None, None
+        deadline = first_join + self.max_wait
+        if self.quorum is not None and players >= self.quorum:
+            quiet = last_join + self.quiet_after(joins, first_join, last_join)
+            if quiet < deadline:
+                return quiet, self.QUIET
+        return deadline, self.TIMEOUT
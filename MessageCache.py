@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+
+
+class MessageCache:
+    """
+    Least recently used cache of rendered messages, kept as immutable bytes so the same object can be
+    queued on every socket.
+
+    Attributes:
+        max_entries (int): Number of messages kept before the least recently used one is evicted.
+        hits (int): Lookups served from the cache.
+        misses (int): Lookups that had to render the message.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, render):
+        """Returns the bytes cached under key, calling render() to build them on a miss."""
+        with self.lock:
+            message = self.entries.get(key)
+            if message is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return message
+            self.misses += 1
+
+        message = render()
+        with self.lock:
+            self.entries[key] = message
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return message
+
+    def clear(self):
+        """Drops every cached message."""
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,229 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Counter:
+    """A value that only goes up, such as the number of accepted connections."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Adds amount to the counter."""
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        """Returns the (name, value) lines of the metric."""
+        return [(self.name, self.value)]
+
+
+class Gauge:
+    """
+    A value that goes up and down. It is either set by the server, or read from a function at scrape time
+    when one is given, for values such as a queue depth that are cheaper to read than to track.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, function=None):
+        self.name = name
+        self.help_text = help_text
+        self.function = function
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Adds amount to the gauge."""
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        """Subtracts amount from the gauge."""
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        """Sets the gauge to value."""
+        self.value = value
+
+    def samples(self):
+        """Returns the (name, value) lines of the metric."""
+        return [(self.name, self.function() if self.function else self.value)]
+
+
+class Histogram:
+    """Counts observations in fixed buckets, with their sum, as Prometheus histograms do."""
+
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        """Counts one observation in its bucket."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Observes the seconds spent in a with block."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started)
+
+    def samples(self):
+        """Returns the (name, value) lines of the metric, with cumulative buckets."""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            label = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append((f'{self.name}_bucket{{le="{label}"}}', cumulative))
+        lines.append((f"{self.name}_sum", total))
+        lines.append((f"{self.name}_count", cumulative))
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The metrics of a process, rendered in the Prometheus text exposition format and served over HTTP.
+
+    Attributes:
+        metrics (list): Every registered Counter, Gauge and Histogram, in registration order.
+        http_server (ThreadingHTTPServer): The scrape endpoint once serve was called.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.http_server = None
+
+    def counter(self, name, help_text):
+        """Registers and returns a new Counter."""
+        return self.register(Counter(name, help_text))
+
+    def gauge(self, name, help_text, function=None):
+        """Registers and returns a new Gauge."""
+        return self.register(Gauge(name, help_text, function))
+
+    def histogram(self, name, help_text, buckets=Histogram.DEFAULT_BUCKETS):
+        """Registers and returns a new Histogram."""
+        return self.register(Histogram(name, help_text, buckets))
+
+    def register(self, metric):
+        """Adds a metric to the registry and returns it."""
+        self.metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        """Renders every metric in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves the metrics on http://host:port/metrics from a daemon thread."""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.exposition().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes are too frequent to be printed
+
+        self.http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.http_server.daemon_threads = True
+        threading.Thread(target=self.http_server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def close(self):
+        """Stops the scrape endpoint."""
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+
+
+class ServerMetrics(MetricsRegistry):
+    """
+    The metrics of a trivia server: connections, handshakes, the time spent in each phase of a round,
+    and the executor and connection gauges, which read the server when scraped.
+    """
+
+    def __init__(self, server):
+        super().__init__()
+        self.connections_accepted = self.counter(
+            "trivia_connections_accepted_total", "TCP connections accepted.")
+        self.handshake_failures = self.counter(
+            "trivia_handshake_failures_total", "Connections dropped before the player joined a lobby.")
+        self.handshakes_in_progress = self.gauge(
+            "trivia_handshakes_in_progress", "Connections whose name has not been read yet.")
+        self.handshake_seconds = self.histogram(
+            "trivia_handshake_seconds", "Time from accepting a connection to placing its player in a lobby.")
+        self.handshake_timeouts = self.counter(
+            "trivia_handshake_timeouts_total", "Connections closed because their name did not arrive in time.")
+        self.players_rejected = self.counter(
+            "trivia_players_rejected_total", "Players turned away because the lobby or the pending table was full.")
+        self.games_started = self.counter("trivia_games_started_total", "Games whose lobby closed.")
+        self.lobby_wait_seconds = self.histogram(
+            "trivia_lobby_wait_seconds", "Time from the first player joining a lobby to its game starting.")
+        self.lobby_seconds_saved = self.counter(
+            "trivia_lobby_seconds_saved_total", "Lobby time saved over waiting the full lobby timeout, summed over games.")
+        self.games_finished = self.counter("trivia_games_finished_total", "Games that reached game over.")
+        self.rounds = self.counter("trivia_rounds_total", "Rounds played.")
+        self.evictions = self.counter("trivia_evictions_total", "Players disconnected for not keeping up.")
+        self.dead_players = self.counter(
+            "trivia_dead_players_total", "Players disconnected because their connection closed, failed or went silent.")
+        self.broadcast_seconds = self.histogram(
+            "trivia_broadcast_seconds", "Time to send a question to the active players.")
+        self.collect_seconds = self.histogram(
+            "trivia_collect_seconds", "Time spent waiting for the answers of a round.")
+        self.evaluate_seconds = self.histogram(
+            "trivia_evaluate_seconds", "Time to judge a round and send its results.")
+        self.announce_seconds = self.histogram(
+            "trivia_announce_seconds", "Time to send the game over message.")
+        self.accept_paused = self.gauge(
+            "trivia_accept_paused", "1 while accepting is paused because too many handshakes are pending.",
+            lambda: int(server.admission.paused))
+        self.games_waiting = self.gauge(
+            "trivia_games_waiting", "Games whose lobby closed that wait for a game thread or event loop task.",
+            lambda: server.scheduler.games_waiting)
+        self.active_connections = self.gauge(
+            "trivia_active_connections", "Players in a lobby or a running game.",
+            lambda: sum(len(room.clients) for room in server.scheduler.active_rooms()))
+        self.active_rooms = self.gauge(
+            "trivia_active_rooms", "Rooms in the lobby or playing.",
+            lambda: len(server.scheduler.active_rooms()))
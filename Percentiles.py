@@ -0,0 +1,11 @@
+def percentiles(values, points=(50, 90, 99)):
+    """Returns {"p50": ..., "p90": ..., "p99": ..., "max": ...} of a list of values, nearest rank, empty if there are none."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        rank = max(1, -(-point * len(ordered) // 100))  # Ceiling of point% of the values
+        result[f"p{point}"] = ordered[rank - 1]
+    result["max"] = ordered[-1]
+    return result
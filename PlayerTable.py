@@ -0,0 +1,313 @@
+from array import array
+from GameProtocol import GameProtocol, FrameReader
+
+try:
+    import numpy
+except ImportError:  # The table falls back to plain Python loops over array columns
+    numpy = None
+
+
+class PlayerTable:
+    """
+    Column store of the players of a game, so a round is judged with a few vectorized operations instead of a
+    walk over dicts of tuples.
+
+    Every player gets a dense index when it joins and keeps it for the whole game. The columns are NumPy arrays
+    when NumPy is installed, and array/bytearray columns judged with Python loops otherwise. The table is the
+    only place a room keeps what it knows of a player besides its connection: its name, the protocol it speaks
+    and its FrameReader live here too, and the players still in the game are the active column.
+
+    Attributes:
+        size (int): Number of indexes handed out so far, players that left keep theirs.
+        addrs (list): Client address of each index.
+        names (list of str): Player name of each index.
+        encoded_names (list of bytes): Player name of each index, encoded once as UTF-8.
+        frames (list): FrameReader reassembling what each binary player sends, None for text players and the
+            players that left.
+        index (dict): Maps the address of every player still in the room to its index.
+        protocols (array of uint8): GameProtocol version each player speaks, 0 for plain text.
+        active (array of bool): Whether each player is still in the game.
+        answers (array of uint8): GameProtocol answer code of each player in the current round.
+        scores (array of uint32): Correct answers of each player in this game.
+        latencies (array of float32): Seconds each player took to answer in the current round, measured by the
+            server's monotonic clock from the moment the question was sent.
+        answer_times (array of float64): Seconds each player spent on its right answers in this game.
+        last_seen (array of float64): time.monotonic of the last heartbeat of each player, infinite for the
+            players that never sent one, which are left to TCP keepalive.
+    """
+
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.addrs = []
+        self.names = []
+        self.encoded_names = []
+        self.frames = []
+        self.index = {}
+        if numpy is not None:
+            self.protocols = numpy.zeros(capacity, dtype=numpy.uint8)
+            self.active = numpy.zeros(capacity, dtype=numpy.bool_)
+            self.answers = numpy.full(capacity, GameProtocol.ANSWER_NONE, dtype=numpy.uint8)
+            self.scores = numpy.zeros(capacity, dtype=numpy.uint32)
+            self.latencies = numpy.zeros(capacity, dtype=numpy.float32)
+            self.answer_times = numpy.zeros(capacity)
+            self.last_seen = numpy.full(capacity, numpy.inf)
+        else:
+            self.protocols = bytearray(capacity)
+            self.active = bytearray(capacity)
+            self.answers = bytearray([GameProtocol.ANSWER_NONE]) * capacity
+            self.scores = array('I', bytes(4 * capacity))
+            self.latencies = array('f', bytes(4 * capacity))
+            self.answer_times = array('d', bytes(8 * capacity))
+            self.last_seen = array('d', [float('inf')]) * capacity
+
+    def __len__(self):
+        """Returns the number of players still in the game."""
+        if numpy is not None:
+            return int(numpy.count_nonzero(self.active[:self.size]))
+        return self.active.count(1)
+
+    def grow(self):
+        """Doubles the capacity of every column."""
+        capacity = len(self.active)
+        if numpy is not None:
+            self.protocols = numpy.concatenate((self.protocols, numpy.zeros(capacity, dtype=numpy.uint8)))
+            self.active = numpy.concatenate((self.active, numpy.zeros(capacity, dtype=numpy.bool_)))
+            self.answers = numpy.concatenate(
+                (self.answers, numpy.full(capacity, GameProtocol.ANSWER_NONE, dtype=numpy.uint8)))
+            self.scores = numpy.concatenate((self.scores, numpy.zeros(capacity, dtype=numpy.uint32)))
+            self.latencies = numpy.concatenate((self.latencies, numpy.zeros(capacity, dtype=numpy.float32)))
+            self.answer_times = numpy.concatenate((self.answer_times, numpy.zeros(capacity)))
+            self.last_seen = numpy.concatenate((self.last_seen, numpy.full(capacity, numpy.inf)))
+        else:
+            self.protocols.extend(bytes(capacity))
+            self.active.extend(bytes(capacity))
+            self.answers.extend(bytearray([GameProtocol.ANSWER_NONE]) * capacity)
+            self.scores.extend(array('I', bytes(4 * capacity)))
+            self.latencies.extend(array('f', bytes(4 * capacity)))
+            self.answer_times.extend(array('d', bytes(8 * capacity)))
+            self.last_seen.extend(array('d', [float('inf')]) * capacity)
+
+    def add(self, addr, player_name, protocol=0):
+        """Gives a joining player the next index and marks it active. Returns the index."""
+        if self.size == len(self.active):
+            self.grow()
+        index = self.size
+        self.size += 1
+        self.addrs.append(addr)
+        self.names.append(player_name)
+        self.encoded_names.append(player_name.encode('utf-8'))
+        self.frames.append(FrameReader() if protocol else None)
+        self.index[addr] = index
+        self.protocols[index] = protocol
+        self.active[index] = 1
+        return index
+
+    def remove(self, addr):
+        """Takes a player that left or was disconnected out of the game."""
+        index = self.index.pop(addr, None)
+        if index is not None:
+            self.active[index] = 0
+            self.last_seen[index] = float('inf')
+            self.frames[index] = None
+
+    def is_active(self, addr):
+        """Checks whether a player is still in the game."""
+        index = self.index.get(addr)
+        return index is not None and bool(self.active[index])
+
+    def active_indexes(self):
+        """Returns the indexes of the players still in the game, in the order they joined."""
+        if numpy is not None:
+            return numpy.flatnonzero(self.active[:self.size]).tolist()
+        return [index for index in range(self.size) if self.active[index]]
+
+    def snapshot(self):
+        """Returns a copy of the active column, to tell later which players left the game since."""
+        return self.active[:self.size].copy() if numpy is not None else self.active[:self.size]
+
+    def roster_changes(self, previous):
+        """
+        Returns (names of the players active now and not in previous, names of those active in previous and
+        not now), previous being a snapshot, or None for nobody.
+        """
+        if previous is None:
+            return [self.names[index] for index in self.active_indexes()], []
+        if numpy is not None:
+            active = self.active[:self.size]
+            previous = numpy.concatenate((previous, numpy.zeros(self.size - len(previous), dtype=numpy.bool_)))
+            joined = numpy.flatnonzero(active & ~previous).tolist()
+            left = numpy.flatnonzero(previous & ~active).tolist()
+        else:
+            previous = previous + bytes(self.size - len(previous))
+            joined = [index for index in range(self.size) if self.active[index] and not previous[index]]
+            left = [index for index in range(self.size) if previous[index] and not self.active[index]]
+        return [self.names[index] for index in joined], [self.names[index] for index in left]
+
+    def touch(self, addr, now):
+        """Records that a heartbeat of a player arrived at now."""
+        index = self.index.get(addr)
+        if index is not None:
+            self.last_seen[index] = now
+
+    def silent(self, since):
+        """Returns the addresses of the players whose last heartbeat is older than since."""
+        if numpy is not None:
+            return [self.addrs[index] for index in numpy.flatnonzero(self.last_seen[:self.size] < since).tolist()]
+        return [self.addrs[index] for index in range(self.size) if self.last_seen[index] < since]
+
+    def clear_answers(self):
+        """Resets the answer and latency of every player before a round is judged."""
+        if numpy is not None:
+            self.answers[:self.size] = GameProtocol.ANSWER_NONE
+            self.latencies[:self.size] = 0
+        else:
+            self.answers[:self.size] = bytearray([GameProtocol.ANSWER_NONE]) * self.size
+            self.latencies[:self.size] = array('f', bytes(4 * self.size))
+
+    def record_answers(self, answers):
+        """Stores the RoundAnswers collected in a round, all at once."""
+        if not answers:
+            return
+        if numpy is not None:
+            indexes = numpy.frombuffer(answers.indexes, dtype=numpy.uint32)
+            self.answers[indexes] = numpy.frombuffer(answers.codes, dtype=numpy.uint8)
+            self.latencies[indexes] = numpy.frombuffer(answers.latencies, dtype=numpy.float32)
+            return
+        for index, code, latency in zip(answers.indexes, answers.codes, answers.latencies):
+            self.answers[index] = code
+            self.latencies[index] = latency
+
+    def take(self, column, indexes):
+        """Returns the values of a column at the given indexes, as a new array or list."""
+        if numpy is not None:
+            return column[indexes]
+        return [column[index] for index in indexes]
+
+    def left_out(self, indexes):
+        """Returns those of the given indexes whose players are no longer in the game."""
+        if numpy is not None:
+            return indexes[~self.active[indexes]]
+        return [index for index in indexes if not self.active[index]]
+
+    def results(self, players, outcomes):
+        """Returns the (encoded name, GameProtocol outcome) pairs of judged players, to render their results."""
+        if numpy is not None:
+            players = players.tolist()
+            outcomes = outcomes.tolist()
+        return list(zip(map(self.encoded_names.__getitem__, players), outcomes))
+
+    def game_scores(self):
+        """Returns a dict with the points of every player that scored in this game."""
+        if numpy is not None:
+            scored = numpy.flatnonzero(self.scores[:self.size]).tolist()
+        else:
+            scored = [index for index in range(self.size) if self.scores[index]]
+        scores = {}
+        for index in scored:
+            player_name = self.names[index]
+            scores[player_name] = scores.get(player_name, 0) + int(self.scores[index])
+        return scores
+
+    def evaluate(self, correct_answer):
+        """
+        Judges the recorded answers of the active players against the correct one. The players who answered
+        correctly score a point and add the time they took to their answer_times, and unless nobody did,
+        everyone else is taken out of the game.
+
+        Returns (indexes of the players judged, their GameProtocol outcome codes, indexes of the winners), as
+        NumPy arrays when NumPy is installed and as lists otherwise.
+        """
+        code = GameProtocol.ANSWER_TRUE if correct_answer else GameProtocol.ANSWER_FALSE
+        if numpy is not None:
+            active = self.active[:self.size]
+            answers = self.answers[:self.size]
+            correct = active & (answers == code)
+            players = numpy.flatnonzero(active)
+            outcomes = numpy.where(correct, GameProtocol.CORRECT,
+                                   numpy.where(answers == GameProtocol.ANSWER_NONE,
+                                               GameProtocol.NO_RESPONSE, GameProtocol.INCORRECT))[players]
+            winners = numpy.flatnonzero(correct)
+            if winners.size:
+                self.scores[winners] += 1
+                self.answer_times[winners] += self.latencies[winners]
+                active[:] = correct
+            return players, outcomes.astype(numpy.uint8), winners
+
+        players = [index for index in range(self.size) if self.active[index]]
+        outcomes = []
+        winners = []
+        for index in players:
+            answer = self.answers[index]
+            if answer == code:
+                winners.append(index)
+                outcomes.append(GameProtocol.CORRECT)
+            elif answer == GameProtocol.ANSWER_NONE:
+                outcomes.append(GameProtocol.NO_RESPONSE)
+            else:
+                outcomes.append(GameProtocol.INCORRECT)
+        if winners:
+            for index, outcome in zip(players, outcomes):
+                if outcome == GameProtocol.CORRECT:
+                    self.scores[index] += 1
+                    self.answer_times[index] += self.latencies[index]
+                else:
+                    self.active[index] = 0
+        return players, outcomes, winners
+
+    def fastest(self, indexes):
+        """Returns the index, among indexes, of the player who answered the current round fastest."""
+        return min(indexes, key=lambda index: (float(self.latencies[index]), index))
+
+    def fastest_overall(self):
+        """Returns the index of the active player with the least time spent on right answers, None if none is left."""
+        if numpy is not None:
+            players = numpy.flatnonzero(self.active[:self.size])
+            if not players.size:
+                return None
+            return int(players[numpy.argmin(self.answer_times[players])])
+        players = [index for index in range(self.size) if self.active[index]]
+        if not players:
+            return None
+        return min(players, key=lambda index: (self.answer_times[index], index))
+
+    def keep_only(self, indexes):
+        """Takes every player but the given ones out of the game."""
+        if numpy is not None:
+            kept = numpy.zeros(self.size, dtype=numpy.bool_)
+            kept[list(indexes)] = True
+            self.active[:self.size] &= kept
+            return
+        kept = set(indexes)
+        for index in range(self.size):
+            if index not in kept:
+                self.active[index] = 0
+
+
+class RoundAnswers:
+    """
+    The answers of a round as parallel columns, appended as they arrive, so the PlayerTable takes all of them
+    in one assignment instead of a lookup per player.
+
+    Attributes:
+        indexes (array of uint32): PlayerTable index of each player that answered.
+        codes (bytearray): GameProtocol answer code of each answer.
+        latencies (array of float32): Seconds each answer took, from the moment the question was sent.
+    """
+
+    def __init__(self):
+        self.indexes = array('I')
+        self.codes = bytearray()
+        self.latencies = array('f')
+
+    def __len__(self):
+        """Returns the number of answers."""
+        return len(self.indexes)
+
+    def add(self, index, answer, latency=0.0):
+        """Appends the answer of a player (True, False or None) and how long it took."""
+        self.indexes.append(index)
+        if answer is None:
+            self.codes.append(GameProtocol.ANSWER_NONE)
+        else:
+            self.codes.append(GameProtocol.ANSWER_TRUE if answer else GameProtocol.ANSWER_FALSE)
+        self.latencies.append(latency)
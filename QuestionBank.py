@@ -0,0 +1,193 @@
+import csv
+import json
+import mmap
+import os
+import random
+from array import array
+
+
+class QuestionBank:
+    """
+    Read-only question file with an offset index, so a bank of millions of questions is never loaded as
+    Python objects.
+
+    The questions are a JSONL file (one {"text", "is_true", "category", "difficulty"} object per line) or a CSV
+    file with those columns and a header row, one question per line. The file is memory-mapped and a question
+    is parsed only when it is asked. The offset of every line and the questions of each category and difficulty
+    are kept in a sidecar index file next to it, built on the first start and whenever the questions change.
+    The index is memory-mapped too, so the startup cost does not depend on the size of the bank.
+
+    Index file layout: a JSON header line padded to a multiple of 8 bytes, then count + 1 line offsets as
+    native uint64 (the last one is the end of the file), then the question ids of every group as native uint32.
+
+    Attributes:
+        path (str): Path of the question file.
+        index_path (str): Path of the sidecar index.
+        count (int): Number of questions in the bank.
+        offsets (memoryview): Start offset of each question line, cast to uint64.
+        groups (dict): Maps ("category", name) and ("difficulty", name) to a uint32 memoryview of question ids.
+    """
+
+    INDEX_VERSION = 1
+    FIELDS = ("text", "is_true", "category", "difficulty")
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.csv = path.lower().endswith(".csv")
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if not self.index_is_current():
+            self.build_index()
+        self.load_index()
+
+    def source_signature(self):
+        """Returns what identifies the current contents of the question file."""
+        stat = os.stat(self.path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def read_index_header(self):
+        """Returns the header of the index file, or None if there is no readable one."""
+        try:
+            with open(self.index_path, "rb") as index_file:
+                return json.loads(index_file.readline())
+        except (OSError, ValueError):
+            return None
+
+    def index_is_current(self):
+        """Checks whether the index file was built from the current question file."""
+        header = self.read_index_header()
+        return (header is not None and header.get("version") == self.INDEX_VERSION
+                and header.get("source") == self.source_signature())
+
+    def line_spans(self):
+        """Yields the (start, end) offsets of every non-empty line of the question file, skipping a CSV header."""
+        data = self.data
+        size = len(data)
+        start = 0
+        first = True
+        while start < size:
+            end = data.find(b"\n", start)
+            if end == -1:
+                end = size
+            if data[start:end].strip():
+                if not (self.csv and first):
+                    yield start, end
+                first = False
+            start = end + 1
+
+    def build_index(self):
+        """Scans the question file once and writes the offset and group index next to it."""
+        offsets = array("Q")
+        groups = {}
+        for question_id, (start, end) in enumerate(self.line_spans()):
+            offsets.append(start)
+            record = self.parse_line(self.data[start:end])
+            for field in ("category", "difficulty"):
+                value = record.get(field)
+                if value:
+                    groups.setdefault(f"{field}:{value}", array("I")).append(question_id)
+        count = len(offsets)
+        offsets.append(len(self.data))
+
+        header = {"version": self.INDEX_VERSION, "source": self.source_signature(), "count": count, "groups": {}}
+        position = offsets.itemsize * len(offsets)
+        for key, members in groups.items():
+            header["groups"][key] = [position, len(members)]
+            position += members.itemsize * len(members)
+        header_line = json.dumps(header).encode("utf-8")
+        header_line += b" " * (-(len(header_line) + 1) % 8) + b"\n"
+
+        temporary_path = self.index_path + ".tmp"
+        with open(temporary_path, "wb") as index_file:
+            index_file.write(header_line)
+            offsets.tofile(index_file)
+            for members in groups.values():
+                members.tofile(index_file)
+        os.replace(temporary_path, self.index_path)
+
+    def load_index(self):
+        """Maps the index file and exposes the offsets and groups as memoryviews into it."""
+        self.index_file = open(self.index_path, "rb")
+        header_line = self.index_file.readline()
+        header = json.loads(header_line)
+        self.index_data = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        body = memoryview(self.index_data)[len(header_line):]
+        self.count = header["count"]
+        self.offsets = body[:8 * (self.count + 1)].cast("Q")
+        self.groups = {}
+        for key, (position, length) in header["groups"].items():
+            field, _, value = key.partition(":")
+            self.groups[(field, value)] = body[position:position + 4 * length].cast("I")
+
+    def parse_line(self, line):
+        """Parses one line of the question file into a dict."""
+        if self.csv:
+            row = next(csv.reader([line.decode("utf-8")]))
+            record = dict(zip(self.FIELDS, row))
+            record["is_true"] = record.get("is_true", "").strip().lower() in ("1", "true", "yes", "y", "t")
+            return record
+        return json.loads(line)
+
+    def get_question(self, question_id):
+        """Returns (text, is_true) of a question."""
+        start = self.offsets[question_id]
+        end = self.offsets[question_id + 1]
+        record = self.parse_line(self.data[start:end].rstrip(b"\r\n"))
+        return record["text"], bool(record["is_true"])
+
+    def members(self, category=None, difficulty=None):
+        """Returns the ids of the questions in a category and/or of a difficulty, as an indexable sequence."""
+        selected = [self.groups.get(group, ()) for group in (("category", category), ("difficulty", difficulty))
+                    if group[1] is not None]
+        if not selected:
+            return range(self.count)
+        if len(selected) == 1:
+            return selected[0]
+        key = ("category and difficulty", (category, difficulty))
+        if key not in self.groups:
+            other = set(selected[1])
+            self.groups[key] = memoryview(array("I", (question_id for question_id in selected[0]
+                                                      if question_id in other)))
+        return self.groups[key]
+
+    def close(self):
+        """Unmaps the question file and its index."""
+        self.offsets.release()
+        for members in self.groups.values():
+            members.release()
+        self.index_data.close()
+        self.index_file.close()
+        self.data.close()
+        self.file.close()
+
+
+class QuestionDeck:
+    """
+    Shuffled deck of question ids for one game, so no question repeats until all of them were asked.
+
+    The shuffle is a Fisher-Yates that only records the positions it swapped, so drawing costs O(1) and the
+    deck takes memory for the questions drawn, not for the whole bank. An exhausted deck is shuffled again.
+    """
+
+    def __init__(self, members, get_question, rng=None):
+        if len(members) == 0:
+            raise ValueError("There are no questions to play with")
+        self.members = members
+        self.get_question = get_question
+        self.rng = rng or random
+        self.drawn = 0
+        self.swaps = {}
+
+    def draw(self):
+        """Returns the next question as (question id, text, is_true)."""
+        if self.drawn == len(self.members):
+            self.drawn = 0
+            self.swaps.clear()
+        position = self.rng.randrange(self.drawn, len(self.members))
+        picked = self.swaps.get(position, position)
+        self.swaps[position] = self.swaps.get(self.drawn, self.drawn)
+        self.drawn += 1
+        question_id = self.members[picked]
+        text, is_true = self.get_question(question_id)
+        return question_id, text, is_true
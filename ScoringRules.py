@@ -0,0 +1,49 @@
+class ScoringRules:
+    """
+    How the rounds of a game decide its winner.
+
+    The classic rules, the default, judge every round the same way: the players who did not answer right are
+    out, unless nobody answered right, and the game goes on until a single player is left. A game where many
+    players keep answering right can last any number of rounds.
+
+    With max_rounds set, round max_rounds and the ones after it are sudden death: of the players who answered
+    right, only the fastest stays, timed by the server's monotonic clock from the moment the question was
+    sent. When nobody answered right in sudden_death_rounds such rounds, the player still in the game who spent
+    the least time on its right answers over the whole game wins. A game therefore never lasts more than
+    max_rounds + sudden_death_rounds - 1 rounds.
+
+    Attributes:
+        max_rounds (int or None): First round of sudden death, None for the classic rules.
+        sudden_death_rounds (int): Sudden death rounds played before the game is decided on time.
+    """
+
+    def __init__(self, max_rounds=None, sudden_death_rounds=3):
+        self.max_rounds = max_rounds
+        self.sudden_death_rounds = sudden_death_rounds
+
+    def sudden_death(self, round_number):
+        """Returns whether a round is played in sudden death."""
+        return self.max_rounds is not None and round_number >= self.max_rounds
+
+    def last_round(self):
+        """Returns the number of the round after which the game is over whatever happens, None for no limit."""
+        if self.max_rounds is None:
+            return None
+        return self.max_rounds + max(1, self.sudden_death_rounds) - 1
+
+    def decide(self, table, round_number, winners):
+        """
+        Applies the rules to a judged round: winners are the PlayerTable indexes of the players who answered
+        right, a list or an array. Returns the indexes of the players who stay in the game, empty when nobody
+        is out.
+        """
+        if not self.sudden_death(round_number):
+            return winners
+        if len(winners) > 1:
+            winners = [table.fastest(winners)]
+        elif len(winners) == 0 and round_number >= self.last_round():
+            fastest = table.fastest_overall()
+            winners = [] if fastest is None else [fastest]
+        if len(winners):
+            table.keep_only(winners)
+        return winners
@@ -1,59 +1,163 @@
 import socket
+import selectors
 import threading
-from collections import defaultdict
-from threading import Timer
 import time
 import random
-from struct import pack
+import signal
+from contextlib import contextmanager
 from concurrent.futures import ThreadPoolExecutor
+from Admission import Admission
+from BroadcastFanout import BroadcastFanout
+from BufferPool import BufferPool
 from Colors import Colors
+from Discovery import Discovery
+from FederatedLeaderboard import FederatedLeaderboard
+from GameProtocol import GameProtocol
+from GameRoom import GameRoom, RoomScheduler
+from GameJournal import GameJournal
+from GameStatistics import GameStatistics
+from Liveness import Liveness
+from StatsStore import StatsStore
+from MessageCache import MessageCache
+from PlayerTable import RoundAnswers
+from ScoringRules import ScoringRules
+from Metrics import ServerMetrics
+from Tracer import Tracer, SamplingProfiler
 from TriviaQuestionManager import TriviaQuestionManager
 
 class ServerMain:
-    def __init__(self, port=13117):
+    TRUE_ANSWERS = b'YTyt1'
+    FALSE_ANSWERS = b'NFnf0'
+
+    # Parts of the text messages that never change, encoded once
+    WELCOME_MESSAGE = (f"\n{Colors.PASTEL_PEACH}Welcome to the Mystic server, where we are answering trivia questions "
+                       f"about the Bible.\n").encode('utf-8')
+    ROUND_HEADER = f"{Colors.PASTEL_PEACH}{Colors.UNDERLINE}Round %d, played by %s:\n{Colors.END}{Colors.PASTEL_PEACH}".encode('utf-8')
+    CORRECT_RESULT = f"{Colors.PASTEL_ORANGE}%s is correct!{Colors.END}".encode('utf-8')
+    WINS_RESULT = f" {Colors.PASTEL_ORANGE}%s Wins!{Colors.END}".encode('utf-8')
+    NO_RESPONSE_RESULT = f"{Colors.END}{Colors.PASTEL_ORANGE}%s did not respond on time!{Colors.END}".encode('utf-8')
+    INCORRECT_RESULT = f"{Colors.PASTEL_ORANGE}%s is incorrect!{Colors.END}".encode('utf-8')
+    WINNER_MESSAGE = f"{Colors.PASTEL_BLUE}{Colors.BOLD}Game over!\nCongratulations to the winner: %s".encode('utf-8')
+    NO_WINNERS_MESSAGE = f"{Colors.BOLD}\nGame over!\nNo winners".encode('utf-8')
+
+    def __init__(self, port=13117, lobby_timeout=10.0, max_players=None, questions_path=None):
         self.udp_broadcast_port = port
-        self.clients = {}  # Stores client address and name
-        self.trivia_manager = TriviaQuestionManager()
+        self.trivia_manager = TriviaQuestionManager(questions_path)
+        self.question_filter = {}  # Category and difficulty the questions of every game are drawn from
         self.tcp_port = random.randint(1024, 65535)
         base_server_name = "Team Mystic"
         self.server_name = base_server_name.ljust(32)
         self.broadcasting = True  # New attribute to control broadcasting
-        self.game_active = False
-        self.player_names_server = []
-        self.add_number = list(range(1, 501))
-        self.executor = ThreadPoolExecutor(max_workers=30)  # Adjust based on expected load
-        self.player_names_server_lock = threading.Lock()  # Add a lock for synchronizing access
-        self.game_stats = defaultdict(list)  # Tracks scores for each game
-        self.player_scores = defaultdict(int)  # Tracks overall scores for each player
-        self.game_count = 0
+        # Games run on pooled threads too, so playing game after game does not start a thread per game. A lobby
+        # only closes into a game while a thread is free for it, see game_slots_full
+        self.max_games = 100
+        self.game_executor = ThreadPoolExecutor(max_workers=self.max_games, thread_name_prefix="game")
+        self.statistics = GameStatistics()  # Running aggregates of all the games, updated at every game over
+        self.federation = FederatedLeaderboard(self.statistics)  # Best players of every server of the LAN
+        self.stats_store = None  # Set by open_stats_store to keep the statistics across restarts
         self.server_running = True
         self.tcp_socket_server = None
+        self.backlog = 1024  # Connections the kernel queues while the admission stage is not accepting
+        self.round_timeout = 10.0  # Seconds the players have to answer a question
+        self.scoring = ScoringRules()  # Classic rules unless a round cap is set
+        self.liveness = Liveness()  # Heartbeat timeout and TCP keepalive settings of the player sockets
+        self.reap_interval = 1.0  # Seconds between two looks for dead players
+        self.receive_pool = BufferPool()  # Names and answers are read with recv_into into these buffers
+        self.admission = Admission(self)  # Reads the names of new connections and enforces the join limits
+        self.message_cache = MessageCache()  # Questions rendered to bytes once, shared by every game
+        self.prerender_questions()
+        self.outbound_settings = {}  # Keyword arguments of the BroadcastFanout each room gets
+        self.scheduler = RoomScheduler(self.create_room, self.start_game, lobby_timeout, max_players)
+        self.reuse_port = False  # Set on the workers of a ServerSupervisor, they all listen on the same port
+        self.stats_queue = None  # Set on the workers of a ServerSupervisor to report their finished games
+        self.metrics = ServerMetrics(self)  # Scraped over HTTP once serve_metrics is called
+        self.tracer = Tracer()  # Records the phases of every game once enable_tracing is called
+        self.trace_path = None
+        self.journal = GameJournal()  # Records every game event once open_journal is called
+        self.profiler = SamplingProfiler()  # Toggled with SIGUSR1, see install_signal_handlers
 
 
 
     def start_udp_broadcast(self):
-        """Modified to continuously broadcast using the current TCP port."""
+        """
+        Modified to continuously broadcast using the current TCP port, along with the leaderboard gossip, and to
+        answer discovery requests.
+        """
+        threading.Thread(target=self.answer_discovery_requests, daemon=True).start()
         with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as udp_socket:
             udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
 
             while self.server_running:
                 # Repack the message with the current TCP port
-                message = pack('!Ib32sH', 0xabcddcba, 0x2, self.server_name.encode('utf-8'), self.tcp_port)
+                message = Discovery.offer(self.server_name, self.tcp_port)
                 udp_socket.sendto(message, ('<broadcast>', self.udp_broadcast_port))
+                udp_socket.sendto(self.federation.gossip(), ('<broadcast>', self.udp_broadcast_port))
                 time.sleep(2)
+
+    def open_discovery_socket(self):
+        """
+        Binds a UDP socket to the broadcast port, shared with the clients listening there, to receive discovery
+        requests. Returns None if the port cannot be bound, clients then only learn about us from the beacon.
+        """
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            udp_socket.bind(('', self.udp_broadcast_port))
+        except OSError as e:
+            udp_socket.close()
+            print(f"{Colors.YELLOW}Not answering discovery requests, port {self.udp_broadcast_port} is unavailable: {e}")
+            return None
+        return udp_socket
+
+    def discovery_reply(self, data):
+        """
+        Returns the offer answering a discovery request, or None if data is not one. Leaderboard gossip from the
+        other servers is merged into the federated leaderboard on the way.
+        """
+        if self.federation.receive(data):
+            return None
+        nonce = Discovery.parse_request(data)
+        if nonce is None:
+            return None
+        return Discovery.offer(self.server_name, self.tcp_port, nonce, GameProtocol.VERSION)
+
+    def answer_discovery_requests(self):
+        """Answers every discovery request right away with an offer sent back to the client that asked."""
+        udp_socket = self.open_discovery_socket()
+        if udp_socket is None:
+            return
+        with udp_socket:
+            udp_socket.settimeout(1)  # Checks now and then whether the server is still running
+            while self.server_running:
+                try:
+                    data, addr = udp_socket.recvfrom(1024)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                reply = self.discovery_reply(data)
+                if reply is not None:
+                    udp_socket.sendto(reply, addr)
+
     def accept_tcp_connections(self):
-        """Accepts TCP connections from clients using a ThreadPoolExecutor."""
+        """Binds the TCP port and accepts the connections of the players."""
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as tcp_socket:
             self.tcp_socket_server = tcp_socket
             bound = False
             attempts = 0
+            # A port given on the command line can be reused right after a restart, like asyncio's servers do
+            tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.reuse_port:
+                tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             while not bound and attempts < 50:
                 try:
                     tcp_socket.bind(('', self.tcp_port))
-                    tcp_socket.listen()
+                    tcp_socket.listen(self.backlog)
                     print(f"{Colors.GREEN}Server started, listening on IP address {socket.gethostbyname(socket.gethostname())}")
                     bound = True
                 except socket.error as e:
+                    if self.reuse_port:
+                        break  # The port is shared with the other workers, it cannot be changed
                     print(f"{Colors.YELLOW}Port {self.tcp_port} is in use or cannot be bound. Trying another port...")
 
                     self.tcp_port = random.randint(1024, 65535)
@@ -66,284 +170,709 @@ class ServerMain:
 
                 return
 
-            self.wait_for_first_connection(tcp_socket)
-
-    def wait_for_first_connection(self, tcp_socket):
-        """Waits for the first connection and starts a timer for accepting more connections."""
-        first_client_connected = False
-
-        def stop_accepting_new_connections():
-            self.game_active = True
-            self.manage_game_rounds()
+            self.accept_clients(tcp_socket)
 
-        while not self.game_active:
-            tcp_socket.settimeout(1)  # Short timeout to periodically check if game has started
-            while self.server_running:
-                try:
-                    client_socket, addr = tcp_socket.accept()
-                    self.executor.submit(self.handle_client, client_socket, addr)
-                    if not first_client_connected:
-                        first_client_connected = True
-                        Timer(10.0, stop_accepting_new_connections).start()
-                except socket.timeout:
-                    continue
+    def accept_clients(self, tcp_socket):
+        """
+        Keeps accepting connections and reading their names on the admission stage, the scheduler places every
+        player in the lobby that is currently open.
+        """
+        self.admission.run(tcp_socket)
 
-    def handle_client(self, client_socket, addr):
-        """Handles communication with a connected client."""
+    def admit_player(self, client_socket, addr, protocol, player_name, started):
+        """Places a player whose name was read in the open lobby, started is when its connection was accepted."""
         try:
-            player_name = client_socket.recv(1024).decode().strip()
-            with self.player_names_server_lock:  # Use the lock when accessing the shared resource
-                if not self.check_name_unique(player_name):
-                    player_name = player_name + str(self.add_number[0])
-                    self.add_number = self.add_number[1:]
-                    self.clients[addr] = (player_name, client_socket)
-                    self.player_names_server.append(player_name)
-                self.clients[addr] = (player_name, client_socket)
-                self.player_names_server.append(player_name)
-
+            self.liveness.configure(client_socket)
+            room, player_name = self.scheduler.assign(player_name, client_socket, addr, protocol)
         except Exception as e:
+            self.metrics.handshake_failures.inc()
             print(f"{Colors.RED}Failed to handle client {addr}: {e}")
+            client_socket.close()
+            return
+        ended = time.monotonic_ns()
+        self.metrics.handshake_seconds.observe((ended - started) / 1e9)
+        self.tracer.record("handshake", started, ended, 0)
+        self.journal.join(room.room_id, player_name, protocol, (ended - started) / 1e9)
+
+    def create_room(self, room_id):
+        """Creates the room of a new game with its own write queues."""
+        return GameRoom(room_id, BroadcastFanout(**self.outbound_settings))
+
+    def start_game(self, room):
+        """
+        Plays the game of a room whose lobby just closed on a thread of the game pool. When every thread already
+        plays a game, the players are turned away instead of waiting for a thread with no news.
+        """
+        if self.scheduler.games_in_progress() > self.max_games:
+            self.turn_away(room, Admission.GAMES_FULL)
+            return
+        self.record_lobby(room)
+        self.scheduler.queue_game()
+        self.game_executor.submit(self.manage_game_rounds, room)
+
+    def game_slots_full(self):
+        """Returns whether every thread of the game pool plays a game, a lobby closing now would have to wait."""
+        return self.scheduler.games_in_progress() >= self.max_games
+
+    def turn_away(self, room, reason):
+        """Rejects every player of a room whose game cannot be played and forgets the room."""
+        for addr, (_, client_socket) in list(room.clients.items()):
+            self.metrics.players_rejected.inc()
+            self.admission.reject(client_socket, addr, room.protocol(addr), reason)
+            room.outbound.forget(addr)
+        room.clients.clear()
+        self.scheduler.finish(room)
+
+    def record_lobby(self, room):
+        """Counts a game whose lobby just closed, with how long its lobby was open and the time that saved."""
+        self.metrics.games_started.inc()
+        self.journal.lobby_closed(room.room_id, len(room.clients), room.close_reason)
+        wait = room.lobby_wait()
+        if wait is None:
+            return
+        self.metrics.lobby_wait_seconds.observe(wait)
+        self.metrics.lobby_seconds_saved.inc(max(0.0, self.scheduler.policy.max_wait - wait))
+        self.tracer.record("lobby", int(room.first_join * 1e9), int(room.closed_at * 1e9), room.room_id,
+                           args={"players": len(room.clients), "reason": room.close_reason})
+
+    def manage_game_rounds(self, room):
+        """
+        Manages the game rounds, ensuring the game continues until there is only one winner. The room goes from
+        PLAYING to RESULTS when the game is decided and to FINISHED in game_over, even if the game fails.
+        """
+        self.scheduler.dequeue_game()
+        game_started = self.trace_game_start(room)
+        try:
+            active_players = room.active_players()  # The players still in the game, read from the player table
+
+            round_number = 1
+            roster = None  # Players the binary clients were last told about
+            deck = self.trivia_manager.new_deck(**self.question_filter)  # No question repeats within a game
+
+            while len(active_players) >= 1:
+                round_started = time.monotonic_ns()
+                question_id, question, correct_answer = deck.draw()
+                self.journal.question(room.room_id, round_number, question_id)
+                message = self.build_round_message(room, round_number, active_players, question_id, question)
+                frame = self.build_round_frame(room, round_number, roster, question_id, question)
+                roster = room.players.snapshot()
+
+                self.check_players(room)
+                with self.phase(self.metrics.broadcast_seconds, "broadcast", room, round_number):
+                    self.broadcast_question(room, active_players, message, frame)
+
+                # Collect and evaluate answers within a timeout (10 seconds)
+                collect_started = time.monotonic_ns()
+                with self.phase(self.metrics.collect_seconds, "collect", room, round_number):
+                    answers = self.collect_answers(room, active_players)
+                self.trace_answers(room, round_number, collect_started, answers)
+                with self.phase(self.metrics.evaluate_seconds, "evaluate", room, round_number):
+                    winners = self.evaluate_answers(room, answers, correct_answer)
+                self.metrics.rounds.inc()
+                self.tracer.record(f"round {round_number}", round_started, time.monotonic_ns(), room.room_id)
+
+                if self.game_continues(active_players, winners):
+                    round_number += 1
+                else:
+                    break  # Exit loop if one player is left
 
-
-
-
-
-    def check_name_unique(self, name):
-        """Checks if the received name is unique."""
-        if name not in self.player_names_server:
-            return True
-        return False
-
-
-    def manage_game_rounds(self):
-        """Manages the game rounds, ensuring the game continues until there is only one winner."""
-        active_players = self.clients.copy()  # Copy the current clients as active players for this round
-
-        round_number = 1
-
-        while len(active_players) >= 1:
-            question, correct_answer = self.trivia_manager.get_random_question()
-            question =f'{Colors.BOLD}True or false:{question}{Colors.END}\n'
-
-            if round_number == 1:
-                message = f"\n{Colors.PASTEL_PEACH}Welcome to the Mystic server, where we are answering trivia questions about the Bible.\n"
-                for idx, player_name in enumerate(self.clients.values(), start=1):
-
-                    message += f"Player {idx}: {player_name[0]}\n"
-                message += "==\n"+ question
-
-            else:
-                players_names = list(active_players.values())
-                players_names = [name for name, _ in players_names]
-                if len(players_names) > 1:
-                    players_list = ', '.join(players_names[:-1]) + ' and ' + players_names[-1]
+            self.scheduler.show_results(room)
+            with self.phase(self.metrics.announce_seconds, "announce", room):
+                if active_players:
+                    self.announce_winner(room, active_players)  # Announce to all clients
                 else:
-                    players_list = players_names[0]
-                message = f"{Colors.PASTEL_PEACH}{Colors.UNDERLINE}Round {round_number}, played by {players_list}:\n{Colors.END}{Colors.PASTEL_PEACH}{question}"
+                    self.send_to_players(room, room.clients, self.build_no_winners_message(),
+                                         GameProtocol.game_over_frame())
+        except Exception as e:
+            print(f"{Colors.RED}Game aborted in room {room.room_id}: {e}")
 
-            self.broadcast_question(active_players, message)
+        self.tracer.record("game", game_started, time.monotonic_ns(), room.room_id)
+        self.game_over(room)
 
-            # Collect and evaluate answers within a timeout (10 seconds)
-            answers = self.collect_answers(active_players)
-            winners, active_players = self.evaluate_answers(answers, active_players, correct_answer)
+    @contextmanager
+    def phase(self, histogram, name, room=None, round_number=None):
+        """Times a phase into its metrics histogram and, when tracing, records it as a span of the room."""
+        started = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            ended = time.monotonic_ns()
+            histogram.observe((ended - started) / 1e9)
+            self.tracer.record(name, started, ended, room.room_id if room else 0, 0,
+                               {"round": round_number} if round_number else None)
+
+    def trace_game_start(self, room):
+        """Names the trace tracks of a room and its players, returns the start time of the game."""
+        if self.tracer.enabled:
+            self.tracer.name_track(room.room_id, None, f"room {room.room_id}")
+            self.tracer.name_track(room.room_id, 0, "game")
+            for index, player_name in enumerate(room.players.names):
+                self.tracer.name_track(room.room_id, index + 1, player_name)
+        return time.monotonic_ns()
+
+    def trace_answers(self, room, round_number, started, answers):
+        """Records the time each player took to answer as a span on its own track."""
+        if not self.tracer.enabled:
+            return
+        for index, latency in zip(answers.indexes, answers.latencies):
+            self.tracer.record("answer", started, started + int(latency * 1e9), room.room_id, index + 1,
+                               {"round": round_number})
+
+    def prerender_questions(self):
+        """
+        Renders the questions to bytes up front, so no round has to encode one. A bank larger than the message
+        cache is rendered as its questions are asked instead.
+        """
+        if self.trivia_manager.question_count() > self.message_cache.max_entries:
+            return
+        for question_id in range(self.trivia_manager.question_count()):
+            self.render_question(question_id, self.trivia_manager.get_question(question_id)[0])
+
+    def choose_questions(self, category=None, difficulty=None):
+        """Limits the questions of the next games to a category and/or a difficulty, raises ValueError if none match."""
+        question_filter = {"category": category, "difficulty": difficulty}
+        self.trivia_manager.new_deck(**question_filter)
+        self.question_filter = question_filter
+
+    def render_question(self, question_id, question):
+        """Returns the question as the encoded text line, rendered once and then served from the message cache."""
+        return self.message_cache.get(
+            ('question', question_id), lambda: f'{Colors.BOLD}True or false:{question}{Colors.END}\n'.encode('utf-8'))
+
+    def build_round_message(self, room, round_number, active_players, question_id, question):
+        """Builds the encoded text sent to the players at the start of a round."""
+        question = self.render_question(question_id, question)
+
+        if round_number == 1:
+            parts = [self.WELCOME_MESSAGE]
+            encoded_names = room.players.encoded_names
+            for idx, index in enumerate(room.players.active_indexes(), start=1):
+                parts.append(b'Player %d: %s\n' % (idx, encoded_names[index]))
+            parts.append(b'==\n')
+            parts.append(question)
+            return b''.join(parts)
+
+        return self.ROUND_HEADER % (round_number, room.encoded_roster(active_players)) + question
+
+    def build_round_frame(self, room, round_number, roster, question_id, question):
+        """
+        Builds the frames of a round for binary clients: the roster changes since the last round and the question.
+        roster is the PlayerTable snapshot taken when the last round was sent, None before the first one.
+        """
+        joined, left = room.players.roster_changes(roster)
+        text = self.message_cache.get(('question text', question_id), lambda: question.encode('utf-8'))
+        return GameProtocol.roster_frame(joined, left) + GameProtocol.question_frame(round_number, question_id, text)
+
+    def game_continues(self, active_players, winners):
+        """Returns True while the game has no single winner yet."""
+        if len(active_players) == 1 and len(winners) == 0:
+            return True
+        return len(active_players) > 1 and len(winners) != 1
 
-            if len(active_players) == 1 and len(winners) == 0:
-                round_number += 1
-            elif len(active_players) > 1 and len(winners) != 1:
-                round_number += 1
+    def broadcast_question(self, room, active_players, message, frame):
+        """Sends the trivia question to all active players."""
+        self.send_to_players(room, active_players, message, frame)
+
+    def send_to_players(self, room, players, message, frame):
+        """
+        Fans a message out to the given players, as encoded text or as a binary frame depending on what each one
+        speaks, and disconnects the ones that failed or fell behind. The same bytes object is queued for every player.
+        """
+        text_players, binary_players = room.split_by_protocol(players)
+        failed = []
+        if text_players:
+            failed += room.outbound.enqueue(text_players, message)
+        if binary_players:
+            failed += room.outbound.enqueue(binary_players, frame)
+        failed += room.outbound.flush([addr for addr in players if addr not in failed])
+        for addr in failed:
+            self.evict_player(room, addr)
+
+    def evict_player(self, room, addr):
+        """Disconnects a player that cannot be written to and removes it from the game."""
+        player = self.remove_from_game(room, addr)
+        if player is None:
+            return
+        player_name, connection = player
+        self.metrics.evictions.inc()
+        self.journal.leave(room.room_id, room.rounds, player_name)
+        print(f"{Colors.RED}Disconnecting player {player_name} at {addr}, it is not keeping up with the game")
+        self.close_connection(connection)
+
+    def reap_player(self, room, addr, reason="it stopped responding"):
+        """Disconnects a player whose connection is dead and removes it from the game."""
+        player = self.remove_from_game(room, addr)
+        if player is None:
+            return
+        player_name, connection = player
+        self.metrics.dead_players.inc()
+        self.journal.leave(room.room_id, room.rounds, player_name)
+        print(f"{Colors.RED}Disconnecting player {player_name} at {addr}, {reason}")
+        self.close_connection(connection)
+
+    def remove_from_game(self, room, addr):
+        """Takes a player out of its room, and so of its game, returns its (name, connection) or None."""
+        player = room.remove_player(addr)
+        room.outbound.forget(addr)
+        return player
+
+    def close_connection(self, connection):
+        """Closes the connection of a player."""
+        connection.close()
+
+    def receive_from_player(self, room, addr, client_socket, buffer, now):
+        """
+        Reads what a player sent and marks it alive if it sent heartbeats. Returns (the complete messages other
+        than heartbeats, None), or (None, reason) when the connection was closed or failed.
+        """
+        try:
+            data = BufferPool.receive_into(client_socket, buffer)
+        except (BlockingIOError, InterruptedError):
+            return b'', None
+        except OSError as e:
+            return None, f"its connection failed ({e})"
+        if not data:
+            return None, "it closed the connection"
+        try:
+            return self.split_messages(room, addr, data, now), None
+        except ValueError as e:
+            return None, f"it sent a malformed frame ({e})"
+
+    def split_messages(self, room, addr, data, now):
+        """
+        Splits what a player sent into its messages and marks it alive at now if any was a heartbeat. The bytes of
+        a binary player go through its FrameReader, so a frame split across two reads is returned once complete,
+        as a frame of its own, and the frames after it stay aligned. What a text player sent is one message.
+        Raises ValueError on a malformed frame.
+        """
+        frames = room.frame_reader(addr)
+        if frames is None:
+            return [data]
+        messages = []
+        for message_type, payload in frames.feed(data):
+            if message_type == GameProtocol.HEARTBEAT:
+                room.players.touch(addr, now)
             else:
-                break  # Exit loop if one player is left
-
-        if active_players:
-            self.announce_winner(active_players.keys())  # Announce to all clients
-        else:
-            no_winners_message = f"{Colors.BOLD}\nGame over!\nNo winners"
-            for addr, (_, client_socket) in self.clients.items():
+                messages.append(GameProtocol.frame(message_type, payload))
+        return messages
+
+    def poll_players(self, room, players):
+        """
+        Reads whatever the players sent without blocking. Heartbeats mark them alive and anything else is an answer
+        that arrived after its round closed, which is dropped so it is not used for the next question.
+        Returns {addr: reason} for the players whose connection is gone or that stopped sending heartbeats.
+        """
+        dead = {}
+        now = time.monotonic()
+        with selectors.DefaultSelector() as selector, self.receive_pool.buffer() as buffer:
+            for addr, (_, client_socket) in players.items():
                 try:
-                    client_socket.sendall(no_winners_message.encode('utf-8'))
-                except Exception as e:
-
-                    print(f"{Colors.RED}Failed to announce there are no winners to {self.clients[addr][0]}: {e}")
-
-        self.game_over()
-
-    def broadcast_question(self, active_players, message):
-        """Sends the trivia question to all active players."""
-        for addr, (player_name, client_socket) in active_players.items():
-            try:
-                client_socket.sendall(message.encode('utf-8'))
-            except Exception as e:
-
-                print(f"{Colors.RED}Error broadcasting question to player {player_name} at {addr}: {e}")
-
-    def collect_answers(self, active_players):
-        """Collects answers from each active player within a specified timeout."""
-        answers = {}
-        for addr, (player_name, client_socket) in active_players.items():
-            try:
-                data = client_socket.recv(1024).decode('utf-8').strip().upper()
-                if data in ['Y', 'T', '1']:  # Interpreted as True
-                    answers[addr] = True
-                elif data in ['N', 'F', '0']:  # Interpreted as False
-                    answers[addr] = False
-                else:
-                    answers[addr] = None
-            except Exception as e:
-
-                print(f"{Colors.RED}Failed to receive answer from {player_name}:{e}")
-
-
+                    selector.register(client_socket, selectors.EVENT_READ, addr)
+                except (ValueError, OSError):
+                    dead[addr] = "its connection is closed"
+
+            for key, _ in selector.select(0):
+                _, reason = self.receive_from_player(room, key.data, key.fileobj, buffer, now)
+                if reason:
+                    dead[key.data] = reason
+
+        for addr in room.players.silent(self.liveness.silent_since(now)):
+            if addr in players:
+                dead.setdefault(addr, "it stopped sending heartbeats")
+        return dead
+
+    def check_players(self, room):
+        """Runs before every round: drops late answers and disconnects the players of the room that are gone."""
+        for addr, reason in self.poll_players(room, room.clients).items():
+            self.reap_player(room, addr, reason)
+
+    def reap_dead_players(self):
+        """
+        Reaper thread: disconnects the players that left or went silent while waiting in a lobby. Running games
+        check their own players every round and while they wait for answers.
+        """
+        while self.server_running:
+            time.sleep(self.reap_interval)
+            for room in self.scheduler.active_rooms():
+                if room.state == GameRoom.LOBBY:
+                    self.check_lobby(room)
+
+    def check_lobby(self, room):
+        """Disconnects the dead players of a lobby, the scheduler lock keeps players from joining meanwhile."""
+        with self.scheduler.lock:
+            if room.state != GameRoom.LOBBY:
+                return
+            players = dict(room.clients)
+        dead = self.poll_players(room, players)
+        with self.scheduler.lock:
+            if room.state != GameRoom.LOBBY:
+                return  # The game started meanwhile and checks its players itself
+            for addr, reason in dead.items():
+                self.reap_player(room, addr, reason)
+
+    def collect_answers(self, room, active_players):
+        """
+        Waits on all active players at once and returns as soon as every one of them answered,
+        or when the round timeout expires. Returns the RoundAnswers of the players who answered in time,
+        with the seconds each one took.
+
+        Heartbeats do not count as answers. A player whose connection closes or fails, or that stops sending
+        heartbeats, is disconnected right away and left out of the answers, so the round does not wait for it.
+        """
+        answers = RoundAnswers()
+        index = room.players.index
+        dead = {}
+        started = time.monotonic()
+        deadline = started + self.round_timeout
+
+        with selectors.DefaultSelector() as selector, self.receive_pool.buffer() as buffer:
+            for addr, (player_name, client_socket) in active_players.items():
+                try:
+                    selector.register(client_socket, selectors.EVENT_READ, addr)
+                except (ValueError, OSError) as e:
+                    print(f"{Colors.RED}Failed to receive answer from {player_name}:{e}")
+
+            while selector.get_map():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break  # Round is over, whoever did not answer did not respond on time
+
+                for key, _ in selector.select(min(timeout, self.reap_interval)):
+                    addr = key.data
+                    now = time.monotonic()
+                    messages, reason = self.receive_from_player(room, addr, key.fileobj, buffer, now)
+                    if not reason and not messages:
+                        continue  # Only heartbeats or part of a frame, the answer is still to come
+                    selector.unregister(key.fileobj)
+                    if reason:
+                        dead[addr] = reason
+                        continue
+                    answers.add(index[addr], self.parse_answer(messages[0]), now - started)
+
+                for addr in room.players.silent(self.liveness.silent_since(time.monotonic())):
+                    if addr in active_players and addr not in dead:
+                        try:
+                            selector.unregister(active_players[addr][1])
+                        except (KeyError, ValueError):
+                            continue  # Already answered
+                        dead[addr] = "it stopped sending heartbeats"
+
+        for addr, reason in dead.items():
+            self.reap_player(room, addr, reason)
         return answers
 
-    def evaluate_answers(self, answers, active_players, correct_answer):
-        """Evaluates the collected answers and updates the list of active players, with specific output formatting."""
-        winners = []
-        no_correct_answers = []
-        result_messages = {}
-        current_game_scores = defaultdict(int)
-
-        # First, compile the correctness of each answer
-        for addr, answer in answers.items():
-            player_name = active_players[addr][0]
-            if correct_answer == answer:
-                winners.append(addr)
-                current_game_scores[player_name] += 1  # Award point for correct answer
-                self.player_scores[player_name] += 1  # Update overall score
-                result_messages[addr] = f"{Colors.PASTEL_ORANGE}{player_name} is correct!{Colors.END}"
-            elif answer is None:
-                no_correct_answers.append(addr)
-                result_messages[addr] = f"{Colors.END}{Colors.PASTEL_ORANGE}{player_name} did not respond on time!{Colors.END}"
-            else:
-                no_correct_answers.append(addr)
-                result_messages[addr] = f"{Colors.PASTEL_ORANGE}{player_name} is incorrect!{Colors.END}"
-
-        if len(winners) == 1:
-            winner_addr = winners[0]
-            winner_name = active_players[winner_addr][0]
-            # Add a winning note to the winner's message
-            result_messages[winner_addr] += f" {Colors.PASTEL_ORANGE}{winner_name} Wins!{Colors.END}"
-
-        # Compile the broadcast message from individual messages
-        broadcast_message = "\n"+"\n".join(result_messages.values())+"\n"
+    def parse_answer(self, data):
+        """
+        Maps the raw bytes of an answer, text or ANSWER frame, to True, False or None.
+        Works on the receive buffer directly, without decoding it to a string.
+        """
+        if GameProtocol.is_frame(data):
+            return GameProtocol.parse_answer_frame(data)
+        start, end = GameProtocol.text_span(data)
+        if end - start != 1:
+            return None
+        if data[start] in self.TRUE_ANSWERS:  # Interpreted as True
+            return True
+        elif data[start] in self.FALSE_ANSWERS:  # Interpreted as False
+            return False
+        return None
 
-        if len(no_correct_answers) != len(active_players):
-            # Remove players who answered incorrectly from active_players for the next round
-            for addr in list(active_players.keys()):  # Convert to list to avoid 'dictionary changed size during iteration' error
-                if addr not in winners:
-                    del active_players[addr]
+    def evaluate_answers(self, room, answers, correct_answer):
+        """Evaluates the collected answers, sends the results of the round and returns the winners."""
+        winners, players, outcomes = self.judge_answers(room, answers, correct_answer)
 
         # Broadcast the message to all remaining players
-        for addr in self.clients.keys():
-            try:
-                client_socket = self.clients[addr][1]
-                client_socket.sendall(broadcast_message.encode('utf-8'))
-            except Exception as e:
-                print(f"{Colors.RED}Failed to send result message: {self.clients[addr][0]} {e}")
-
-
-        self.game_stats[self.game_count].append(current_game_scores)
+        results = room.players.results(players, outcomes)
+        self.send_to_players(room, room.clients, self.build_results_message(results),
+                             GameProtocol.result_frame(results))
+
+        return winners
+
+    def judge_answers(self, room, answers, correct_answer):
+        """
+        Scores a round from its RoundAnswers and takes the players who lost it out of the game. Returns
+        (winners, players, outcomes): the PlayerTable indexes of the players who stay because they won the round,
+        empty when nobody is out, and the indexes of the players judged with their GameProtocol outcomes.
+
+        The answers are written to the room's PlayerTable in one go, which judges all of them at once and keeps
+        the players still in the game in its active column. The outcomes stay arrays until they are rendered,
+        and the journal gets them as one batch it expands on its own thread.
+        """
+        table = room.players
+        table.clear_answers()
+        table.record_answers(answers)
+        players, outcomes, winners = table.evaluate(correct_answer)
+        room.rounds += 1
+        if self.journal.enabled:
+            self.journal.answers(room.room_id, room.rounds, table.names, players, outcomes,
+                                 table.take(table.latencies, players))
+        if self.stats_store is not None and len(winners):
+            self.stats_store.add_scores(dict.fromkeys(map(table.names.__getitem__, winners), 1))
+        winners = self.scoring.decide(table, room.rounds, winners)
+        if self.journal.enabled:
+            self.journal.eliminations(room.room_id, room.rounds, table.names, table.left_out(players))
+        return winners, players, outcomes
+
+    def build_results_message(self, results):
+        """Builds the encoded text with the outcome of every player in a round, from (encoded name, outcome) pairs."""
+        correct = [encoded_name for encoded_name, outcome in results if outcome == GameProtocol.CORRECT]
+        result_messages = []
+        for encoded_name, outcome in results:
+            if outcome == GameProtocol.CORRECT:
+                result_message = self.CORRECT_RESULT % encoded_name
+                if len(correct) == 1:
+                    # Add a winning note to the winner's message
+                    result_message += self.WINS_RESULT % encoded_name
+            elif outcome == GameProtocol.NO_RESPONSE:
+                result_message = self.NO_RESPONSE_RESULT % encoded_name
+            else:
+                result_message = self.INCORRECT_RESULT % encoded_name
+            result_messages.append(result_message)
 
-        return winners, active_players
+        # Compile the broadcast message from individual messages, encoded once for every player
+        return b"\n" + b"\n".join(result_messages) + b"\n"
 
+    def build_winner_message(self, active_players):
+        """Builds the encoded game over text naming the winner."""
+        winner_name, _ = next(iter(active_players.values()))
+        return self.WINNER_MESSAGE % winner_name.encode('utf-8')
 
+    def build_no_winners_message(self):
+        """Returns the encoded game over text used when every player was eliminated."""
+        return self.NO_WINNERS_MESSAGE
 
-    def announce_winner(self, winner_addr):
-        winner_addr_tuple = list(winner_addr)[0]
+    def announce_winner(self, room, active_players):
         """Announces the winner to all clients."""
-        winner_name, _ = self.clients[winner_addr_tuple]
-
-
-        winner_message = f"{Colors.PASTEL_BLUE}{Colors.BOLD}Game over!\nCongratulations to the winner: {winner_name}"
-
-
-        for addr, (_, client_socket) in self.clients.items():
-            try:
-                client_socket.sendall(winner_message.encode('utf-8'))
-            except Exception as e:
-
-                print(f"{Colors.RED}Failed to announce winner to {self.clients[addr][0]}: {e}")
-
-    def game_over(self):
-        """Handles tasks after a game round ends."""
-        self.game_count += 1
+        winner_name, _ = next(iter(active_players.values()))
+        self.send_to_players(room, room.clients, self.build_winner_message(active_players),
+                             GameProtocol.game_over_frame(winner_name))
+
+    def record_game(self, room):
+        """Adds a finished game to the statistics and prints them."""
+        scores = room.players.game_scores()
+        duration = time.monotonic() - room.closed_at if room.closed_at is not None else None
+        self.journal.game_over(room.room_id, room.rounds)
+        if self.stats_queue is not None:
+            # Worker of a ServerSupervisor, the supervisor prints the statistics of all the workers
+            self.stats_queue.put((room.rounds, scores, duration))
+            return
+        self.statistics.record_game(room.rounds, scores, duration)
+        if self.stats_store is not None:
+            self.stats_store.add_game(room.rounds)
         self.print_statistics()  # Print statistics at the end of each game
 
-        print(f"{Colors.BLUE}Game over, sending out offer requests...")
+    def game_over(self, room):
+        """Handles tasks after the game of a room ends."""
+        self.record_game(room)
+        self.metrics.games_finished.inc()
+
+        print(f"{Colors.BLUE}Game over in room {room.room_id}, closing its connections...")
+        counters = self.receive_pool.counters()
+        print(f"Receive buffers: {counters['hits']} pool hits, {counters['misses']} misses, {counters['idle']} idle")
+        print(f"Message cache: {self.message_cache.hits} hits, {self.message_cache.misses} misses")
 
-        # Close all client connections
-        for addr, (_, client_socket) in self.clients.items():
+        # Give the game over message a last chance to leave the queues, then close all client connections
+        room.outbound.flush(list(room.clients))
+        room.outbound.clear()
+        for addr, (_, client_socket) in room.clients.items():
             client_socket.close()
-        self.clients.clear()  # Clear the list of clients for the next round
-        self.player_names_server.clear()
-        self.game_active = False
-        self.broadcasting = True  # Enable broadcasting for the next round
-        # Optionally, restart the UDP broadcast on a new thread if not automatically restarting
-        self.add_number = list(range(1, 501))
-        self.start()
+        room.clients.clear()
+        self.scheduler.finish(room)
+
+    def open_stats_store(self, path):
+        """Loads the statistics saved in an SQLite file and keeps saving them there in the background."""
+        self.stats_store = StatsStore(path)
+        self.statistics.load(*self.stats_store.load(self.statistics.max_players))
+        self.stats_store.start()
+        print(f"{Colors.GREEN}Loaded the statistics of {self.statistics.game_count} games from {path}")
+
+    def enable_tracing(self, path):
+        """Starts recording the phases of every game, the trace is written to path at shutdown and on SIGUSR2."""
+        self.tracer.enabled = True
+        self.trace_path = path
+        self.tracer.name_track(0, None, "server")
+
+    def open_journal(self, path):
+        """Starts appending every game event to the journal at path, see GameJournal and GameReplay."""
+        self.journal.open(path, self.journal_settings())
+        print(f"{Colors.GREEN}Journaling the games to {path}")
+
+    def journal_settings(self):
+        """Returns the settings a replay of the journaled games needs to run them the same way."""
+        policy = self.scheduler.policy
+        return {"lobby_timeout": policy.max_wait, "min_players": policy.min_players,
+                "max_players": policy.max_players, "quorum": policy.quorum, "quiet_period": policy.quiet_period,
+                "round_timeout": self.round_timeout, "max_rounds": self.scoring.max_rounds,
+                "sudden_death_rounds": self.scoring.sudden_death_rounds, "question_filter": self.question_filter}
+
+    def install_signal_handlers(self):
+        """SIGUSR1 starts or stops the sampling profiler, SIGUSR2 writes the trace. Only on platforms with them."""
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.profiler.toggle())
+        if hasattr(signal, "SIGUSR2"):
+            signal.signal(signal.SIGUSR2, lambda signum, frame: self.trace_path and self.tracer.export(self.trace_path))
+
+    def serve_metrics(self, port):
+        """Serves the metrics of the server in the Prometheus text format on http://127.0.0.1:port/metrics."""
+        self.metrics.serve(port)
+        print(f"{Colors.GREEN}Serving metrics on http://127.0.0.1:{port}/metrics")
 
     def print_statistics(self):
+        """Prints the running statistics, reading only the aggregates so it costs O(k) whatever the history."""
+        statistics = self.statistics
         print(f"{Colors.END}Game Statistics:")
-        print(f"Total games played: {self.game_count}")
-        # Find the best player ever
-        # Get the highest score or 0 if no scores are available or if all scores are less than 0
-        best_score = max(0, max(self.player_scores.values(), default=0))
-
-        # Now, find the player with this score
-        best_player = next((player for player, score in self.player_scores.items() if score == best_score), "No player")
-        print(f"Best player ever: {best_player} with score {self.player_scores[best_player]}")
-        # Average rounds per game
-        avg_rounds = int(sum(len(game) for game in self.game_stats.values()) / len(self.game_stats))
-        print(f"Average rounds per game: {avg_rounds}")
-        # Ranking of players by score in the latest game
-
-        if self.game_stats:
-            latest_game = self.game_stats[self.game_count - 1]  # This is a list of defaultdict(int)
-
-            # Aggregate scores across all rounds in the latest game
-            total_scores = defaultdict(int)
-            for round_scores in latest_game:
-                for player, score in round_scores.items():
-                    total_scores[player] += score
-
-            # Now sort the aggregated scores
-            sorted_players = sorted(total_scores.items(), key=lambda item: item[1], reverse=True)
+        print(f"Total games played: {statistics.game_count}")
+        best_player, best_score = statistics.best_player() or ("No player", 0)
+        print(f"Best player ever: {best_player} with score {best_score}")
+        servers = self.federation.servers()
+        if servers > 1:
+            cluster_player, cluster_score = (self.federation.leaderboard() or [("No player", 0)])[0]
+            print(f"Best player on the {servers} servers of the network: {cluster_player} with score {cluster_score}")
+        print(f"Average rounds per game: {int(statistics.average_rounds())}")
+        rounds = statistics.rounds_percentiles()
+        if rounds:
+            print("Rounds per game: " + ", ".join(f"{name} {value}" for name, value in rounds.items()))
+        durations = statistics.duration_percentiles()
+        if durations:
+            longest = statistics.DURATION_BUCKETS[-2]  # The last bucket has no upper bound
+            print("Game duration: " + ", ".join(f"{name} <= {value:g}s" if value <= longest else f"{name} > {longest:g}s"
+                                                for name, value in durations.items()))
 
+        # Ranking of players by score in the latest game
+        if statistics.latest_ranking:
             print("Ranking players by correct answers in this game:")
-            for rank, (player, score) in enumerate(sorted_players, 1):
+            for rank, (player, score) in enumerate(statistics.latest_ranking, 1):
                 print(f"{rank}. {player} - {score} correct answers")
 
     def start(self):
         """Starts the server."""
         threading.Thread(target=self.accept_tcp_connections, daemon=True).start()
+        threading.Thread(target=self.reap_dead_players, daemon=True).start()
         self.start_udp_broadcast()
 
+    def start_worker(self):
+        """Serves games without a beacon, used by the workers of a ServerSupervisor."""
+        threading.Thread(target=self.reap_dead_players, daemon=True).start()
+        self.accept_tcp_connections()
+
     def shutdown_server(self):
         """Shuts down the server and closes all active connections."""
         self.server_running = False
-        self.game_active = False  # Stop the game
 
         # Close all client sockets
-        for _, (player_name, client_socket) in self.clients.items():
-            print(f"Closing connection for {player_name}")
+        for room in self.scheduler.active_rooms():
+            for _, (player_name, client_socket) in room.clients.items():
+                print(f"Closing connection for {player_name}")
 
-            client_socket.close()
+                client_socket.close()
+            room.clients.clear()
 
         # Close the server socket
         if self.tcp_socket_server:
             print(f"{Colors.BLUE}Closing the server socket...{Colors.END}")
             self.tcp_socket_server.close()
 
-        # Clear the clients dictionary
-        self.clients.clear()
-
-        # Shutdown the thread pool executor
-        self.executor.shutdown(wait=True)
+        # Shutdown the game pool, the games end once their sockets are closed
+        self.game_executor.shutdown(wait=False)
+        if self.stats_store is not None:
+            self.stats_store.close()
+        self.journal.close()
+        self.metrics.close()
+        self.stop_tracing()
         print(f"{Colors.BLUE}Server has been shutdown cleanly.{Colors.END}")
 
+    def stop_tracing(self):
+        """Writes the trace and the running profile, if any."""
+        if self.trace_path:
+            self.tracer.export(self.trace_path)
+        if self.profiler.running:
+            self.profiler.stop()
+
 
 # Starting the server
 if __name__ == "__main__":
-    server = ServerMain()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trivia game server")
+    parser.add_argument("--backend", choices=["threads", "asyncio"], default="threads",
+                        help="networking engine used to run the game")
+    parser.add_argument("--lobby-timeout", type=float, default=10.0,
+                        help="seconds a lobby stays open after its first player joined")
+    parser.add_argument("--max-players", type=int, default=None,
+                        help="players that fill a lobby and start its game right away")
+    parser.add_argument("--questions", default=None,
+                        help="JSONL or CSV question bank to play with instead of the built-in questions")
+    parser.add_argument("--category", default=None, help="only ask questions of this category")
+    parser.add_argument("--difficulty", default=None, help="only ask questions of this difficulty")
+    parser.add_argument("--stats-db", default=None,
+                        help="SQLite file the statistics are kept in across restarts, kept in memory when omitted")
+    parser.add_argument("--udp-port", type=int, default=13117,
+                        help="broadcast port of the offers and the leaderboard gossip, clients listen on 13117")
+    parser.add_argument("--tcp-port", type=int, default=None, help="TCP port to serve on instead of a random one")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random choices, to replay a run")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on this local port, workers use the ports after it")
+    parser.add_argument("--trace", default=None,
+                        help="record the phases of every game and write them to this Chrome trace JSON file")
+    parser.add_argument("--journal", default=None,
+                        help="append every game event to this binary journal, replay it with GameReplay.py")
+    parser.add_argument("--round-timeout", type=float, default=10.0, help="seconds the players have to answer")
+    parser.add_argument("--max-rounds", type=int, default=None,
+                        help="round from which the fastest right answer wins (sudden death), classic rules if unset")
+    parser.add_argument("--sudden-death-rounds", type=int, default=3,
+                        help="sudden death rounds without a right answer before the game is decided on answer time")
+    parser.add_argument("--min-players", type=int, default=1, help="players a game needs to start")
+    parser.add_argument("--quorum", type=int, default=2,
+                        help="players from which a lobby closes once arrivals go quiet, 0 to always wait the timeout")
+    parser.add_argument("--quiet-period", type=float, default=1.0,
+                        help="longest silence in seconds after which a lobby that reached its quorum closes")
+    parser.add_argument("--max-lobby", type=int, default=None,
+                        help="players the open lobby holds before new players are turned away")
+    parser.add_argument("--max-pending", type=int, default=256,
+                        help="connections whose name is awaited at once, accepting pauses beyond that")
+    parser.add_argument("--handshake-timeout", type=float, default=5.0,
+                        help="seconds a new connection has to send its name")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes sharing the TCP port, more than 1 starts a ServerSupervisor")
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.workers > 1:
+        from ServerSupervisor import ServerSupervisor
+        server = ServerSupervisor(port=args.udp_port, workers=args.workers, backend=args.backend,
+                                  lobby_timeout=args.lobby_timeout, max_players=args.max_players,
+                                  questions_path=args.questions)
+    elif args.backend == "asyncio":
+        from AsyncServerMain import AsyncServerMain
+        server = AsyncServerMain(port=args.udp_port, lobby_timeout=args.lobby_timeout, max_players=args.max_players,
+                                 questions_path=args.questions)
+    else:
+        server = ServerMain(port=args.udp_port, lobby_timeout=args.lobby_timeout, max_players=args.max_players,
+                            questions_path=args.questions)
+    try:
+        server.choose_questions(args.category, args.difficulty)
+    except ValueError:
+        parser.error("no question matches --category and --difficulty")
+    if args.tcp_port:
+        server.tcp_port = args.tcp_port
+    server.round_timeout = args.round_timeout
+    server.scoring = ScoringRules(args.max_rounds, args.sudden_death_rounds)
+    server.scheduler.policy.min_players = args.min_players
+    server.scheduler.policy.quorum = args.quorum or None
+    server.scheduler.policy.quiet_period = args.quiet_period
+    server.admission.max_lobby = args.max_lobby
+    server.admission.max_pending = args.max_pending
+    server.admission.handshake_timeout = args.handshake_timeout
+    if args.metrics_port:
+        server.serve_metrics(args.metrics_port)
+    if args.trace:
+        server.enable_tracing(args.trace)
+    if args.journal:
+        server.open_journal(args.journal)
+    server.install_signal_handlers()
+    if args.stats_db:
+        server.open_stats_store(args.stats_db)
     try:
         server.start()
     except KeyboardInterrupt:
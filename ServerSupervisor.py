@@ -0,0 +1,188 @@
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+from Colors import Colors
+from ServerMain import ServerMain
+
+
+def run_worker(worker_id, backend, tcp_port, stats_queue, lobby_timeout, max_players, questions_path=None,
+               question_filter=None, metrics_port=None, trace_path=None, admission_limits=None, lobby_policy=None,
+               scoring=None, round_timeout=10.0, journal_path=None):
+    """Entry point of a worker process: serves games on the shared TCP port and reports them to the supervisor."""
+    if backend == "asyncio":
+        from AsyncServerMain import AsyncServerMain
+        server = AsyncServerMain(lobby_timeout=lobby_timeout, max_players=max_players, questions_path=questions_path)
+    else:
+        server = ServerMain(lobby_timeout=lobby_timeout, max_players=max_players, questions_path=questions_path)
+    server.question_filter = question_filter or {}
+    server.tcp_port = tcp_port
+    server.reuse_port = True
+    server.round_timeout = round_timeout
+    server.stats_queue = stats_queue
+    if lobby_policy is not None:
+        server.scheduler.policy = lobby_policy
+    if scoring is not None:
+        server.scoring = scoring
+    if admission_limits:
+        server.admission.max_lobby, server.admission.max_pending, server.admission.handshake_timeout = admission_limits
+    if metrics_port:
+        server.serve_metrics(metrics_port + worker_id)
+    if trace_path:
+        root, extension = os.path.splitext(trace_path)
+        server.enable_tracing(f"{root}-worker{worker_id}{extension}")
+    if journal_path:
+        root, extension = os.path.splitext(journal_path)
+        server.open_journal(f"{root}-worker{worker_id}{extension}")
+    server.install_signal_handlers()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # Shut down cleanly when the supervisor stops us
+    print(f"{Colors.GREEN}Worker {worker_id} (pid {os.getpid()}) serving games on port {tcp_port}")
+    try:
+        server.start_worker()
+    except KeyboardInterrupt:
+        server.shutdown_server()
+
+
+class ServerSupervisor(ServerMain):
+    """
+    Runs the game on every core: forks worker processes that each run their own ServerMain on one TCP port
+    shared through SO_REUSEPORT, so the kernel spreads the players between them.
+
+    The supervisor itself only broadcasts the offer for the shared port and merges the games reported by
+    the workers into its own statistics, which are printed with print_statistics like on a single server.
+
+    Attributes:
+        workers (int): Number of worker processes.
+        backend (str): "threads" or "asyncio", the engine each worker runs.
+        questions_path (str or None): Question bank file the workers load, None for the built-in questions.
+        processes (list of multiprocessing.Process): The running workers.
+        stats_queue (multiprocessing.Queue): Finished games sent by the workers, as (rounds, scores, duration).
+    """
+
+    def __init__(self, port=13117, workers=None, backend="threads", lobby_timeout=10.0, max_players=None,
+                 questions_path=None):
+        super().__init__(port, lobby_timeout, max_players, questions_path)
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("SO_REUSEPORT is not supported on this platform, run a single ServerMain instead")
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.lobby_timeout = lobby_timeout
+        self.max_players = max_players
+        self.questions_path = questions_path
+        self.metrics_port = None
+        self.journal_path = None
+        self.processes = []
+        self.port_reservation = None
+        self.stats_thread = None
+        self.stats_queue = multiprocessing.Queue()
+
+    def reserve_port(self):
+        """
+        Binds (without listening) a SO_REUSEPORT socket to a free port, so the port stays ours until the
+        workers bind to it too. A socket that does not listen never receives connections.
+        """
+        for _ in range(50):
+            reservation = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            reservation.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            try:
+                reservation.bind(('', self.tcp_port))
+                self.port_reservation = reservation
+                return True
+            except OSError:
+                reservation.close()
+                print(f"{Colors.YELLOW}Port {self.tcp_port} is in use or cannot be bound. Trying another port...")
+                self.tcp_port = random.randint(1024, 65535)
+
+        print(f"{Colors.RED}Failed to bind to a port after several attempts. Exiting.")
+        return False
+
+    def start_workers(self):
+        """Starts the worker processes on the reserved port."""
+        for worker_id in range(1, self.workers + 1):
+            process = multiprocessing.Process(
+                target=run_worker, name=f"trivia-worker-{worker_id}", daemon=True,
+                args=(worker_id, self.backend, self.tcp_port, self.stats_queue, self.lobby_timeout, self.max_players,
+                      self.questions_path, self.question_filter, self.metrics_port, self.trace_path,
+                      (self.admission.max_lobby, self.admission.max_pending, self.admission.handshake_timeout),
+                      self.scheduler.policy, self.scoring, self.round_timeout, self.journal_path))
+            process.start()
+            self.processes.append(process)
+
+    def serve_metrics(self, port):
+        """Serves the metrics of the supervisor on port, worker N serves its own on port + N."""
+        self.metrics_port = port
+        super().serve_metrics(port)
+
+    def enable_tracing(self, path):
+        """The supervisor plays no games, worker N writes its trace next to path with a -workerN suffix."""
+        self.trace_path = path
+
+    def open_journal(self, path):
+        """The supervisor plays no games, worker N journals its own next to path with a -workerN suffix."""
+        self.journal_path = path
+
+    def install_signal_handlers(self):
+        """Also stops the workers cleanly on SIGTERM, like on Ctrl+C, so a kill does not leave them behind."""
+        super().install_signal_handlers()
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    def stop_tracing(self):
+        """The workers write their own traces."""
+        if self.profiler.running:
+            self.profiler.stop()
+
+    def collect_worker_stats(self):
+        """Merges every game reported by a worker into the statistics of the supervisor."""
+        while self.server_running:
+            try:
+                game = self.stats_queue.get()
+            except (EOFError, OSError):
+                break
+            if game is None:
+                break
+            rounds, scores, duration = game
+            self.statistics.record_game(rounds, scores, duration)
+            if self.stats_store is not None:
+                self.stats_store.add_scores(scores)
+                self.stats_store.add_game(rounds)
+            self.print_statistics()
+
+    def start(self):
+        """Starts the workers, then broadcasts the shared port until the server is stopped."""
+        if not self.reserve_port():
+            return
+        self.start_workers()
+        print(f"{Colors.GREEN}Server started with {self.workers} workers on port {self.tcp_port}, "
+              f"listening on IP address {socket.gethostbyname(socket.gethostname())}")
+        self.stats_thread = threading.Thread(target=self.collect_worker_stats, daemon=True)
+        self.stats_thread.start()
+        self.start_udp_broadcast()
+
+    def shutdown_server(self):
+        """Stops the workers and the beacon."""
+        self.server_running = False
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(timeout=5)
+        self.stats_queue.put(None)
+        if self.stats_thread:
+            self.stats_thread.join(timeout=5)
+        if self.port_reservation:
+            self.port_reservation.close()
+        if self.stats_store is not None:
+            self.stats_store.close()
+        self.metrics.close()
+        self.game_executor.shutdown(wait=False)
+        print(f"{Colors.BLUE}Server has been shutdown cleanly.{Colors.END}")
+
+
+if __name__ == "__main__":
+    server = ServerSupervisor()
+    server.install_signal_handlers()
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        server.shutdown_server()
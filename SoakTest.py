@@ -0,0 +1,171 @@
+import asyncio
+import os
+import random
+import sys
+import time
+from Benchmark import Benchmark
+from Colors import Colors
+from GameProtocol import GameProtocol, FrameReader
+
+
+class SoakTest(Benchmark):
+    """
+    Plays thousands of games back to back against one server and checks that nothing it holds grows with the
+    number of games played: threads, open file descriptors and resident memory.
+
+    The server is started like the Benchmark starts it, with lobbies that close as soon as players_per_game
+    players joined. The scripted clients answer each question at once, right with probability 0.5 from a seeded
+    rng, so a game lasts a couple of rounds whichever players end up in the same room. concurrency games are
+    played at a time. Players are named from a pool of name_pool names, like regulars coming back, so the
+    statistics the server keeps per player stop growing once every name was seen.
+
+    Every sample_every games the threads, descriptors and memory of the server are read from /proc. The first
+    sample after warmup games is the baseline, and the run fails if a later sample goes over it by more than
+    thread_slack threads, fd_slack descriptors or rss_growth (a fraction) of its memory. Linux only.
+
+    Attributes:
+        games (int): Games played in total.
+        players_per_game (int): Players in every game.
+        concurrency (int): Games played at the same time.
+        sample_every (int): Games between two samples.
+        warmup (int): Games played before the baseline is taken.
+        name_pool (int): Number of different player names.
+        samples (list of dict): The samples taken, with the number of games played at each one.
+    """
+
+    def __init__(self, games=10000, players_per_game=2, concurrency=8, seed=1, backend="threads",
+                 tcp_port=47217, sample_every=500, warmup=500, thread_slack=2, fd_slack=8, rss_growth=0.1,
+                 name_pool=1000):
+        super().__init__(sizes=(players_per_game,), games=games, seed=seed, backend=backend, tcp_port=tcp_port)
+        self.players_per_game = players_per_game
+        self.concurrency = concurrency
+        self.sample_every = sample_every
+        self.warmup = warmup
+        self.thread_slack = thread_slack
+        self.fd_slack = fd_slack
+        self.rss_growth = rss_growth
+        self.name_pool = name_pool
+        self.rng = random.Random(seed)
+        self.samples = []
+        self.games_finished = 0
+        self.games_failed = 0
+
+    @staticmethod
+    def server_resources(pid):
+        """Returns {"threads", "fds", "rss_kb"} of a running process from /proc, None elsewhere."""
+        try:
+            with open(f"/proc/{pid}/status") as status_file:
+                status = dict(line.split(":", 1) for line in status_file if ":" in line)
+            return {"threads": int(status["Threads"]), "fds": len(os.listdir(f"/proc/{pid}/fd")),
+                    "rss_kb": int(status["VmRSS"].split()[0])}
+        except (OSError, KeyError, ValueError):
+            return None
+
+    async def play_one(self, game, player_id):
+        """Plays one scripted client through a game, returns True if it reached game over."""
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.tcp_port)
+        frames = FrameReader()
+        try:
+            writer.write(GameProtocol.hello(f"soak{(game * self.players_per_game + player_id) % self.name_pool}"))
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return False
+                for message_type, payload in frames.feed(data):
+                    if message_type == GameProtocol.QUESTION:
+                        _, question_id, _ = GameProtocol.parse_question(payload)
+                        _, is_true = self.trivia_manager.get_question(question_id)
+                        right = self.rng.random() < 0.5
+                        writer.write(GameProtocol.answer_frame(is_true if right else not is_true))
+                    elif message_type == GameProtocol.GAME_OVER:
+                        return True
+        finally:
+            writer.close()
+
+    async def play_game(self, game):
+        """Plays one game with all its players."""
+        results = await asyncio.gather(*(self.play_one(game, player_id)
+                                         for player_id in range(self.players_per_game)), return_exceptions=True)
+        if all(result is True for result in results):
+            self.games_finished += 1
+        else:
+            self.games_failed += 1
+
+    async def play_games(self, pid):
+        """Plays every game, concurrency at a time, and samples the server between batches."""
+        game = 0
+        while game < self.games:
+            batch = range(game, min(game + self.concurrency, self.games))
+            await asyncio.gather(*(self.play_game(number) for number in batch))
+            previous, game = game, batch[-1] + 1
+            if game // self.sample_every != previous // self.sample_every or game == self.games:
+                await asyncio.sleep(0.2)  # Lets the server close the connections of the last games
+                sample = self.server_resources(pid)
+                if sample is not None:
+                    sample["games"] = game
+                    self.samples.append(sample)
+                    print(f"{Colors.END}{game} games: {sample['threads']} threads, {sample['fds']} fds, "
+                          f"{sample['rss_kb']} kB resident")
+
+    def check(self):
+        """Returns the list of problems found in the samples, empty when the server stayed flat."""
+        problems = []
+        if self.games_failed:
+            problems.append(f"{self.games_failed} games did not reach game over")
+        measured = [sample for sample in self.samples if sample["games"] >= self.warmup]
+        if len(measured) < 2:
+            return problems + ["Not enough samples after the warmup to tell, play more games"]
+        baseline = measured[0]
+        for sample in measured[1:]:
+            if sample["threads"] > baseline["threads"] + self.thread_slack:
+                problems.append(f"threads grew from {baseline['threads']} to {sample['threads']} "
+                                f"after {sample['games']} games")
+            if sample["fds"] > baseline["fds"] + self.fd_slack:
+                problems.append(f"file descriptors grew from {baseline['fds']} to {sample['fds']} "
+                                f"after {sample['games']} games")
+            if sample["rss_kb"] > baseline["rss_kb"] * (1 + self.rss_growth):
+                problems.append(f"resident memory grew from {baseline['rss_kb']} kB to {sample['rss_kb']} kB "
+                                f"after {sample['games']} games")
+        return problems
+
+    def run(self):
+        """Plays the games against a fresh server and returns the problems found."""
+        server = self.start_server(self.players_per_game)
+        started = time.monotonic()
+        try:
+            if self.server_resources(server.pid) is None:
+                print(f"{Colors.YELLOW}/proc is not available, only checking that every game ends")
+            asyncio.run(self.play_games(server.pid))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+        elapsed = time.monotonic() - started
+        print(f"{Colors.END}{self.games_finished} games finished, {self.games_failed} failed, "
+              f"{self.games_finished * 60 / elapsed:.0f} games per minute")
+        return self.check()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Soak test: many games back to back against one server")
+    parser.add_argument("--games", type=int, default=10000, help="games played in total")
+    parser.add_argument("--players", type=int, default=2, help="players in every game")
+    parser.add_argument("--concurrency", type=int, default=8, help="games played at the same time")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the server and the clients")
+    parser.add_argument("--backend", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--tcp-port", type=int, default=47217, help="loopback port the server listens on")
+    parser.add_argument("--sample-every", type=int, default=500, help="games between two samples of the server")
+    parser.add_argument("--warmup", type=int, default=500, help="games played before the baseline sample")
+    parser.add_argument("--rss-growth", type=float, default=0.1,
+                        help="fraction the resident memory may grow over the baseline")
+    args = parser.parse_args()
+
+    soak = SoakTest(args.games, args.players, args.concurrency, args.seed, args.backend, args.tcp_port,
+                    args.sample_every, args.warmup, rss_growth=args.rss_growth)
+    problems = soak.run()
+    for problem in problems:
+        print(f"{Colors.RED}{problem}{Colors.END}")
+    if problems:
+        sys.exit(1)
+    print(f"{Colors.GREEN}The server stayed flat over {args.games} games{Colors.END}")
@@ -0,0 +1,119 @@
+import queue
+import sqlite3
+import threading
+import time
+from Colors import Colors
+
+
+class StatsStore:
+    """
+    SQLite file keeping the statistics across restarts.
+
+    Only aggregates are stored: the total score of every player and the number of games that lasted each
+    number of rounds, so loading them at startup reads two small tables instead of replaying every game.
+    The game threads never touch the database: add_scores and add_game put the update on a queue, and a
+    single writer thread merges whatever arrived into one transaction every flush_interval seconds.
+
+    Attributes:
+        path (str): Path of the SQLite database.
+        flush_interval (float): Seconds between two transactions of the writer.
+        updates (queue.Queue): Pending updates, ("scores", dict) or ("game", rounds), None stops the writer.
+        writes (int): Transactions committed by the writer.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS player_scores (name TEXT PRIMARY KEY, score INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS game_rounds (rounds INTEGER PRIMARY KEY, games INTEGER NOT NULL)",
+    )
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.updates = queue.Queue()
+        self.writes = 0
+        self.writer = None
+        with sqlite3.connect(self.path) as connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+
+    def load(self, max_players=None):
+        """
+        Reads the stored aggregates. Returns (player scores, rounds histogram), the scores of at most
+        max_players players, the best first.
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            if max_players is None:
+                rows = connection.execute("SELECT name, score FROM player_scores ORDER BY score DESC")
+            else:
+                rows = connection.execute("SELECT name, score FROM player_scores ORDER BY score DESC LIMIT ?",
+                                          (max_players,))
+            player_scores = rows.fetchall()
+            rounds_histogram = dict(connection.execute("SELECT rounds, games FROM game_rounds"))
+        finally:
+            connection.close()
+        return player_scores, rounds_histogram
+
+    def start(self):
+        """Starts the writer thread."""
+        self.writer = threading.Thread(target=self.write_updates, name="stats-writer", daemon=True)
+        self.writer.start()
+
+    def add_scores(self, scores):
+        """Queues points to add to the totals of the players, scores maps player name to points."""
+        if scores:
+            self.updates.put(("scores", scores))
+
+    def add_game(self, rounds):
+        """Queues a finished game that lasted the given number of rounds."""
+        self.updates.put(("game", rounds))
+
+    def write_updates(self):
+        """Writer thread: merges the queued updates and commits them in one transaction per flush interval."""
+        connection = sqlite3.connect(self.path)
+        running = True
+        try:
+            while running:
+                scores = {}
+                games = {}
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    try:
+                        update = self.updates.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if update is None:
+                        running = False
+                        break
+                    kind, value = update
+                    if kind == "scores":
+                        for player_name, points in value.items():
+                            scores[player_name] = scores.get(player_name, 0) + points
+                    else:
+                        games[value] = games.get(value, 0) + 1
+                if scores or games:
+                    self.commit(connection, scores, games)
+        finally:
+            connection.close()
+
+    def commit(self, connection, scores, games):
+        """Adds a batch of merged updates to the stored aggregates."""
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO player_scores (name, score) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET score = score + excluded.score", scores.items())
+                connection.executemany(
+                    "INSERT INTO game_rounds (rounds, games) VALUES (?, ?) "
+                    "ON CONFLICT(rounds) DO UPDATE SET games = games + excluded.games", games.items())
+            self.writes += 1
+        except sqlite3.Error as e:
+            print(f"{Colors.RED}Failed to save the statistics to {self.path}: {e}")
+
+    def close(self):
+        """Writes what is still queued and stops the writer."""
+        if self.writer is None:
+            return
+        self.updates.put(None)
+        self.writer.join(timeout=10)
+        self.writer = None
@@ -0,0 +1,144 @@
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from Colors import Colors
+
+
+class Tracer:
+    """
+    Opt-in recorder of the phases of every game, exported as Chrome trace-event JSON (chrome://tracing or
+    ui.perfetto.dev).
+
+    Spans are (name, start, end, pid, tid, args) tuples with time.monotonic_ns timestamps, written to a fixed
+    size ring buffer: a slot is claimed with an atomic counter, so recording takes no lock and the oldest spans
+    are overwritten once the buffer is full. While tracing is off, record returns right away.
+
+    In the export every room is a process, its tid 0 track holds the game, round and phase spans, and every
+    player gets its own track (tid = player index + 1) with the time it took to answer each question.
+
+    Attributes:
+        enabled (bool): Whether spans are recorded.
+        capacity (int): Number of spans kept.
+        spans (list): The ring buffer.
+        names (dict): Maps (pid, tid) to the name shown for that track, and (pid, None) to the process name.
+    """
+
+    def __init__(self, capacity=100000, enabled=False):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.spans = [None] * capacity
+        self.slots = itertools.count()
+        self.names = {}
+
+    def record(self, name, start, end, pid, tid=0, args=None):
+        """Records a span between two monotonic_ns timestamps."""
+        if not self.enabled:
+            return
+        self.spans[next(self.slots) % self.capacity] = (name, start, end, pid, tid, args)
+
+    def name_track(self, pid, tid, name):
+        """Names a process (tid None) or a thread track of the export."""
+        if self.enabled:
+            self.names[(pid, tid)] = name
+
+    def snapshot(self):
+        """Returns the recorded spans, oldest first."""
+        spans = list(self.spans)
+        start = next(self.slots) % self.capacity  # Also burns a slot, which costs nothing
+        return [span for span in spans[start:] + spans[:start] if span is not None]
+
+    def chrome_trace(self):
+        """Returns the recorded spans as a Chrome trace-event document."""
+        events = []
+        for (pid, tid), name in self.names.items():
+            if tid is None:
+                events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}})
+            else:
+                events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        for name, start, end, pid, tid, args in self.snapshot():
+            event = {"name": name, "ph": "X", "ts": start / 1000, "dur": (end - start) / 1000, "pid": pid, "tid": tid}
+            if args:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        """Writes the Chrome trace to path."""
+        with open(path, "w") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+        print(f"{Colors.GREEN}Wrote the trace to {path}")
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that can be switched on and off on a running server.
+
+    While running, a thread looks at the stack of every other thread every interval seconds and counts the
+    stacks it saw. Stopping it writes them in the folded format of flamegraph.pl and speedscope
+    ("frame;frame;frame count" lines, outermost frame first).
+
+    Attributes:
+        interval (float): Seconds between two samples.
+        directory (str): Where the profiles are written.
+        running (bool): Whether it is sampling.
+        samples (Counter): Number of times each folded stack was seen.
+    """
+
+    def __init__(self, interval=0.005, directory="."):
+        self.interval = interval
+        self.directory = directory
+        self.running = False
+        self.samples = Counter()
+        self.thread = None
+        self.profiles_written = 0
+
+    def toggle(self):
+        """Starts sampling, or stops it and writes the profile."""
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def start(self):
+        """Starts the sampling thread."""
+        self.samples.clear()
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, name="sampling-profiler", daemon=True)
+        self.thread.start()
+        print(f"{Colors.YELLOW}Sampling profiler started")
+
+    def stop(self):
+        """Stops sampling and writes the profile, returns its path."""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.profiles_written += 1
+        path = os.path.join(self.directory, f"profile-{os.getpid()}-{self.profiles_written}.folded")
+        with open(path, "w") as profile_file:
+            for stack, count in self.samples.most_common():
+                profile_file.write(f"{stack} {count}\n")
+        print(f"{Colors.YELLOW}Sampling profiler stopped, {sum(self.samples.values())} samples written to {path}")
+        return path
+
+    def sample(self):
+        """Sampling thread: counts the current stack of every other thread until stopped."""
+        own_id = threading.get_ident()
+        thread_names = {}
+        while self.running:
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
@@ -1,11 +1,13 @@
-import random
+from QuestionBank import QuestionBank, QuestionDeck
 
 class TriviaQuestionManager:
     """
     Manages a collection of trivia questions related to biblical events and figures.
-    This class provides functionality to randomly select trivia questions from a predefined list.
+    Questions are drawn through decks shuffled from a predefined list, or from a QuestionBank file
+    when questions_path is given.
     """
-    def __init__(self):
+    def __init__(self, questions_path=None):
+        self.bank = QuestionBank(questions_path) if questions_path else None
         self.questions = [
             {"text": "Moses was the first king of Israel.", "is_true": False},
             {"text": "David defeated Goliath with a sling and a stone.", "is_true": True},
@@ -29,9 +31,24 @@ class TriviaQuestionManager:
             {"text": "The Apostle Paul wrote most of the New Testament.", "is_true": True},
         ]
 
-    def get_random_question(self):
-        """Returns a random trivia question and its answer."""
-        # Randomly choose one question from the list of questions.
-        question = random.choice(self.questions)
+    def question_count(self):
+        """Returns the number of questions available."""
+        if self.bank is not None:
+            return self.bank.count
+        return len(self.questions)
+
+    def get_question(self, question_id):
+        """Returns the text and the answer of a question."""
+        if self.bank is not None:
+            return self.bank.get_question(question_id)
+        question = self.questions[question_id]
         return question["text"], question["is_true"]
 
+    def new_deck(self, category=None, difficulty=None):
+        """Returns a shuffled deck for one game, optionally limited to a category and/or a difficulty."""
+        if self.bank is not None:
+            return QuestionDeck(self.bank.members(category, difficulty), self.bank.get_question)
+        members = [question_id for question_id, question in enumerate(self.questions)
+                   if category in (None, question.get("category")) and difficulty in (None, question.get("difficulty"))]
+        return QuestionDeck(members, self.get_question)
+
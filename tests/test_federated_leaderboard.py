@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FederatedLeaderboard import FederatedLeaderboard
+from GameStatistics import GameStatistics
+
+
+class FederatedLeaderboardTest(unittest.TestCase):
+    """Feeds the gossip datagrams of one server to another and checks the digests the receiver keeps."""
+
+    def setUp(self):
+        self.origin = FederatedLeaderboard(GameStatistics(top_k=3))
+        self.receiver = FederatedLeaderboard(GameStatistics(top_k=3))
+        self.relay = FederatedLeaderboard(GameStatistics(top_k=3))
+        self.now = time.monotonic()
+
+    def play(self, scores):
+        """Records a game on the origin server, which bumps the version of its digest."""
+        self.origin.statistics.record_game(1, scores)
+
+    def held(self):
+        """Returns (version, players) of the digest of the origin the receiver holds, None if it holds none."""
+        entry = self.receiver.digests.get(self.origin.node_id)
+        return None if entry is None else (entry["version"], entry["players"])
+
+    def test_newer_version_replaces_the_older(self):
+        self.play({"alice": 2})
+        self.assertTrue(self.receiver.receive(self.origin.gossip(), self.now))
+        self.assertEqual(self.held(), (1, [("alice", 2)]))
+        self.play({"bob": 5})
+        self.receiver.receive(self.origin.gossip(), self.now + 1)
+        self.assertEqual(self.held(), (2, [("bob", 5), ("alice", 2)]))
+        self.assertEqual(self.receiver.leaderboard(), [("bob", 5), ("alice", 2)])
+        self.assertEqual(self.receiver.servers(), 2)
+
+    def test_relayed_stale_digest_does_not_roll_the_origin_back(self):
+        self.play({"alice": 2})
+        self.relay.receive(self.origin.gossip(), self.now)
+        stale = self.relay.gossip()  # Relays version 1 of the origin
+        self.play({"alice": 3})
+        self.receiver.receive(self.origin.gossip(), self.now + 1)
+        self.assertEqual(self.held(), (2, [("alice", 5)]))
+        self.receiver.receive(stale, self.now + 2)
+        self.assertEqual(self.held(), (2, [("alice", 5)]))
+        self.assertIn(self.relay.node_id, self.receiver.digests)
+
+    def test_relayed_digest_reaches_a_server_that_missed_the_origin(self):
+        self.play({"alice": 2})
+        self.relay.receive(self.origin.gossip(), self.now)
+        self.receiver.receive(self.relay.gossip(), self.now)
+        self.assertEqual(self.held(), (1, [("alice", 2)]))
+
+    def test_silent_origin_expires(self):
+        self.play({"alice": 2})
+        self.receiver.receive(self.origin.gossip(), self.now)
+        self.relay.receive(self.origin.gossip(), self.now)
+        self.receiver.receive(self.relay.gossip(), self.now + 20)  # A relayed copy is no news from the origin
+        self.receiver.expire(self.now + 30)
+        self.assertIsNotNone(self.held())
+        self.receiver.expire(self.now + 30.5)
+        self.assertIsNone(self.held())
+        self.assertIn(self.relay.node_id, self.receiver.digests)
+
+    def test_own_and_foreign_datagrams_are_told_apart(self):
+        self.assertTrue(self.origin.receive(self.origin.gossip(), self.now))
+        self.assertEqual(self.origin.digests, {})
+        self.assertFalse(self.receiver.receive(b"\x00" * 32, self.now))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import socket
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from GameProtocol import GameProtocol
+from GameReplay import GameReplay
+from PlayerTable import RoundAnswers
+from ServerMain import ServerMain
+
+
+class GameJournalTest(unittest.TestCase):
+    """Journals a lobby of players that share a name and reads it back the way GameReplay does."""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".journal")
+        os.close(handle)
+        os.remove(self.path)
+        self.server = ServerMain(lobby_timeout=60.0)
+        self.sockets = []
+
+    def tearDown(self):
+        self.server.journal.close()
+        for sock in self.sockets:
+            sock.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def admit(self, player_name, port):
+        """Admits a player over a socket pair, as the admission stage does once its name was read."""
+        server_side, client_side = socket.socketpair()
+        self.sockets += [server_side, client_side]
+        self.server.admit_player(server_side, ("127.0.0.1", port), GameProtocol.VERSION, player_name,
+                                 time.monotonic_ns())
+
+    def test_duplicate_names_are_replayed_as_separate_players(self):
+        self.server.open_journal(self.path)
+        for port in range(3):
+            self.admit("Same", port)
+        room = self.server.scheduler.lobby
+        answers = RoundAnswers()
+        answers.add(room.players.index[("127.0.0.1", 0)], True, 0.5)
+        answers.add(room.players.index[("127.0.0.1", 1)], False, 0.25)
+        self.server.judge_answers(room, answers, True)
+        self.server.journal.close()
+
+        _, players = GameReplay(self.path).load()
+        self.assertEqual(len(players), 3)
+        self.assertEqual(len({player["name"] for player in players}), 3)
+        outcomes = sorted(player["answers"][1][0] for player in players)
+        self.assertEqual(outcomes, sorted([GameProtocol.CORRECT, GameProtocol.INCORRECT, GameProtocol.NO_RESPONSE]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LobbyPolicy import LobbyPolicy
+
+
+class LobbyPolicyTest(unittest.TestCase):
+    """Checks when and why lobbies close, with join times given in seconds from the first join."""
+
+    def test_defaults_wait_max_wait(self):
+        policy = LobbyPolicy()
+        self.assertEqual(policy.close_at(1, 1, 100.0, 100.0), (110.0, LobbyPolicy.TIMEOUT))
+        self.assertEqual(policy.close_at(50, 50, 100.0, 109.0), (110.0, LobbyPolicy.TIMEOUT))
+
+    def test_full_lobby_closes_at_once(self):
+        policy = LobbyPolicy(max_wait=10.0, min_players=8, max_players=4)
+        self.assertEqual(policy.close_at(4, 5, 0.0, 2.5), (2.5, LobbyPolicy.FULL))
+        self.assertEqual(policy.close_at(3, 3, 0.0, 2.5), (None, None))
+
+    def test_quiet_arrivals_close_after_the_quorum(self):
+        policy = LobbyPolicy(max_wait=10.0, quorum=3, quiet_period=1.0)
+        self.assertEqual(policy.close_at(2, 2, 0.0, 0.1), (10.0, LobbyPolicy.TIMEOUT))
+        close_at, reason = policy.close_at(3, 3, 0.0, 0.2)
+        self.assertEqual(reason, LobbyPolicy.QUIET)
+        self.assertAlmostEqual(close_at, 0.2 + LobbyPolicy.QUIET_GAPS * 0.1)
+
+    def test_quiet_after_is_clamped(self):
+        policy = LobbyPolicy(quorum=2, quiet_period=1.0)
+        self.assertEqual(policy.quiet_after(1, 0.0, 0.0), 1.0)
+        self.assertEqual(policy.quiet_after(10, 0.0, 0.0), LobbyPolicy.MIN_QUIET)
+        self.assertEqual(policy.quiet_after(3, 0.0, 0.001), LobbyPolicy.MIN_QUIET)
+        self.assertEqual(policy.quiet_after(3, 0.0, 8.0), 1.0)
+        self.assertEqual(policy.close_at(5, 5, 0.0, 0.0), (LobbyPolicy.MIN_QUIET, LobbyPolicy.QUIET))
+
+    def test_quiet_past_max_wait_times_out(self):
+        policy = LobbyPolicy(max_wait=2.0, quorum=2, quiet_period=1.0)
+        self.assertEqual(policy.close_at(3, 3, 0.0, 1.8), (2.0, LobbyPolicy.TIMEOUT))
+
+    def test_lobby_holds_until_min_players(self):
+        policy = LobbyPolicy(max_wait=10.0, min_players=3, quorum=3)
+        self.assertEqual(policy.close_at(1, 1, 0.0, 0.0), (None, None))
+        self.assertEqual(policy.close_at(2, 4, 0.0, 30.0), (None, None))  # Two of the four joins left
+        self.assertEqual(policy.close_at(3, 3, 0.0, 4.0)[1], LobbyPolicy.QUIET)
+
+    def test_max_wait_already_over_when_min_players_is_reached(self):
+        policy = LobbyPolicy(max_wait=10.0, min_players=3)
+        close_at, reason = policy.close_at(3, 3, 0.0, 25.0)
+        self.assertEqual(reason, LobbyPolicy.TIMEOUT)
+        self.assertLessEqual(close_at, 25.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
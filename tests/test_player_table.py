@@ -0,0 +1,98 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PlayerTable
+from GameProtocol import GameProtocol
+from PlayerTable import RoundAnswers
+
+
+class PlayerTableTest(unittest.TestCase):
+    """Judges rounds on a small table with NumPy columns, when NumPy is installed."""
+
+    with_numpy = True
+
+    def setUp(self):
+        if self.with_numpy and PlayerTable.numpy is None:
+            self.skipTest("NumPy is not installed")
+        patcher = mock.patch.object(PlayerTable, "numpy", PlayerTable.numpy if self.with_numpy else None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.table = PlayerTable.PlayerTable(capacity=2)
+        for number in range(5):
+            self.table.add(("127.0.0.1", number), f"p{number}", GameProtocol.VERSION)
+
+    def answer(self, answers):
+        """Records a round, answers mapping index to (answer, latency)."""
+        round_answers = RoundAnswers()
+        for index, (answer, latency) in answers.items():
+            round_answers.add(index, answer, latency)
+        self.table.clear_answers()
+        self.table.record_answers(round_answers)
+
+    def evaluate(self, correct_answer):
+        players, outcomes, winners = self.table.evaluate(correct_answer)
+        return list(map(int, players)), list(map(int, outcomes)), list(map(int, winners))
+
+    def test_columns_grow_past_the_capacity(self):
+        self.assertEqual(len(self.table), 5)
+        self.assertEqual(self.table.active_indexes(), [0, 1, 2, 3, 4])
+        self.assertEqual(self.table.names[4], "p4")
+
+    def test_wrong_and_missing_answers_are_out(self):
+        self.answer({0: (True, 0.5), 1: (False, 0.2), 3: (True, 0.25), 4: (None, 0.0)})
+        players, outcomes, winners = self.evaluate(True)
+        self.assertEqual(players, [0, 1, 2, 3, 4])
+        self.assertEqual(outcomes, [GameProtocol.CORRECT, GameProtocol.INCORRECT, GameProtocol.NO_RESPONSE,
+                                    GameProtocol.CORRECT, GameProtocol.NO_RESPONSE])
+        self.assertEqual(winners, [0, 3])
+        self.assertEqual(self.table.active_indexes(), [0, 3])
+        self.assertEqual(self.table.game_scores(), {"p0": 1, "p3": 1})
+        self.assertAlmostEqual(float(self.table.answer_times[3]), 0.25)
+        self.assertEqual(self.table.fastest(winners), 3)
+
+    def test_nobody_is_out_when_nobody_answered_right(self):
+        self.answer({0: (True, 0.1), 2: (True, 0.3)})
+        players, outcomes, winners = self.evaluate(False)
+        self.assertEqual(players, [0, 1, 2, 3, 4])
+        self.assertEqual(winners, [])
+        self.assertEqual(len(self.table), 5)
+        self.assertEqual(self.table.game_scores(), {})
+
+    def test_only_the_active_players_are_judged(self):
+        self.table.remove(("127.0.0.1", 1))
+        self.answer({0: (False, 0.1), 2: (True, 0.3)})
+        players, outcomes, winners = self.table.evaluate(True)
+        self.assertEqual(list(map(int, players)), [0, 2, 3, 4])
+        self.assertEqual(list(map(int, winners)), [2])
+        self.assertEqual(list(map(int, self.table.left_out(players))), [0, 3, 4])
+        self.assertEqual(self.table.results(players, outcomes),
+                         [(b"p0", GameProtocol.INCORRECT), (b"p2", GameProtocol.CORRECT),
+                          (b"p3", GameProtocol.NO_RESPONSE), (b"p4", GameProtocol.NO_RESPONSE)])
+
+    def test_keep_only(self):
+        self.table.keep_only([1, 4])
+        self.assertEqual(self.table.active_indexes(), [1, 4])
+        self.table.keep_only([4, 0])
+        self.assertEqual(self.table.active_indexes(), [4])
+        self.assertFalse(self.table.is_active(("127.0.0.1", 0)))
+
+    def test_roster_changes(self):
+        roster = self.table.snapshot()
+        self.table.remove(("127.0.0.1", 2))
+        self.table.add(("127.0.0.1", 5), "p5")
+        self.assertEqual(self.table.roster_changes(roster), (["p5"], ["p2"]))
+        self.assertEqual(self.table.roster_changes(None), (["p0", "p1", "p3", "p4", "p5"], []))
+
+
+class PlayerTableWithoutNumPyTest(PlayerTableTest):
+    """Judges the same rounds on the array and bytearray columns used without NumPy."""
+
+    with_numpy = False
+
+
+if __name__ == "__main__":
+    unittest.main()
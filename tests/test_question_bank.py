@@ -0,0 +1,115 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from QuestionBank import QuestionBank, QuestionDeck
+from TriviaQuestionManager import TriviaQuestionManager
+
+
+QUESTIONS = [
+    {"text": "Question 0", "is_true": True, "category": "law", "difficulty": "easy"},
+    {"text": "Question 1", "is_true": False, "category": "law", "difficulty": "hard"},
+    {"text": "Question 2", "is_true": True, "category": "kings", "difficulty": "easy"},
+    {"text": "Question 3", "is_true": False, "category": "kings", "difficulty": "hard"},
+    {"text": "Question 4", "is_true": True, "category": "law", "difficulty": "easy"},
+    {"text": "Question 5", "is_true": False},
+]
+
+
+class QuestionBankTest(unittest.TestCase):
+    """Builds a small bank on disk and checks its category and difficulty indexes."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.banks = []
+
+    def tearDown(self):
+        for bank in self.banks:
+            bank.close()
+        shutil.rmtree(self.directory)
+
+    def open_bank(self, name="questions.jsonl", lines=None):
+        path = os.path.join(self.directory, name)
+        if lines is None:
+            lines = [json.dumps(question) for question in QUESTIONS]
+        with open(path, "w") as questions_file:
+            questions_file.write("\n".join(lines) + "\n")
+        bank = QuestionBank(path)
+        self.banks.append(bank)
+        return bank
+
+    def test_questions_are_read_by_id(self):
+        bank = self.open_bank()
+        self.assertEqual(bank.count, len(QUESTIONS))
+        self.assertEqual(bank.get_question(3), ("Question 3", False))
+
+    def test_members_of_a_category_and_a_difficulty(self):
+        bank = self.open_bank()
+        self.assertEqual(list(bank.members()), list(range(len(QUESTIONS))))
+        self.assertEqual(list(bank.members(category="law")), [0, 1, 4])
+        self.assertEqual(list(bank.members(difficulty="hard")), [1, 3])
+        self.assertEqual(list(bank.members(category="law", difficulty="easy")), [0, 4])
+        self.assertEqual(list(bank.members(category="psalms")), [])
+
+    def test_index_is_reused_until_the_questions_change(self):
+        bank = self.open_bank()
+        self.assertTrue(bank.index_is_current())
+        bank = self.open_bank(lines=[json.dumps(question) for question in QUESTIONS[:2]])
+        self.assertEqual(bank.count, 2)
+        self.assertEqual(list(bank.members(category="law")), [0, 1])
+
+    def test_csv_bank(self):
+        rows = ["text,is_true,category,difficulty"] + [
+            f"{question['text']},{question['is_true']},{question.get('category', '')},{question.get('difficulty', '')}"
+            for question in QUESTIONS]
+        bank = self.open_bank("questions.csv", rows)
+        self.assertEqual(bank.count, len(QUESTIONS))
+        self.assertEqual(bank.get_question(0), ("Question 0", True))
+        self.assertEqual(list(bank.members(category="kings", difficulty="hard")), [3])
+
+
+class QuestionDeckTest(unittest.TestCase):
+    """Draws from decks and checks that no question repeats until every one was asked."""
+
+    def draw_ids(self, deck, count):
+        return [deck.draw()[0] for _ in range(count)]
+
+    def test_no_repeat_until_the_deck_is_exhausted(self):
+        members = list(range(100, 150))
+        deck = QuestionDeck(members, lambda question_id: (f"Question {question_id}", True), random.Random(7))
+        first = self.draw_ids(deck, len(members))
+        self.assertEqual(sorted(first), members)
+        second = self.draw_ids(deck, len(members))
+        self.assertEqual(sorted(second), members)
+
+    def test_draws_only_the_members(self):
+        manager = TriviaQuestionManager()
+        deck = QuestionDeck([2, 5, 11], manager.get_question, random.Random(3))
+        for question_id, text, is_true in (deck.draw() for _ in range(9)):
+            self.assertIn(question_id, (2, 5, 11))
+            self.assertEqual((text, is_true), manager.get_question(question_id))
+
+    def test_empty_deck_is_refused(self):
+        with self.assertRaises(ValueError):
+            QuestionDeck([], lambda question_id: None)
+        with self.assertRaises(ValueError):
+            TriviaQuestionManager().new_deck(category="science")
+
+    def test_server_refuses_a_filter_nothing_matches(self):
+        server = subprocess.run([sys.executable, os.path.join(ROOT, "ServerMain.py"), "--category", "science",
+                                 "--stats-db", ""], capture_output=True, text=True, timeout=30)
+        self.assertEqual(server.returncode, 2)
+        self.assertIn("no question matches", server.stderr)
+        self.assertNotIn("Traceback", server.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
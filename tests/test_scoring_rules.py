@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PlayerTable import PlayerTable, RoundAnswers
+from ScoringRules import ScoringRules
+
+
+class ScoringRulesTest(unittest.TestCase):
+    """Plays rounds on a small PlayerTable the way the server judges them and checks the sudden death rules."""
+
+    def setUp(self):
+        self.table = PlayerTable()
+        for number in range(4):
+            self.table.add(("127.0.0.1", number), f"p{number}")
+        self.rounds = 0
+
+    def play(self, rules, answers):
+        """Judges a round where the question was true, answers mapping index to (answer, latency)."""
+        round_answers = RoundAnswers()
+        for index, (answer, latency) in answers.items():
+            round_answers.add(index, answer, latency)
+        self.table.clear_answers()
+        self.table.record_answers(round_answers)
+        _, _, winners = self.table.evaluate(True)
+        self.rounds += 1
+        return [int(index) for index in rules.decide(self.table, self.rounds, winners)]
+
+    def test_classic_rules_never_end_while_players_answer_right(self):
+        rules = ScoringRules()
+        self.assertIsNone(rules.last_round())
+        for _ in range(20):
+            self.assertEqual(self.play(rules, {0: (True, 0.3), 1: (True, 0.1)}), [0, 1])
+        self.assertEqual(self.table.active_indexes(), [0, 1])
+
+    def test_fastest_right_answer_stays_in_sudden_death(self):
+        rules = ScoringRules(max_rounds=2, sudden_death_rounds=3)
+        self.assertEqual(self.play(rules, {0: (True, 0.3), 1: (True, 0.1), 2: (True, 0.2)}), [0, 1, 2])
+        self.assertFalse(rules.sudden_death(1))
+        self.assertTrue(rules.sudden_death(2))
+        self.assertEqual(self.play(rules, {0: (True, 0.3), 1: (False, 0.1), 2: (True, 0.2)}), [2])
+        self.assertEqual(self.table.active_indexes(), [2])
+
+    def test_decided_on_time_after_sudden_death_rounds_without_a_right_answer(self):
+        rules = ScoringRules(max_rounds=2, sudden_death_rounds=2)
+        self.play(rules, {0: (True, 0.5), 1: (True, 0.2), 2: (True, 0.3)})
+        self.assertEqual(self.play(rules, {0: (False, 0.1), 1: (False, 0.1), 2: (False, 0.1)}), [])
+        self.assertEqual(self.table.active_indexes(), [0, 1, 2])
+        self.assertEqual(self.play(rules, {0: (False, 0.1), 1: (None, 0.0)}), [1])
+        self.assertEqual(self.table.active_indexes(), [1])
+
+    def test_game_never_lasts_past_the_last_round(self):
+        rules = ScoringRules(max_rounds=3, sudden_death_rounds=2)
+        self.assertEqual(rules.last_round(), 4)
+        while len(self.table) > 1:
+            self.play(rules, {index: (False, 0.1) for index in self.table.active_indexes()})
+            self.assertLessEqual(self.rounds, rules.last_round())
+        self.assertEqual(self.rounds, 4)
+        self.assertEqual(self.table.active_indexes(), [0])
+
+    def test_at_least_one_sudden_death_round(self):
+        rules = ScoringRules(max_rounds=1, sudden_death_rounds=0)
+        self.assertEqual(rules.last_round(), 1)
+        self.assertEqual(self.play(rules, {2: (False, 0.1)}), [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
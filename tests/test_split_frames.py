@@ -0,0 +1,67 @@
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from GameProtocol import GameProtocol
+from ServerMain import ServerMain
+
+
+class SplitFramesTest(unittest.TestCase):
+    """Sends the frames of a binary player in pieces and checks that the threaded server reassembles them."""
+
+    ADDR = ("127.0.0.1", 1)
+
+    def setUp(self):
+        self.server = ServerMain(lobby_timeout=60.0)
+        self.server.round_timeout = 2.0
+        server_side, self.client = socket.socketpair()
+        self.server.admit_player(server_side, self.ADDR, GameProtocol.VERSION, "split", time.monotonic_ns())
+        self.room = self.server.scheduler.lobby
+
+    def tearDown(self):
+        for _, client_socket in self.room.clients.values():
+            client_socket.close()
+        self.room.clients.clear()
+        self.room.outbound.clear()
+        self.client.close()
+        self.server.game_executor.shutdown(wait=False)
+        self.server.journal.close()
+
+    def send_in_pieces(self, data, cut, delay=0.1):
+        """Sends data in two writes, cut bytes first, delay seconds apart, from another thread."""
+        def send():
+            self.client.sendall(data[:cut])
+            time.sleep(delay)
+            self.client.sendall(data[cut:])
+        thread = threading.Thread(target=send)
+        thread.start()
+        return thread
+
+    def collect(self):
+        """Collects the answers of a round, returns {addr: answer code}."""
+        answers = self.server.collect_answers(self.room, self.room.active_players())
+        return {self.room.players.addrs[index]: code for index, code in zip(answers.indexes, answers.codes)}
+
+    def test_answer_split_across_reads(self):
+        data = GameProtocol.heartbeat_frame() + GameProtocol.answer_frame(True)
+        thread = self.send_in_pieces(data, len(GameProtocol.heartbeat_frame()) + 2)
+        self.assertEqual(self.collect(), {self.ADDR: GameProtocol.ANSWER_TRUE})
+        thread.join()
+
+    def test_frames_after_a_split_heartbeat_stay_aligned(self):
+        data = GameProtocol.heartbeat_frame() + GameProtocol.answer_frame(False)
+        thread = self.send_in_pieces(data, 3)
+        self.assertEqual(self.collect(), {self.ADDR: GameProtocol.ANSWER_FALSE})
+        thread.join()
+        thread = self.send_in_pieces(GameProtocol.answer_frame(True), 1)
+        self.assertEqual(self.collect(), {self.ADDR: GameProtocol.ANSWER_TRUE})
+        thread.join()
+
+
+if __name__ == "__main__":
+    unittest.main()